@@ -0,0 +1,206 @@
+"""
+Служебные эндпоинты (/admin/*): доступны только с заголовком X-Admin-Token.
+"""
+
+import asyncio
+import secrets
+import threading
+from typing import Literal, Optional
+
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Response
+from pydantic import BaseModel, Field
+
+from config import ADMIN_TOKEN, SHADOW_QUEUE_SIZE
+from memory_report import AllocationTracker
+from profiler import SamplingProfiler
+from router import model_manager, request_profiler
+
+
+def require_admin(x_admin_token: Optional[str] = Header(default=None)):
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="Admin API disabled: ADMIN_TOKEN is not set")
+    if not x_admin_token or not secrets.compare_digest(x_admin_token, ADMIN_TOKEN):
+        raise HTTPException(status_code=401, detail="Invalid admin token")
+
+
+router = APIRouter(prefix="/admin", dependencies=[Depends(require_admin)])
+
+
+class ModelReloadRequest(BaseModel):
+    model_path: Optional[str] = None  # по умолчанию — текущий путь (перечитать файл)
+
+
+@router.post("/model/reload", status_code=202)
+def reload_model(request: ModelReloadRequest = ModelReloadRequest()):
+    """
+    Загружает новый model_package.pkl в фоне, прогревает и атомарно
+    подменяет активную модель. При prefork (serve.py) — во всех воркерах:
+    этот применяет сразу, остальные — на ближайшем опросе FLEET_DIR.
+    Статус — GET /admin/model/status.
+    """
+    try:
+        return model_manager.request_reload(request.model_path)
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+
+@router.get("/model/status")
+def model_status():
+    """Активная модель и результат последней перезагрузки (при prefork — по каждому воркеру, fleet.consistent)."""
+    return model_manager.status()
+
+
+class ShadowStartRequest(BaseModel):
+    model_path: str
+    queue_size: int = SHADOW_QUEUE_SIZE
+
+
+@router.post("/shadow")
+def start_shadow(request: ShadowStartRequest):
+    """
+    Подключает модель-кандидата в shadow-режиме (предыдущий кандидат снимается).
+    Кандидат скорит тот же вектор признаков, что и живой путь, в фоне.
+    При prefork (serve.py) — во всех воркерах, как /admin/model/reload.
+    """
+    try:
+        return model_manager.request_shadow(request.model_path, request.queue_size)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@router.get("/shadow")
+def shadow_stats():
+    """Статистика расхождений и задержек кандидата (при prefork — total и по воркерам)."""
+    stats = model_manager.shadow_stats()
+    if stats is None:
+        raise HTTPException(status_code=404, detail="No shadow model attached")
+    return stats
+
+
+@router.delete("/shadow")
+def stop_shadow():
+    """Снимает кандидата (везде); возвращает итоговую статистику."""
+    stats = model_manager.request_shadow_stop()
+    if stats is None:
+        raise HTTPException(status_code=404, detail="No shadow model attached")
+    return stats
+
+
+# ----------------------------------------------------------------------
+#  Профилирование работающего воркера
+# ----------------------------------------------------------------------
+_sampling_lock = threading.Lock()
+
+
+@router.post("/profile/sample")
+async def sample_profile(
+    seconds: float = Query(10.0, gt=0, le=120),
+    interval_ms: float = Query(5.0, ge=1, le=100),
+    format: Literal["collapsed", "json"] = "collapsed",
+    include_idle: bool = False,
+):
+    """
+    Сэмплирующий профайлер на seconds секунд по всем потокам воркера.
+    collapsed — файл для flamegraph.pl / speedscope, json — топ кадров
+    по self / total времени. Ожидающие потоки по умолчанию не учитываются.
+    """
+    if not _sampling_lock.acquire(blocking=False):
+        raise HTTPException(status_code=409, detail="Sampling profiler is already running")
+    try:
+        profiler = SamplingProfiler(interval=interval_ms / 1000, include_idle=include_idle)
+        profiler.start()
+        try:
+            await asyncio.sleep(seconds)
+        finally:
+            profiler.stop()
+    finally:
+        _sampling_lock.release()
+
+    if format == "json":
+        return {**profiler.summary(), "collapsed": profiler.collapsed()}
+    return Response(
+        content=profiler.collapsed(),
+        media_type="text/plain",
+        headers={"Content-Disposition": "attachment; filename=profile.collapsed"},
+    )
+
+
+class RequestProfileRequest(BaseModel):
+    sample_rate: float = Field(0.01, ge=0, le=1)
+    max_requests: int = Field(1000, ge=1)
+    reset: bool = True
+
+
+@router.post("/profile/requests")
+def start_request_profile(request: RequestProfileRequest = RequestProfileRequest()):
+    """Полный cProfile для доли sample_rate запросов /predict (не больше max_requests)."""
+    request_profiler.configure(request.sample_rate, request.max_requests, request.reset)
+    return request_profiler.stats()
+
+
+@router.get("/profile/requests")
+def request_profile(
+    format: Literal["text", "pstats"] = "text",
+    sort: str = "cumulative",
+    top: int = Query(40, ge=1, le=500),
+):
+    """Накопленная статистика: текстом (pstats) или файлом .pstats для snakeviz."""
+    if format == "pstats":
+        dumped = request_profiler.dump()
+        if dumped is None:
+            raise HTTPException(status_code=404, detail="No profiled requests yet")
+        return Response(
+            content=dumped,
+            media_type="application/octet-stream",
+            headers={"Content-Disposition": "attachment; filename=requests.pstats"},
+        )
+    try:
+        report = request_profiler.report(sort, top)
+    except KeyError as e:
+        raise HTTPException(status_code=400, detail=f"Unknown sort key: {e}")
+    return Response(content=report, media_type="text/plain")
+
+
+@router.delete("/profile/requests")
+def stop_request_profile():
+    """Выключает выборку; накопленная статистика остаётся до следующего POST."""
+    request_profiler.configure(0.0, request_profiler.max_requests, reset=False)
+    return request_profiler.stats()
+
+
+# ----------------------------------------------------------------------
+#  Рост аллокаций (tracemalloc); оценка по компонентам — GET /stats/memory
+# ----------------------------------------------------------------------
+allocation_tracker = AllocationTracker()
+
+
+@router.post("/memory/tracemalloc")
+def start_tracemalloc(frames: int = Query(1, ge=1, le=50)):
+    """
+    Включает tracemalloc (frames — глубина трассировки) и снимает
+    базовый снимок; повторный вызов переснимает базу.
+    Пока включён, аллокации Python заметно дороже.
+    """
+    return allocation_tracker.start(frames)
+
+
+@router.get("/memory/tracemalloc")
+def tracemalloc_diff(
+    group_by: Literal["lineno", "filename", "traceback"] = "lineno",
+    top: int = Query(30, ge=1, le=500),
+    rebase: bool = False,
+):
+    """
+    Прирост аллокаций с базового снимка по строкам / файлам / трассировкам.
+    rebase=true — текущий снимок становится базой (рост между двумя точками).
+    """
+    try:
+        return {**allocation_tracker.stats(), **allocation_tracker.diff(group_by, top, rebase)}
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+
+@router.delete("/memory/tracemalloc")
+def stop_tracemalloc():
+    """Выключает tracemalloc и забывает базовый снимок."""
+    return allocation_tracker.stop()
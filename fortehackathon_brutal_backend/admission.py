@@ -0,0 +1,179 @@
+"""
+Admission control перед threadpool скоринга.
+
+Без него при перегрузке запросы бесконечно копятся в очереди threadpool,
+задержка растёт, пока не сработают таймауты у вызывающей стороны, — и вся
+сделанная к тому моменту работа выброшена. Здесь:
+
+  • не больше max_in_flight запросов скорятся одновременно;
+  • не больше max_queue ждут своей очереди (FIFO), остальным сразу
+    Overloaded → 503 + Retry-After;
+  • запрос может нести дедлайн (X-Request-Timeout-Ms): истёкший в очереди
+    или перед стартом скоринга выбрасывается, не занимая модель.
+
+Контроллер живёт в event loop одного процесса (без блокировок); при
+prefork (serve.py) у каждого воркера свой.
+"""
+
+import asyncio
+import math
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, Optional
+
+import numpy as np
+
+
+class Overloaded(Exception):
+    """Очередь полна — запрос не принят."""
+
+    def __init__(self, retry_after: int):
+        super().__init__(f"Scoring queue is full, retry after {retry_after}s")
+        self.retry_after = retry_after
+
+
+class DeadlineExceeded(Exception):
+    """Дедлайн запроса истёк до начала скоринга."""
+
+
+def deadline_from_timeout_ms(timeout_ms: Optional[float]) -> Optional[float]:
+    """Относительный таймаут из заголовка → абсолютный дедлайн time.monotonic()."""
+    if timeout_ms is None or timeout_ms <= 0:
+        return None
+    return time.monotonic() + timeout_ms / 1000.0
+
+
+class AdmissionController:
+    """
+    Ограниченные in-flight и очередь с FIFO-передачей слота.
+    """
+
+    def __init__(
+        self,
+        max_in_flight: int,
+        max_queue: int,
+        min_retry_after: int = 1,
+        observer: Optional[Callable[[float, float], None]] = None,
+    ):
+        self.max_in_flight = max_in_flight
+        self.max_queue = max_queue
+        self.min_retry_after = min_retry_after
+        # observer(queue_ms, service_ms) на каждый принятый запрос (degradation.py);
+        # service_ms — на одну транзакцию: пачка /predict/batch делится на rows
+        self.observer = observer
+
+        self.in_flight = 0
+        self._waiters: Deque[asyncio.Future] = deque()
+
+        self.admitted = 0
+        self.completed = 0
+        self.shed_queue_full = 0
+        self.shed_deadline_queued = 0
+        self.shed_deadline_start = 0
+        self._queue_ms: Deque[float] = deque(maxlen=10_000)
+        self._service_ms: Deque[float] = deque(maxlen=1_000)
+
+    # ------------------------------------------------------------------
+    async def run(
+        self,
+        call: Callable[[Callable[[], None]], Awaitable[Any]],
+        deadline: Optional[float] = None,
+        rows: int = 1,
+    ) -> Any:
+        """
+        Ждёт слот и запускает call(check_deadline). call должен вызвать
+        check_deadline() в рабочем потоке прямо перед скорингом.
+        rows — сколько транзакций скорит call (для observer).
+        """
+        enqueued = time.monotonic()
+        await self._acquire(deadline)
+        started = time.monotonic()
+        queue_ms = (started - enqueued) * 1000
+        self._queue_ms.append(queue_ms)
+
+        def check_deadline():
+            if deadline is not None and time.monotonic() >= deadline:
+                self.shed_deadline_start += 1
+                raise DeadlineExceeded("Request deadline expired before scoring started")
+
+        try:
+            check_deadline()
+            result = await call(check_deadline)
+            self.completed += 1
+            return result
+        finally:
+            service_ms = (time.monotonic() - started) * 1000
+            self._service_ms.append(service_ms)
+            self._release()
+            if self.observer is not None:
+                self.observer(queue_ms, service_ms / max(rows, 1))
+
+    async def _acquire(self, deadline: Optional[float]):
+        if self.in_flight < self.max_in_flight and not self._waiters:
+            self.in_flight += 1
+            self.admitted += 1
+            return
+
+        if len(self._waiters) >= self.max_queue:
+            self.shed_queue_full += 1
+            raise Overloaded(self.retry_after())
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        timeout = None if deadline is None else max(deadline - time.monotonic(), 0.0)
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter), timeout)
+        except asyncio.TimeoutError:
+            if waiter.done() and not waiter.cancelled():
+                # слот передали в момент таймаута — возвращаем его
+                self._release()
+            else:
+                waiter.cancel()
+                self._waiters.remove(waiter)
+            self.shed_deadline_queued += 1
+            raise DeadlineExceeded("Request deadline expired in admission queue")
+        except asyncio.CancelledError:
+            # клиент отключился, пока ждал
+            if waiter.done() and not waiter.cancelled():
+                self._release()
+            else:
+                waiter.cancel()
+                self._waiters.remove(waiter)
+            raise
+        self.admitted += 1
+
+    def _release(self):
+        # слот переходит первому живому ожидающему, in_flight не меняется
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self.in_flight -= 1
+
+    # ------------------------------------------------------------------
+    def retry_after(self) -> int:
+        """Оценка (сек), через сколько очередь рассосётся: очередь × среднее время / слоты."""
+        if not self._service_ms:
+            return self.min_retry_after
+        mean_s = sum(self._service_ms) / len(self._service_ms) / 1000
+        estimate = len(self._waiters) * mean_s / max(self.max_in_flight, 1)
+        return max(self.min_retry_after, math.ceil(estimate))
+
+    def stats(self) -> Dict[str, Any]:
+        queue_ms = np.fromiter(self._queue_ms, dtype=float)
+        return {
+            "max_in_flight": self.max_in_flight,
+            "max_queue": self.max_queue,
+            "in_flight": self.in_flight,
+            "queued": len(self._waiters),
+            "admitted": self.admitted,
+            "completed": self.completed,
+            "shed_queue_full": self.shed_queue_full,
+            "shed_deadline_queued": self.shed_deadline_queued,
+            "shed_deadline_start": self.shed_deadline_start,
+            "queue_time_ms": {
+                f"p{int(q * 100)}": float(np.quantile(queue_ms, q))
+                for q in (0.5, 0.95, 0.99)
+            } if len(queue_ms) else {},
+        }
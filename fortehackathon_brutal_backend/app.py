@@ -1,9 +1,62 @@
-from fastapi import FastAPI
-from fastapi.middleware.cors import CORSMiddleware
+from contextlib import asynccontextmanager
 
-from router import router as api_router  # router is defined in router.py
+# первым — чтобы профиль старта видел все остальные импорты
+from startup_profile import profile
 
-app = FastAPI(title="Brutal Fraud Shield API")
+with profile.phase("import_fastapi"):
+    from fastapi import FastAPI
+    from fastapi.middleware.cors import CORSMiddleware
+
+with profile.phase("import_router"):
+    from router import router as api_router, admission, model_manager, resume_upload_scoring  # router is defined in router.py
+    from admin_router import router as admin_router
+
+import threading
+
+from config import ADMISSION_MAX_IN_FLIGHT, FLEET_DIR, FLEET_POLL_SECONDS, LAZY_HEAVY_IMPORTS
+from fleet import FleetControl
+
+
+def _warm_up_and_init():
+    # /ready = 503, пока модели не прогреты в этом процессе
+    model_manager.warm_up()
+    # shap / numba — уже после готовности, не задерживая первый скоринг
+    if LAZY_HEAVY_IMPORTS:
+        model_manager.current.start_background_init()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # под serve.py модель уже распакована в мастере — здесь no-op
+    detector = model_manager.load()
+
+    # Размер threadpool скоринга — из общего бюджета потоков (thread_budget.py)
+    budget = detector.thread_budget
+    budget.configure_executor()
+    admission.max_in_flight = ADMISSION_MAX_IN_FLIGHT or budget.executor_threads
+    print(f"[ThreadBudget] {budget.stats()}")
+
+    # фоновая чистка истории — в каждом воркере свой поток (после форка)
+    detector.retention.start()
+
+    # prefork: перезагрузки модели из admin-запросов других воркеров (fleet.py)
+    if FLEET_DIR:
+        model_manager.follow_fleet(FleetControl(FLEET_DIR), FLEET_POLL_SECONDS)
+
+    # resumable-загрузки, скоринг которых прервал рестарт (uploads.py)
+    resume_upload_scoring()
+
+    profile.mark("ready")
+    print(f"[Startup] serving in {profile.marks['ready']:.0f} ms since process start")
+    # прогрев (и ленивые shap / numba) — в фоне, в процессе, который скорит
+    threading.Thread(target=_warm_up_and_init, name="warm-up", daemon=True).start()
+    yield
+
+    if model_manager.fleet is not None:
+        model_manager.fleet.stop()
+
+
+app = FastAPI(title="Brutal Fraud Shield API", lifespan=lifespan)
 
 # --- CORS НАСТРОЙКА ---
 origins = [
@@ -22,6 +75,7 @@ app.add_middleware(
 # --- Подключаем твой router с /predict, /bulk_predict и т.д. ---
 # Router is already imported as `api_router` above
 app.include_router(api_router)
+app.include_router(admin_router)
 
 @app.get("/")
 def root():
@@ -0,0 +1,224 @@
+"""
+Офлайн batch-скоринг исторических датасетов на всех ядрах, без API.
+
+    python batch_score.py --input transactions.csv --output scored.csv
+    python batch_score.py --input transactions.parquet --output scored.parquet --workers 16
+
+Раньше такие файлы гоняли через /bulk_predict работающего сервиса:
+один процесс и конкуренция с продовым трафиком. Здесь:
+
+  • вход (CSV через ingest.py или Parquet) чистится так же, как в
+    /bulk_predict, и делится на партиции по cst_dim_id — история клиента
+    целиком в одной партиции, строки внутри неё идут в порядке файла
+    (--sort-by-time — сначала стабильная сортировка по transdatetime);
+  • графовые фичи (receiver_in_degree и т.п.) зависят от всех клиентов,
+    поэтому считаются заранее одним проходом в порядке строк
+    (graph_index.precompute_edge_features), а партиции их проигрывают;
+  • партиции скорит пул процессов (spawn, модель грузится в каждом
+    процессе, потоки моделей — --model-threads на процесс), каждая
+    пишет свой parquet; в конце части сливаются в исходном порядке строк;
+  • прогресс и rows/s — раз в --report-interval секунд.
+
+Скоры совпадают с последовательным онлайн-путём (/bulk_predict на том же
+файле) до бита: те же фичи, та же история, та же модель, а IsolationForest
+с numba и без складывает глубины в одном порядке (fast_iforest.py) —
+проверяется tests/test_batch_score.py. Фоновая чистка
+истории по глобальному «водяному знаку» здесь выключена — в сервисе она
+идёт по таймеру и может выселить старую историю клиента посреди файла.
+"""
+
+import argparse
+import os
+import shutil
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from datetime import datetime
+from multiprocessing import get_context
+from typing import Any, Dict, List
+
+import numpy as np
+import pandas as pd
+
+from bulk_scoring import clean_bulk_frame, missing_columns, read_bulk_csv, score_bulk_frame
+from graph_index import EdgeFeatureReplay, precompute_edge_features
+from records import parse_datetimes
+
+# состояние процесса пула (заполняется в _init_worker)
+_worker: Dict[str, Any] = {}
+
+
+# ----------------------------------------------------------------------
+#  Процессы пула
+# ----------------------------------------------------------------------
+def _init_worker(model_path: str, progress):
+    from model import FraudDetectionAPI
+
+    # таймерная чистка истории не запускается (retention.start() не вызывается):
+    # см. docstring модуля — без неё история детерминирована
+    detector = FraudDetectionAPI(model_path)
+    _worker["detector"] = detector
+    _worker["progress"] = progress
+
+
+def _score_partition(part_id: int, df: pd.DataFrame, graph_names, graph_values, parts_dir: str, chunk_rows: int):
+    started = time.perf_counter()
+    detector = _worker["detector"]
+    detector.graph_index = EdgeFeatureReplay(
+        graph_names,
+        graph_values,
+        [int(x) for x in df["cst_dim_id"]],
+        [str(x) for x in df["direction"]],
+    )
+    progress = _worker["progress"]
+
+    pieces = []
+    for start in range(0, len(df), chunk_rows):
+        pieces.append(score_bulk_frame(detector, df.iloc[start:start + chunk_rows].copy()))
+        with progress.get_lock():
+            progress.value += len(pieces[-1])
+
+    path = os.path.join(parts_dir, f"part-{part_id:05d}.parquet")
+    pd.concat(pieces).to_parquet(path, index=False)
+    return part_id, len(df), time.perf_counter() - started
+
+
+# ----------------------------------------------------------------------
+#  Мастер
+# ----------------------------------------------------------------------
+def _read_input(path: str) -> pd.DataFrame:
+    if path.endswith((".parquet", ".pq")):
+        df = pd.read_parquet(path)
+        print(f"[BatchScore] {len(df)} rows read from parquet")
+    else:
+        df, report = read_bulk_csv(path)
+        print(f"[BatchScore] {report['rows']} rows read ({report['engine']}, {report['rows_per_sec']} rows/s)")
+    missing = missing_columns(df)
+    if missing:
+        raise SystemExit(f"Missing required columns: {', '.join(missing)}")
+    df = clean_bulk_frame(df)
+    print(f"[BatchScore] {len(df)} valid rows")
+    return df
+
+
+def _timestamps(df: pd.DataFrame) -> List[datetime]:
+    # тот же разбор, что у поля transdatetime в TransactionInput
+    return parse_datetimes(df["transdatetime"])
+
+
+def _write_output(df: pd.DataFrame, path: str):
+    if path.endswith((".parquet", ".pq")):
+        df.to_parquet(path, index=False)
+    else:
+        # как в /bulk_predict — те же байты
+        df.to_csv(path, index=False)
+
+
+def run(args):
+    import joblib
+
+    started = time.perf_counter()
+    df = _read_input(args.input)
+    timestamps = _timestamps(df)
+    if args.sort_by_time:
+        order = np.argsort(np.asarray(timestamps, dtype="datetime64[us]"), kind="stable")
+        df = df.iloc[order].reset_index(drop=True)
+        timestamps = [timestamps[i] for i in order]
+
+    # графовые фичи — одним проходом по всем клиентам
+    t0 = time.perf_counter()
+    history = joblib.load(args.model).get("history", {})
+    cst_ids = df["cst_dim_id"].astype(np.int64).to_numpy()
+    graph_names, graph_values = precompute_edge_features(
+        history,
+        zip((int(x) for x in cst_ids), (str(x) for x in df["direction"]), timestamps),
+    )
+    del history
+    print(f"[BatchScore] graph features precomputed in {time.perf_counter() - t0:.1f}s")
+
+    # партиции по клиенту; несколько на процесс — для балансировки
+    workers = args.workers or os.cpu_count() or 1
+    n_parts = max(1, min(workers * args.parts_per_worker, len(df)))
+    part_of = cst_ids % n_parts
+    df["_row"] = np.arange(len(df))
+
+    parts_dir = args.output + ".parts"
+    shutil.rmtree(parts_dir, ignore_errors=True)
+    os.makedirs(parts_dir)
+
+    # потоки моделей на процесс; SHAP, дрейф и деградация здесь не нужны
+    os.environ["THROUGHPUT_MODEL_THREADS"] = str(args.model_threads)
+    os.environ.setdefault("OMP_NUM_THREADS", str(args.model_threads))
+    os.environ["LAZY_HEAVY_IMPORTS"] = "1"
+    os.environ["DRIFT_ENABLED"] = "0"
+    os.environ["DEGRADATION_ENABLED"] = "0"
+
+    ctx = get_context("spawn")
+    progress = ctx.Value("q", 0)
+    total = len(df)
+    print(f"[BatchScore] {total} rows in {n_parts} partitions on {workers} processes")
+    score_started = time.perf_counter()
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=ctx,
+        initializer=_init_worker,
+        initargs=(args.model, progress),
+    ) as pool:
+        partitions = [np.flatnonzero(part_of == p) for p in range(n_parts)]
+        # крупные партиции первыми — меньше хвост в конце
+        pending = {
+            pool.submit(
+                _score_partition, p, df.iloc[rows], graph_names, graph_values[rows], parts_dir, args.chunk_rows,
+            )
+            for p, rows in sorted(enumerate(partitions), key=lambda item: -len(item[1]))
+            if len(rows)
+        }
+        submitted, done_parts = len(pending), 0
+        while pending:
+            done, pending = wait(pending, timeout=args.report_interval, return_when=FIRST_COMPLETED)
+            for future in done:
+                future.result()
+                done_parts += 1
+            scored = progress.value
+            elapsed = time.perf_counter() - score_started
+            rate = scored / elapsed if elapsed > 0 else 0.0
+            eta = f"{(total - scored) / rate:.0f}s" if rate > 0 else "?"
+            print(
+                f"[BatchScore] {scored}/{total} rows ({scored / total:.0%}), "
+                f"{done_parts}/{submitted} partitions, {rate:.0f} rows/s, ETA {eta}"
+            )
+
+    # слияние частей в исходном порядке строк
+    t0 = time.perf_counter()
+    result = pd.concat(
+        [pd.read_parquet(os.path.join(parts_dir, name)) for name in sorted(os.listdir(parts_dir))],
+        ignore_index=True,
+    )
+    result = result.sort_values("_row", kind="stable").drop(columns="_row").reset_index(drop=True)
+    _write_output(result, args.output)
+    if not args.keep_parts:
+        shutil.rmtree(parts_dir)
+
+    seconds = time.perf_counter() - started
+    print(
+        f"[BatchScore] {len(result)} rows written to {args.output} in {seconds:.1f}s "
+        f"(merge {time.perf_counter() - t0:.1f}s, {len(result) / seconds:.0f} rows/s overall)"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Офлайн batch-скоринг на всех ядрах")
+    parser.add_argument("--input", required=True, help="CSV (формат /bulk_predict) или Parquet")
+    parser.add_argument("--output", required=True, help="куда записать результат: .csv или .parquet")
+    parser.add_argument("--model", default="model_package.pkl")
+    parser.add_argument("--workers", type=int, default=0, help="процессов (0 — по числу ядер)")
+    parser.add_argument("--model-threads", type=int, default=1, help="потоков моделей на процесс")
+    parser.add_argument("--parts-per-worker", type=int, default=4, help="партиций на процесс (балансировка)")
+    parser.add_argument("--chunk-rows", type=int, default=200, help="строк между отметками прогресса")
+    parser.add_argument("--sort-by-time", action="store_true", help="стабильно отсортировать по transdatetime")
+    parser.add_argument("--report-interval", type=float, default=5.0)
+    parser.add_argument("--keep-parts", action="store_true", help="не удалять файлы партиций")
+    run(parser.parse_args())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""
+Аллокации на строку: путь DTO (TransactionInput → predict_batch →
+TransactionOutput, как /predict/batch) против внутренних записей
+(TxRecord → score_records → ScoreBatch, как bulk и стрим).
+
+Для каждого пути: время на строку, пик и число блоков tracemalloc на
+строку, сколько создано DataFrame / Series / pydantic-моделей (по
+счётчикам вызовов cProfile).
+
+    python benchmarks/bench_allocations.py --model model_package.pkl --csv transactions.csv -n 2000
+"""
+
+import argparse
+import cProfile
+import os
+import pstats
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bulk_scoring import clean_bulk_frame, read_bulk_csv  # noqa: E402
+from dtos import TransactionInput  # noqa: E402
+from model import FraudDetectionAPI  # noqa: E402
+from records import TxRecord  # noqa: E402
+
+# (файл, функция) конструкторов, чьи вызовы считаем
+_CONSTRUCTORS = {
+    "DataFrame": ("pandas/core/frame.py", "__init__"),
+    "Series": ("pandas/core/series.py", "__init__"),
+    "pydantic": ("pydantic/main.py", "__init__"),
+}
+
+
+def _dto_path(detector, df):
+    transactions = [
+        TransactionInput(
+            cst_dim_id=int(row.cst_dim_id),
+            amount=float(row.amount),
+            direction=str(row.direction),
+            transdatetime=str(row.transdatetime),
+        )
+        for row in df.itertuples(index=False)
+    ]
+    return detector.predict_batch(transactions, explain=False)
+
+
+def _records_path(detector, df):
+    records = TxRecord.from_columns(df["cst_dim_id"], df["amount"], df["direction"], df["transdatetime"])
+    return detector.score_records(records)
+
+
+def _constructor_calls(fn, detector, df):
+    profiler = cProfile.Profile()
+    profiler.runcall(fn, detector, df)
+    counts = dict.fromkeys(_CONSTRUCTORS, 0)
+    for (filename, _, funcname), (_, calls, *_) in pstats.Stats(profiler).stats.items():
+        for name, (suffix, constructor) in _CONSTRUCTORS.items():
+            if funcname == constructor and filename.replace(os.sep, "/").endswith(suffix):
+                counts[name] += calls
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--model", default="model_package.pkl")
+    parser.add_argument("--csv", required=True)
+    parser.add_argument("-n", type=int, default=2000, help="сколько строк файла скорить")
+    args = parser.parse_args()
+
+    df, _ = read_bulk_csv(args.csv)
+    df = clean_bulk_frame(df.head(args.n))
+    rows = len(df)
+
+    def fresh_detector():
+        # у каждого прогона своя история — строки скорятся одинаково
+        detector = FraudDetectionAPI(args.model)
+        detector.warm_up()
+        return detector
+
+    print(f"{'path':<8} {'rows':>6} {'us/row':>8} {'peak B/row':>11} {'live blk/row':>12} "
+          f"{'DataFrame':>10} {'Series':>8} {'pydantic':>9}")
+    for name, fn in (("dto", _dto_path), ("records", _records_path)):
+        detector = fresh_detector()
+        started = time.perf_counter()
+        fn(detector, df)
+        per_row_us = (time.perf_counter() - started) / rows * 1e6
+
+        detector = fresh_detector()
+        tracemalloc.start()
+        tracemalloc.reset_peak()
+        result = fn(detector, df)
+        peak = tracemalloc.get_traced_memory()[1]
+        blocks = sum(stat.count for stat in tracemalloc.take_snapshot().statistics("filename"))
+        tracemalloc.stop()
+        del result
+
+        counts = _constructor_calls(fn, fresh_detector(), df)
+        print(f"{name:<8} {rows:>6} {per_row_us:>8.0f} {peak / rows:>11.0f} {blocks / rows:>12.1f} "
+              f"{counts['DataFrame']:>10} {counts['Series']:>8} {counts['pydantic']:>9}")
+
+
+if __name__ == "__main__":
+    main()
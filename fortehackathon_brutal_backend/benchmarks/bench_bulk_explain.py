@@ -0,0 +1,79 @@
+"""
+Цена SHAP-колонок в bulk: обычный прогон, explain=true (SHAP CatBoost
+всей матрицей) и explain с порогом по fraud_score — против прежнего
+построчного SHAP (TreeExplainer на каждую строку, как в /predict).
+
+    python benchmarks/bench_bulk_explain.py --model model_package.pkl --csv transactions.csv -n 5000
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bulk_scoring import clean_bulk_frame, read_bulk_csv, score_bulk_frame  # noqa: E402
+from model import FraudDetectionAPI  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--model", default="model_package.pkl")
+    parser.add_argument("--csv", required=True)
+    parser.add_argument("-n", type=int, default=5000, help="сколько строк файла скорить")
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--min-score", type=float, default=0.5)
+    args = parser.parse_args()
+
+    df, _ = read_bulk_csv(args.csv)
+    df = clean_bulk_frame(df.head(args.n))
+
+    def fresh_detector():
+        # у каждого прогона своя пустая история — строки скорятся одинаково
+        detector = FraudDetectionAPI(args.model)
+        detector.load_background_components()
+        return detector
+
+    runs = {
+        "plain": {},
+        "explain": {"explain": True, "explain_top_k": args.top_k},
+        f"explain>={args.min_score}": {
+            "explain": True, "explain_top_k": args.top_k, "explain_min_score": args.min_score,
+        },
+    }
+
+    print(f"{'run':<16} {'rows':>6} {'explained':>9} {'scoring, s':>11} {'explain, s':>11} {'total, s':>9} {'+%':>6}")
+    base = None
+    for name, options in runs.items():
+        detector = fresh_detector()
+        started = time.perf_counter()
+        result = score_bulk_frame(detector, df.copy(), **options)
+        total = time.perf_counter() - started
+        base = base or total
+        t = result.attrs["timings"]
+        print(f"{name:<16} {t['rows']:>6} {t['explained_rows']:>9} {t['scoring_seconds']:>11.2f} "
+              f"{t['explain_seconds']:>11.3f} {total:>9.2f} {(total / base - 1) * 100:>6.1f}")
+
+    # прежний путь: SHAP TreeExplainer построчно внутри скоринга
+    detector = fresh_detector()
+    started = time.perf_counter()
+    detector.predict_batch(list(_transactions(df)), explain=True)
+    total = time.perf_counter() - started
+    print(f"{'per-row shap':<16} {len(df):>6} {len(df):>9} {'':>11} {'':>11} {total:>9.2f} {(total / base - 1) * 100:>6.1f}")
+
+
+def _transactions(df):
+    from dtos import TransactionInput
+
+    for row in df.itertuples(index=False):
+        yield TransactionInput(
+            cst_dim_id=int(row.cst_dim_id),
+            amount=float(row.amount),
+            direction=str(row.direction),
+            transdatetime=str(row.transdatetime),
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+"""
+Сравнение sklearn IsolationForest.decision_function и сплющенного
+скорера (fast_iforest.py) на одной строке и на пачке.
+
+    python benchmarks/bench_iforest.py --model model_package.pkl --batch 1000
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import joblib
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fast_iforest import FlatIsolationForest  # noqa: E402
+
+
+def _timeit(func, repeat: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    return (time.perf_counter() - start) / repeat * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--model", default="model_package.pkl")
+    parser.add_argument("--batch", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    pkg = joblib.load(args.model)
+    iso = pkg["iso"]
+    rng = np.random.default_rng(0)
+    X = pd.DataFrame(rng.normal(size=(args.batch, iso.n_features_in_)), columns=pkg["feature_cols"])
+    row = X.iloc[[0]]
+
+    scorers = {"numpy": FlatIsolationForest(iso)}
+    compiled = FlatIsolationForest(iso)
+    if compiled.enable_numba():  # JIT-компиляция вне замера
+        scorers["numba"] = compiled
+
+    reference = iso.decision_function(X)
+    print(f"{'scorer':<8} {'1 row, ms':>10} {f'{args.batch} rows, ms':>16} {'max |diff|':>12}")
+    print(f"{'sklearn':<8} {_timeit(lambda: iso.decision_function(row), args.repeat):>10.3f} "
+          f"{_timeit(lambda: iso.decision_function(X), 5):>16.2f} {0:>12.1e}")
+    for name, scorer in scorers.items():
+        diff = np.abs(scorer.decision_function(X) - reference).max()
+        print(f"{name:<8} {_timeit(lambda: scorer.decision_function(row), args.repeat):>10.3f} "
+              f"{_timeit(lambda: scorer.decision_function(X), 5):>16.2f} {diff:>12.1e}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""
+Где «колено» пропускной способности на данном числе ядер.
+
+Прогоняет инференс трёх бустеров (CatBoost + XGBoost + LightGBM) без
+HTTP, в двух режимах:
+
+  • single — N одиночных строк из пула executor_threads потоков,
+             каждая модель с model_threads потоками (профиль latency);
+  • matrix — матрица --rows строк одним вызовом с model_threads потоками
+             (профиль throughput, bulk).
+
+Для каждой комбинации печатает rows/s и p99 задержки: колено — где рост
+executor_threads / model_threads перестаёт давать rows/s, а p99 растёт.
+
+    python benchmarks/bench_thread_budget.py --model model_package.pkl -n 2000
+"""
+
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import joblib
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from thread_budget import ThreadBudget, available_cores  # noqa: E402
+
+
+def _grid(cores: int):
+    values = sorted({1, 2, 4, cores // 2, cores, cores * 2} - {0})
+    return [v for v in values if v <= max(cores * 2, 1)]
+
+
+def _score(budget: ThreadBudget, pkg, X: pd.DataFrame, profile: str):
+    for kind in ("catboost", "xgboost", "lightgbm"):
+        budget.predict_proba(kind, pkg[kind], X, profile)
+
+
+def bench_single(pkg, X: pd.DataFrame, executor_threads: int, model_threads: int, n: int):
+    budget = ThreadBudget(executor_threads, latency_threads=model_threads)
+    budget.prepare(pkg["xgboost"])
+    rows = [X.iloc[[i % len(X)]] for i in range(n)]
+    latencies = []
+
+    def one(row):
+        t0 = time.perf_counter()
+        _score(budget, pkg, row, "latency")
+        latencies.append((time.perf_counter() - t0) * 1000)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(executor_threads) as pool:
+        list(pool.map(one, rows))
+    elapsed = time.perf_counter() - start
+    return n / elapsed, float(np.percentile(latencies, 99))
+
+
+def bench_matrix(pkg, X: pd.DataFrame, model_threads: int, repeat: int = 3):
+    budget = ThreadBudget(1, latency_threads=model_threads, throughput_threads=model_threads)
+    budget.prepare(pkg["xgboost"])
+    _score(budget, pkg, X, "throughput")  # прогрев
+    times = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        _score(budget, pkg, X, "throughput")
+        times.append(time.perf_counter() - t0)
+    return len(X) / min(times), max(times) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--model", default="model_package.pkl")
+    parser.add_argument("-n", type=int, default=2000, help="одиночных строк на точку")
+    parser.add_argument("--rows", type=int, default=20000, help="строк в матрице")
+    args = parser.parse_args()
+
+    pkg = joblib.load(args.model)
+    cols = pkg["feature_cols"] + ["anomaly_score"]
+    rng = np.random.default_rng(0)
+    X = pd.DataFrame(rng.normal(size=(args.rows, len(cols))), columns=cols)
+
+    cores = available_cores()
+    print(f"cores available: {cores}")
+
+    print("\nsingle (latency profile)")
+    print(f"{'executor':>8} {'model_thr':>9} {'rows/s':>10} {'p99, ms':>9}")
+    for model_threads in sorted({1, cores}):
+        for executor_threads in _grid(cores):
+            rps, p99 = bench_single(pkg, X, executor_threads, model_threads, args.n)
+            print(f"{executor_threads:>8} {model_threads:>9} {rps:>10.0f} {p99:>9.2f}")
+
+    print(f"\nmatrix of {args.rows} rows (throughput profile)")
+    print(f"{'model_thr':>9} {'rows/s':>10} {'worst, ms':>10}")
+    for model_threads in _grid(cores):
+        rps, worst = bench_matrix(pkg, X, model_threads)
+        print(f"{model_threads:>9} {rps:>10.0f} {worst:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
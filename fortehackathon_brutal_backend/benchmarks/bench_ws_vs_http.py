@@ -0,0 +1,124 @@
+"""
+Бенчмарк: задержка на одно сообщение через WebSocket (/ws/predict)
+против /predict поверх keep-alive HTTP.
+
+Запуск (API должен быть поднят):
+    python benchmarks/bench_ws_vs_http.py --url http://localhost:8000 -n 2000
+
+Режимы:
+  • sequential — по одному запросу за раз, меряем round-trip;
+  • pipelined  — WebSocket с --window запросами «в полёте»
+                 (HTTP/1.1 так не умеет, это основное преимущество канала).
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import statistics
+import time
+from datetime import datetime, timedelta
+
+import httpx
+import websockets
+
+
+def make_payloads(n: int, seed: int = 42):
+    rnd = random.Random(seed)
+    base = datetime(2025, 6, 1, 9, 0, 0)
+    directions = ["card_transfer", "card_payment", "cash_withdrawal", "p2p"]
+    return [
+        {
+            "cst_dim_id": rnd.randint(1, 5000),
+            "amount": round(rnd.lognormvariate(8, 1.2), 2),
+            "direction": rnd.choice(directions),
+            "transdatetime": (base + timedelta(minutes=i)).strftime("%Y-%m-%d %H:%M:%S"),
+        }
+        for i in range(n)
+    ]
+
+
+def summarize(name: str, latencies_ms, wall_s: float):
+    lat = sorted(latencies_ms)
+    q = statistics.quantiles(lat, n=100)
+    print(
+        f"{name:<22} n={len(lat):<6} "
+        f"mean={statistics.fmean(lat):7.2f}ms "
+        f"p50={q[49]:7.2f}ms p95={q[94]:7.2f}ms p99={q[98]:7.2f}ms "
+        f"rps={len(lat) / wall_s:8.1f}"
+    )
+
+
+def bench_http(url: str, payloads):
+    latencies = []
+    # один Client = один пул keep-alive соединений
+    with httpx.Client(base_url=url, timeout=30) as client:
+        client.post("/predict", json=payloads[0]).raise_for_status()  # прогрев
+        wall = time.perf_counter()
+        for p in payloads:
+            t0 = time.perf_counter()
+            client.post("/predict", json=p).raise_for_status()
+            latencies.append((time.perf_counter() - t0) * 1000)
+        wall = time.perf_counter() - wall
+    summarize("http keep-alive", latencies, wall)
+
+
+async def bench_ws_sequential(ws_url: str, payloads):
+    latencies = []
+    async with websockets.connect(ws_url, max_size=None) as ws:
+        await ws.send(json.dumps({"id": -1, "transaction": payloads[0]}))
+        await ws.recv()  # прогрев
+        wall = time.perf_counter()
+        for i, p in enumerate(payloads):
+            t0 = time.perf_counter()
+            await ws.send(json.dumps({"id": i, "transaction": p}))
+            reply = json.loads(await ws.recv())
+            if not reply["ok"]:
+                raise RuntimeError(reply["error"])
+            latencies.append((time.perf_counter() - t0) * 1000)
+        wall = time.perf_counter() - wall
+    summarize("ws sequential", latencies, wall)
+
+
+async def bench_ws_pipelined(ws_url: str, payloads, window: int):
+    sent_at = {}
+    latencies = []
+    async with websockets.connect(ws_url, max_size=None) as ws:
+        window_sem = asyncio.Semaphore(window)
+
+        async def reader():
+            for _ in range(len(payloads)):
+                reply = json.loads(await ws.recv())
+                if not reply["ok"]:
+                    raise RuntimeError(reply["error"])
+                latencies.append((time.perf_counter() - sent_at.pop(reply["id"])) * 1000)
+                window_sem.release()
+
+        wall = time.perf_counter()
+        reader_task = asyncio.create_task(reader())
+        for i, p in enumerate(payloads):
+            await window_sem.acquire()
+            sent_at[i] = time.perf_counter()
+            await ws.send(json.dumps({"id": i, "transaction": p}))
+        await reader_task
+        wall = time.perf_counter() - wall
+    summarize(f"ws pipelined (w={window})", latencies, wall)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("-n", type=int, default=1000, help="число сообщений на режим")
+    parser.add_argument("--window", type=int, default=16, help="сколько WS-запросов держать в полёте")
+    args = parser.parse_args()
+
+    payloads = make_payloads(args.n)
+    ws_url = args.url.replace("http://", "ws://").replace("https://", "wss://").rstrip("/") + "/ws/predict"
+
+    bench_http(args.url, payloads)
+    asyncio.run(bench_ws_sequential(ws_url, payloads))
+    asyncio.run(bench_ws_pipelined(ws_url, payloads, args.window))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+"""
+Общая часть batch-скоринга CSV: чтение, очистка и скоринг DataFrame.
+
+Используется /bulk_predict (файл целиком) и resumable-загрузками
+(uploads.py, файл по кускам) — колонки результата одинаковые.
+"""
+
+import time
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+import numpy as np
+import pandas as pd
+
+from ingest import CsvDialect, read_csv
+from records import TxRecord
+
+REQUIRED_COLUMNS = ("cst_dim_id", "amount", "direction", "transdatetime")
+
+RESULT_COLUMNS = (
+    "fraud_score",
+    "prediction",
+    "risk_level",
+    "model_version",
+    "threshold_used",
+    "score_catboost",
+    "score_xgboost",
+    "score_lightgbm",
+    "anomaly_score",
+)
+
+
+def read_bulk_csv(source: Union[bytes, str], dialect: Optional[CsvDialect] = None) -> Tuple[pd.DataFrame, Dict[str, Any]]:
+    """
+    CSV за один проход (ingest.py): кодировка, разделитель, строка заголовка
+    и десятичная запятая — по образцу, amount сразу числом.
+    Поддерживаются и utf-8 csv, и исходный банковский csv (cp1251, ';',
+    строка-название перед заголовком).
+    """
+    return read_csv(
+        source,
+        dialect=dialect,
+        expected_columns=REQUIRED_COLUMNS,
+        numeric_columns=("amount",),
+        string_columns=("direction", "transdatetime"),
+    )
+
+
+def missing_columns(df: pd.DataFrame) -> List[str]:
+    return sorted(set(REQUIRED_COLUMNS) - set(df.columns))
+
+
+def clean_bulk_frame(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Приведение типов и очистка; строки без обязательных полей выкидываются.
+    Колонки должны быть проверены missing_columns заранее.
+    """
+    # cst_dim_id -> число
+    df["cst_dim_id"] = pd.to_numeric(df["cst_dim_id"], errors="coerce")
+
+    # amount как в твоём пайплайне (убрать кавычки, пробелы, запятые);
+    # read_bulk_csv уже отдаёт его числом
+    if not pd.api.types.is_numeric_dtype(df["amount"]):
+        df["amount"] = (
+            df["amount"]
+            .astype(str)
+            .str.replace('"', "", regex=False)
+            .str.replace(",", ".", regex=False)
+            .str.replace(" ", "", regex=False)
+        )
+        df["amount"] = pd.to_numeric(df["amount"], errors="coerce")
+
+    # direction и transdatetime как строки
+    df["direction"] = df["direction"].astype(str)
+    df["transdatetime"] = df["transdatetime"].astype(str)
+
+    # выкидываем строки, где что-то критично пропало
+    return df.dropna(subset=list(REQUIRED_COLUMNS)).reset_index(drop=True)
+
+
+def score_bulk_frame(
+    detector,
+    df: pd.DataFrame,
+    explain: bool = False,
+    explain_top_k: int = 5,
+    explain_min_score: Optional[float] = None,
+) -> pd.DataFrame:
+    """
+    Скорит очищенный DataFrame (профиль throughput) и добавляет колонки
+    RESULT_COLUMNS. Синхронно — вызывается в bulk-полосе потоков.
+
+    Построчный SHAP в bulk не считается (top_features в CSV нет).
+    explain=True — SHAP CatBoost всей матрицей (explain_batch) и колонки
+    top{i}_feature / top{i}_shap; explain_min_score — только для строк
+    с fraud_score не ниже порога, у остальных колонки пустые.
+    Время скоринга и объяснений — в df.attrs["timings"].
+
+    Pydantic здесь не участвует: записи (records.TxRecord) собираются
+    прямо из колонок, результаты (ScoreBatch) пишутся колонками numpy.
+    """
+    records = TxRecord.from_columns(df["cst_dim_id"], df["amount"], df["direction"], df["transdatetime"])
+
+    started = time.perf_counter()
+    features: Optional[List[np.ndarray]] = [] if explain else None
+    batch = detector.score_records(records, features_out=features)
+    scoring_seconds = time.perf_counter() - started
+
+    df["fraud_score"] = batch.fraud_probability
+    df["prediction"] = batch.is_fraud.astype(np.int64)
+    df["risk_level"] = batch.risk_levels()
+    df["model_version"] = batch.model_version
+    df["threshold_used"] = batch.threshold
+    df["score_catboost"] = batch.scores["catboost"]
+    df["score_xgboost"] = batch.scores["xgboost"]
+    df["score_lightgbm"] = batch.scores["lightgbm"]
+    df["anomaly_score"] = batch.anomaly
+
+    explain_seconds = 0.0
+    explained = 0
+    if explain:
+        started = time.perf_counter()
+        selected = np.ones(len(df), dtype=bool)
+        if explain_min_score is not None:
+            selected = df["fraud_score"].to_numpy() >= explain_min_score
+        explained = int(selected.sum())
+        names = np.full((len(df), explain_top_k), None, dtype=object)
+        values = np.full((len(df), explain_top_k), np.nan)
+        if explained:
+            X = np.vstack(features)[selected]
+            top_names, top_values = detector.explain_batch(X, top_k=explain_top_k)
+            names[selected, :top_names.shape[1]] = top_names
+            values[selected, :top_values.shape[1]] = top_values
+        for i in range(explain_top_k):
+            df[f"top{i + 1}_feature"] = names[:, i]
+            df[f"top{i + 1}_shap"] = values[:, i]
+        explain_seconds = time.perf_counter() - started
+
+    df.attrs["timings"] = {
+        "rows": len(df),
+        "scoring_seconds": round(scoring_seconds, 4),
+        "explain_seconds": round(explain_seconds, 4),
+        "explained_rows": explained,
+    }
+    return df
@@ -0,0 +1,456 @@
+"""
+Python-клиент Brutal Fraud Shield API (sync + asyncio).
+
+    from client import FraudClient
+
+    with FraudClient("http://localhost:8000") as api:
+        res = api.predict({"cst_dim_id": 1234, "amount": 50000,
+                           "direction": "card_transfer",
+                           "transdatetime": "2024-01-15 23:45:00"})
+        results = api.predict_dataframe(df, chunk_size=1000)
+
+Возможности:
+  • keep-alive пул соединений (один httpx.Client / AsyncClient на клиента);
+  • auto_batch=True — одиночные predict() прозрачно склеиваются
+    в запросы к /predict/batch (по размеру или по задержке);
+  • predict_dataframe — параллельная отправка чанков с ограниченным
+    окном «в полёте», результаты возвращаются в исходном порядке;
+  • payloads_from_dataframe — векторная сборка payload'ов без iterrows().
+
+По умолчанию чанки predict_dataframe идут по одному (max_in_flight=1):
+история клиента на сервере пополняется в хронологии файла. При
+max_in_flight > 1 чанки скорятся параллельно и порядок транзакций одного
+клиента между чанками не гарантирован.
+"""
+
+import asyncio
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Sequence, Set
+
+import httpx
+import pandas as pd
+
+ProgressCallback = Callable[[int, int], None]
+
+# колонки-синонимы, как их понимал дашборд: первая найденная — основная,
+# остальные заполняют пропуски
+_COLUMN_ALIASES = {
+    "cst_dim_id": ("cst_dim_id", "customer_id", "cst"),
+    "transdatetime": ("transdatetime", "timestamp"),
+    "amount": ("amount", "amt"),
+    "direction": ("direction",),
+}
+DEFAULT_DIRECTION = "card_transfer"
+
+
+class FraudAPIError(RuntimeError):
+    """Ошибка ответа API (статус + detail)."""
+
+    def __init__(self, status_code: int, detail: Any):
+        super().__init__(f"HTTP {status_code}: {detail}")
+        self.status_code = status_code
+        self.detail = detail
+
+
+def _check_batch_results(batch: Sequence[Any], results: Sequence[Any]):
+    """Ответ /predict/batch короче пачки — без проверки zip оставил бы хвост futures навсегда."""
+    if len(results) != len(batch):
+        raise FraudAPIError(502, f"/predict/batch returned {len(results)} results for {len(batch)} transactions")
+
+
+# ----------------------------------------------------------------------
+#  Сборка payload'ов
+# ----------------------------------------------------------------------
+def _coalesce(df: pd.DataFrame, names: Sequence[str]) -> Optional[pd.Series]:
+    result = None
+    for name in names:
+        if name not in df.columns:
+            continue
+        col = df[name]
+        result = col if result is None else result.fillna(col)
+    return result
+
+
+def payloads_from_dataframe(df: pd.DataFrame) -> List[Dict[str, Any]]:
+    """
+    Векторно собирает список TransactionInput-payload'ов из DataFrame.
+    Пропуски: cst_dim_id/amount → 0, transdatetime → сейчас, direction → card_transfer.
+    """
+    n = len(df)
+    now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+    cst = _coalesce(df, _COLUMN_ALIASES["cst_dim_id"])
+    cst = (
+        pd.to_numeric(cst, errors="coerce").fillna(0).astype("int64")
+        if cst is not None else pd.Series(0, index=df.index, dtype="int64")
+    )
+
+    amount = _coalesce(df, _COLUMN_ALIASES["amount"])
+    amount = (
+        pd.to_numeric(amount, errors="coerce").fillna(0.0).astype(float)
+        if amount is not None else pd.Series(0.0, index=df.index)
+    )
+
+    ts = _coalesce(df, _COLUMN_ALIASES["transdatetime"])
+    if ts is None:
+        ts = pd.Series(now, index=df.index)
+    else:
+        ts = ts.astype("string").fillna(now).replace("", now)
+
+    direction = _coalesce(df, _COLUMN_ALIASES["direction"])
+    if direction is None:
+        direction = pd.Series(DEFAULT_DIRECTION, index=df.index)
+    else:
+        direction = direction.astype("string").fillna(DEFAULT_DIRECTION).replace("", DEFAULT_DIRECTION)
+
+    # .tolist() отдаёт нативные int/float/str — json-сериализуемо без конвертации
+    return [
+        {"cst_dim_id": c, "transdatetime": t, "amount": a, "direction": d}
+        for c, t, a, d in zip(cst.tolist(), ts.tolist(), amount.tolist(), direction.tolist())
+    ] if n else []
+
+
+def _chunks(items: Sequence[Any], chunk_size: int) -> List[Sequence[Any]]:
+    return [items[i:i + chunk_size] for i in range(0, len(items), chunk_size)]
+
+
+def _raise_for_status(response: httpx.Response):
+    if response.is_success:
+        return
+    try:
+        detail = response.json().get("detail", response.text)
+    except ValueError:
+        detail = response.text
+    raise FraudAPIError(response.status_code, detail)
+
+
+# ----------------------------------------------------------------------
+#  Sync
+# ----------------------------------------------------------------------
+class _ThreadBatcher:
+    """Склеивает одиночные predict() из разных потоков в /predict/batch."""
+
+    def __init__(self, client: "FraudClient", batch_size: int, delay_s: float):
+        self.client = client
+        self.batch_size = batch_size
+        self.delay_s = delay_s
+        self._pending: List[tuple] = []
+        self._cond = threading.Condition()
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="fraud-client-batcher", daemon=True)
+        self._thread.start()
+
+    def submit(self, payload: Dict[str, Any]) -> Future:
+        future: Future = Future()
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("FraudClient is closed")
+            self._pending.append((payload, future))
+            self._cond.notify()
+        return future
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._pending and not self._closed:
+                    self._cond.wait()
+                if not self._pending and self._closed:
+                    return
+                # ждём добора пачки не дольше delay_s
+                self._cond.wait_for(
+                    lambda: len(self._pending) >= self.batch_size or self._closed,
+                    timeout=self.delay_s,
+                )
+                batch = self._pending[:self.batch_size]
+                del self._pending[:self.batch_size]
+
+            try:
+                results = self.client.predict_batch([p for p, _ in batch])
+                _check_batch_results(batch, results)
+                for (_, future), result in zip(batch, results):
+                    future.set_result(result)
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        self._thread.join(timeout=10)
+
+
+class FraudClient:
+    """
+    Синхронный клиент с keep-alive пулом. Потокобезопасен.
+    """
+
+    def __init__(
+        self,
+        base_url: str = "http://localhost:8000",
+        timeout: float = 30.0,
+        max_connections: int = 20,
+        auto_batch: bool = False,
+        batch_size: int = 256,
+        batch_delay_ms: float = 5.0,
+    ):
+        self.base_url = base_url.rstrip("/")
+        self._http = httpx.Client(
+            base_url=self.base_url,
+            timeout=timeout,
+            limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_connections,
+            ),
+        )
+        self._batcher = (
+            _ThreadBatcher(self, batch_size, batch_delay_ms / 1000.0) if auto_batch else None
+        )
+
+    # --- низкоуровневое ---------------------------------------------
+    def _post_json(self, path: str, json: Any, timeout: Optional[float] = None, headers=None):
+        kwargs = {"json": json, "headers": headers}
+        if timeout is not None:
+            kwargs["timeout"] = timeout
+        response = self._http.post(path, **kwargs)
+        _raise_for_status(response)
+        return response
+
+    # --- API ---------------------------------------------------------
+    def predict(self, transaction: Dict[str, Any], idempotency_key: Optional[str] = None) -> Dict[str, Any]:
+        """Скоринг одной транзакции (при auto_batch — через /predict/batch)."""
+        if self._batcher is not None and idempotency_key is None:
+            return self._batcher.submit(transaction).result()
+        headers = {"Idempotency-Key": idempotency_key} if idempotency_key else None
+        return self._post_json("/predict", transaction, headers=headers).json()
+
+    def predict_batch(self, transactions: Sequence[Dict[str, Any]], timeout: Optional[float] = None) -> List[Dict[str, Any]]:
+        return self._post_json("/predict/batch", list(transactions), timeout=timeout).json()
+
+    def bulk_predict(self, file_bytes: bytes, filename: str = "transactions.csv", timeout: Optional[float] = None) -> bytes:
+        """CSV → CSV со скорингом (/bulk_predict)."""
+        kwargs = {"files": {"file": (filename, file_bytes, "text/csv")}}
+        if timeout is not None:
+            kwargs["timeout"] = timeout
+        response = self._http.post("/bulk_predict", **kwargs)
+        _raise_for_status(response)
+        return response.content
+
+    def stats(self) -> Dict[str, Any]:
+        response = self._http.get("/stats")
+        _raise_for_status(response)
+        return response.json()
+
+    def predict_dataframe(
+        self,
+        df: pd.DataFrame,
+        chunk_size: int = 1000,
+        max_in_flight: int = 1,
+        progress_cb: Optional[ProgressCallback] = None,
+        timeout: Optional[float] = None,
+    ) -> List[Dict[str, Any]]:
+        """
+        Скорит DataFrame чанками через /predict/batch, держа в полёте
+        не более max_in_flight запросов. Результаты — в порядке строк df.
+        """
+        chunks = _chunks(payloads_from_dataframe(df), chunk_size)
+        total = len(chunks)
+        if total == 0:
+            return []
+
+        results: List[Optional[List[Dict[str, Any]]]] = [None] * total
+        done = 0
+        with ThreadPoolExecutor(max_workers=max(1, max_in_flight)) as pool:
+            futures = {pool.submit(self.predict_batch, chunk, timeout): i for i, chunk in enumerate(chunks)}
+            for future in as_completed(futures):
+                results[futures[future]] = future.result()
+                done += 1
+                if progress_cb:
+                    progress_cb(done, total)
+
+        return [item for chunk in results for item in chunk]
+
+    # --- жизненный цикл -----------------------------------------------
+    def close(self):
+        if self._batcher is not None:
+            self._batcher.close()
+        self._http.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+# ----------------------------------------------------------------------
+#  Asyncio
+# ----------------------------------------------------------------------
+class _AsyncBatcher:
+    def __init__(self, client: "AsyncFraudClient", batch_size: int, delay_s: float):
+        self.client = client
+        self.batch_size = batch_size
+        self.delay_s = delay_s
+        self._pending: List[tuple] = []
+        self._full = asyncio.Event()
+        self._flusher: Optional[asyncio.Task] = None
+        # отправки в полёте: ссылки держим до завершения, aclose их дожидается
+        self._sends: Set[asyncio.Task] = set()
+        self._closed = False
+
+    async def submit(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        if self._closed:
+            raise RuntimeError("AsyncFraudClient is closed")
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((payload, future))
+        if len(self._pending) >= self.batch_size:
+            self._full.set()
+        if self._flusher is None or self._flusher.done():
+            self._flusher = asyncio.create_task(self._flush_loop())
+        return await future
+
+    async def _flush_loop(self):
+        while self._pending:
+            if not self._closed:
+                try:
+                    await asyncio.wait_for(self._full.wait(), timeout=self.delay_s)
+                except asyncio.TimeoutError:
+                    pass
+            self._full.clear()
+
+            batch = self._pending[:self.batch_size]
+            del self._pending[:self.batch_size]
+            if len(self._pending) >= self.batch_size:
+                self._full.set()
+            # отправку не ждём — следующая пачка собирается параллельно
+            task = asyncio.create_task(self._send(batch))
+            self._sends.add(task)
+            task.add_done_callback(self._sends.discard)
+
+    async def _send(self, batch):
+        try:
+            results = await self.client.predict_batch([p for p, _ in batch])
+            _check_batch_results(batch, results)
+            for (_, future), result in zip(batch, results):
+                if not future.done():
+                    future.set_result(result)
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+
+    async def aclose(self):
+        """Отправляет накопленное без задержки и ждёт все отправки в полёте."""
+        self._closed = True
+        self._full.set()
+        if self._flusher is not None:
+            await self._flusher
+        await asyncio.gather(*self._sends, return_exceptions=True)
+
+
+class AsyncFraudClient:
+    """
+    Asyncio-клиент с keep-alive пулом; тот же API, что у FraudClient, но async.
+    """
+
+    def __init__(
+        self,
+        base_url: str = "http://localhost:8000",
+        timeout: float = 30.0,
+        max_connections: int = 20,
+        auto_batch: bool = False,
+        batch_size: int = 256,
+        batch_delay_ms: float = 5.0,
+    ):
+        self.base_url = base_url.rstrip("/")
+        self._http = httpx.AsyncClient(
+            base_url=self.base_url,
+            timeout=timeout,
+            limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_connections,
+            ),
+        )
+        self._batcher = (
+            _AsyncBatcher(self, batch_size, batch_delay_ms / 1000.0) if auto_batch else None
+        )
+
+    async def _post_json(self, path: str, json: Any, timeout: Optional[float] = None, headers=None):
+        kwargs = {"json": json, "headers": headers}
+        if timeout is not None:
+            kwargs["timeout"] = timeout
+        response = await self._http.post(path, **kwargs)
+        _raise_for_status(response)
+        return response
+
+    async def predict(self, transaction: Dict[str, Any], idempotency_key: Optional[str] = None) -> Dict[str, Any]:
+        if self._batcher is not None and idempotency_key is None:
+            return await self._batcher.submit(transaction)
+        headers = {"Idempotency-Key": idempotency_key} if idempotency_key else None
+        return (await self._post_json("/predict", transaction, headers=headers)).json()
+
+    async def predict_batch(self, transactions: Sequence[Dict[str, Any]], timeout: Optional[float] = None) -> List[Dict[str, Any]]:
+        return (await self._post_json("/predict/batch", list(transactions), timeout=timeout)).json()
+
+    async def bulk_predict(self, file_bytes: bytes, filename: str = "transactions.csv", timeout: Optional[float] = None) -> bytes:
+        kwargs = {"files": {"file": (filename, file_bytes, "text/csv")}}
+        if timeout is not None:
+            kwargs["timeout"] = timeout
+        response = await self._http.post("/bulk_predict", **kwargs)
+        _raise_for_status(response)
+        return response.content
+
+    async def stats(self) -> Dict[str, Any]:
+        response = await self._http.get("/stats")
+        _raise_for_status(response)
+        return response.json()
+
+    async def predict_dataframe(
+        self,
+        df: pd.DataFrame,
+        chunk_size: int = 1000,
+        max_in_flight: int = 1,
+        progress_cb: Optional[ProgressCallback] = None,
+        timeout: Optional[float] = None,
+    ) -> List[Dict[str, Any]]:
+        chunks = _chunks(payloads_from_dataframe(df), chunk_size)
+        total = len(chunks)
+        if total == 0:
+            return []
+
+        window = asyncio.Semaphore(max(1, max_in_flight))
+        done = 0
+
+        async def send(chunk):
+            nonlocal done
+            async with window:
+                result = await self.predict_batch(chunk, timeout=timeout)
+            done += 1
+            if progress_cb:
+                progress_cb(done, total)
+            return result
+
+        results = await asyncio.gather(*(send(chunk) for chunk in chunks))
+        return [item for chunk in results for item in chunk]
+
+    async def aclose(self):
+        # сначала дослать пачки батчера — иначе их predict() упадут на закрытом пуле
+        if self._batcher is not None:
+            await self._batcher.aclose()
+        await self._http.aclose()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.aclose()
+
+
+__all__ = [
+    "FraudClient",
+    "AsyncFraudClient",
+    "FraudAPIError",
+    "payloads_from_dataframe",
+]
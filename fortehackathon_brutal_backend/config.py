@@ -6,3 +6,96 @@ load_dotenv()
 
 SQLALCHEMY_DATABASE_URL = os.getenv('SQLALCHEMY_DATABASE_URL')
 MODEL_DIR = "./model_package.pkl"
+
+# WebSocket-канал скоринга: сколько запросов одного соединения
+# может одновременно находиться в работе
+WS_MAX_IN_FLIGHT = int(os.getenv("WS_MAX_IN_FLIGHT", "64"))
+
+# Идемпотентность: сколько результатов держим и как долго (сек)
+IDEMPOTENCY_CACHE_SIZE = int(os.getenv("IDEMPOTENCY_CACHE_SIZE", "100000"))
+IDEMPOTENCY_TTL_SECONDS = float(os.getenv("IDEMPOTENCY_TTL_SECONDS", "86400"))
+
+# Feature store поведенческих признаков (см. feature_store.py);
+# файла нет — признаки заполняются нулями, как раньше, пока он не появится
+# (проверка раз в FEATURE_STORE_CHECK_SECONDS)
+FEATURE_STORE_PATH = os.getenv("FEATURE_STORE_PATH", "./behavioral_store.bin")
+FEATURE_STORE_CHECK_SECONDS = float(os.getenv("FEATURE_STORE_CHECK_SECONDS", "5"))
+
+# Сколько синтетических транзакций прогоняем через модели и SHAP
+# при старте и перед горячей подменой модели (0 — без прогрева)
+WARMUP_TRANSACTIONS = int(os.getenv("WARMUP_TRANSACTIONS", "32"))
+
+# Токен для /admin/* (заголовок X-Admin-Token); не задан — admin API выключен
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN")
+
+# Shadow-скоринг кандидата: ёмкость очереди (переполнение — drop, не ожидание)
+SHADOW_QUEUE_SIZE = int(os.getenv("SHADOW_QUEUE_SIZE", "1000"))
+
+# Удержание истории клиентов (см. history_retention.py):
+# глубина в днях, бюджет памяти в МБ (0 — без лимита),
+# сколько клиентов фоновый sweeper обходит за шаг и пауза между шагами (сек)
+HISTORY_RETENTION_DAYS = int(os.getenv("HISTORY_RETENTION_DAYS", "60"))
+HISTORY_MEMORY_BUDGET_MB = float(os.getenv("HISTORY_MEMORY_BUDGET_MB", "0"))
+HISTORY_SWEEP_BATCH = int(os.getenv("HISTORY_SWEEP_BATCH", "2000"))
+HISTORY_SWEEP_INTERVAL_SECONDS = float(os.getenv("HISTORY_SWEEP_INTERVAL_SECONDS", "1"))
+# насколько транзакция может опережать часы сервера (ч); более поздние
+# («2099-01-01») в истории остаются, но водяной знак чистки не двигают
+HISTORY_FUTURE_SKEW_HOURS = float(os.getenv("HISTORY_FUTURE_SKEW_HOURS", "24"))
+
+# Бюджет потоков (см. thread_budget.py), 0 — по числу доступных ядер
+# (для threadpool — не меньше 4):
+# размер threadpool скоринга, потоков на модель для одиночного скоринга
+# и для больших матриц, число одновременных bulk-выгрузок
+SCORING_THREADS = int(os.getenv("SCORING_THREADS", "0"))
+LATENCY_MODEL_THREADS = int(os.getenv("LATENCY_MODEL_THREADS", "1"))
+THROUGHPUT_MODEL_THREADS = int(os.getenv("THROUGHPUT_MODEL_THREADS", "0"))
+BULK_CONCURRENCY = int(os.getenv("BULK_CONCURRENCY", "1"))
+# строк в одной матрице внутренних пачек (score_records): признаки строятся
+# построчно, IsolationForest и бустеры вызываются раз на матрицу
+SCORE_CHUNK_ROWS = int(os.getenv("SCORE_CHUNK_ROWS", "4096"))
+
+# Admission control (см. admission.py): одновременно скорящихся запросов
+# (0 — по размеру threadpool), ожидающих в очереди, минимальный Retry-After (сек)
+ADMISSION_MAX_IN_FLIGHT = int(os.getenv("ADMISSION_MAX_IN_FLIGHT", "0"))
+ADMISSION_MAX_QUEUE = int(os.getenv("ADMISSION_MAX_QUEUE", "64"))
+ADMISSION_RETRY_AFTER_SECONDS = int(os.getenv("ADMISSION_RETRY_AFTER_SECONDS", "1"))
+
+# Деградация под нагрузкой (см. degradation.py): SLO по p95 времени в очереди
+# и p95 времени скоринга (мс), максимальный уровень (1 — без SHAP,
+# 2 — без самого медленного бустера, 3 — один бустер)
+DEGRADATION_ENABLED = os.getenv("DEGRADATION_ENABLED", "1") == "1"
+DEGRADATION_QUEUE_SLO_MS = float(os.getenv("DEGRADATION_QUEUE_SLO_MS", "50"))
+DEGRADATION_LATENCY_SLO_MS = float(os.getenv("DEGRADATION_LATENCY_SLO_MS", "200"))
+DEGRADATION_MAX_LEVEL = int(os.getenv("DEGRADATION_MAX_LEVEL", "3"))
+
+# Холодный старт: shap и ядро numba грузятся в фоне после готовности
+# сервиса (0 — синхронно при загрузке модели, как раньше)
+LAZY_HEAVY_IMPORTS = os.getenv("LAZY_HEAVY_IMPORTS", "1") == "1"
+
+# Общее состояние воркеров serve.py (см. fleet.py): каталог control.json
+# и статусов воркеров (пусто — один процесс, без синхронизации; serve.py
+# задаёт свой), период опроса воркерами (сек)
+FLEET_DIR = os.getenv("FLEET_DIR", "")
+FLEET_POLL_SECONDS = float(os.getenv("FLEET_POLL_SECONDS", "1"))
+
+# Resumable загрузки для batch-скоринга (см. uploads.py): каталог сессий,
+# максимальный размер одного куска (МБ), сколько часов хранится сессия
+UPLOAD_DIR = os.getenv("UPLOAD_DIR", "./uploads")
+UPLOAD_MAX_CHUNK_MB = float(os.getenv("UPLOAD_MAX_CHUNK_MB", "64"))
+UPLOAD_TTL_HOURS = float(os.getenv("UPLOAD_TTL_HOURS", "24"))
+
+# Мониторинг дрейфа (см. drift.py): длина окна сравнения (сек) и сколько
+# первых живых транзакций берётся в референс, если его нет в пакете модели
+DRIFT_ENABLED = os.getenv("DRIFT_ENABLED", "1") == "1"
+DRIFT_WINDOW_SECONDS = float(os.getenv("DRIFT_WINDOW_SECONDS", "3600"))
+DRIFT_BOOTSTRAP_ROWS = int(os.getenv("DRIFT_BOOTSTRAP_ROWS", "5000"))
+
+# Потоковый воркер (см. stream_worker.py): максимальный размер микро-батча,
+# целевое время скоринга одного батча (мс) — по нему подстраивается размер,
+# сколько ждать новых событий, если источник пуст (мс)
+STREAM_MAX_BATCH = int(os.getenv("STREAM_MAX_BATCH", "512"))
+STREAM_TARGET_BATCH_MS = float(os.getenv("STREAM_TARGET_BATCH_MS", "200"))
+STREAM_IDLE_POLL_MS = float(os.getenv("STREAM_IDLE_POLL_MS", "100"))
+# Как часто (сек) стрим-воркер сохраняет снимок истории клиентов рядом
+# с чекпойнтом; 0 — после каждого батча
+STREAM_HISTORY_SNAPSHOT_SECONDS = float(os.getenv("STREAM_HISTORY_SNAPSHOT_SECONDS", "60"))
@@ -0,0 +1,296 @@
+"""
+Состояние дашборда Streamlit: кольцевой буфер последних проверок
+и инкрементально поддерживаемые агрегаты.
+
+Раньше каждая перерисовка собирала pd.DataFrame из всех проверок,
+заново парсила CSV последнего bulk-результата и пересчитывала графики.
+Теперь каждая проверка (или пачка из bulk) один раз вливается в
+агрегаты, а графики строятся из агрегатов и кэшируются по версии:
+стоимость перерисовки зависит от размера агрегатов, а не от числа строк.
+"""
+
+from collections import Counter, OrderedDict, deque
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional
+
+import numpy as np
+import pandas as pd
+import plotly.graph_objects as go
+
+_PERCENTILES = (0.25, 0.5, 0.75, 0.9)
+
+
+class DashboardStore:
+    """
+    Ограниченное по памяти хранилище проверок для дашборда.
+
+      recent      — последние max_recent проверок (deque, O(1) вставка);
+      hist        — гистограмма fraud_probability (hist_bins корзин на [0, 1]);
+      risk_counts — число проверок по risk_level;
+      buckets     — время → (count, sum_prob), не больше max_buckets корзин;
+      customers   — клиент → (count, sum_prob), не больше max_customers;
+                    порядок — по последнему обращению (свежие в конце).
+    """
+
+    def __init__(
+        self,
+        max_recent: int = 500,
+        hist_bins: int = 40,
+        bucket_seconds: int = 30,
+        max_buckets: int = 240,
+        max_customers: int = 10_000,
+    ):
+        self.recent: deque = deque(maxlen=max_recent)
+        self.hist_bins = hist_bins
+        self.hist = np.zeros(hist_bins, dtype=np.int64)
+        self.risk_counts: Counter = Counter()
+        self.bucket_seconds = bucket_seconds
+        self.max_buckets = max_buckets
+        self.buckets: "OrderedDict[int, List[float]]" = OrderedDict()
+        self.max_customers = max_customers
+        self.customers: "OrderedDict[Any, List[float]]" = OrderedDict()
+
+        self.total = 0
+        self.n_prob = 0
+        self.sum_prob = 0.0
+        self.n_proc = 0
+        self.sum_proc = 0.0
+
+        self.version = 0
+        self._fig_cache: Dict[str, Any] = {}
+
+    # ------------------------------------------------------------------
+    #  Запись
+    # ------------------------------------------------------------------
+    def add(
+        self,
+        cst: Any,
+        fraud_probability: Optional[float],
+        risk_level: Optional[str],
+        processing_time_ms: Optional[float] = None,
+        model_version: Optional[str] = None,
+        timestamp: Optional[datetime] = None,
+    ):
+        """Одна проверка: O(1)."""
+        timestamp = timestamp or datetime.now()
+        self.recent.append({
+            "timestamp": timestamp.strftime("%Y-%m-%d %H:%M:%S"),
+            "cst": cst,
+            "fraud_probability": fraud_probability,
+            "risk_level": risk_level,
+            "processing_time_ms": processing_time_ms,
+            "model_version": model_version,
+        })
+
+        self.total += 1
+        self.risk_counts[risk_level or "UNKNOWN"] += 1
+        if processing_time_ms is not None:
+            self.n_proc += 1
+            self.sum_proc += float(processing_time_ms)
+
+        if fraud_probability is None:
+            self._touch()
+            return
+        prob = float(fraud_probability)
+        self.n_prob += 1
+        self.sum_prob += prob
+        self.hist[self._bin(prob)] += 1
+        self._add_bucket(timestamp, 1, prob)
+        if cst is not None:
+            self._add_customer(cst, 1, prob)
+        self._touch()
+
+    def add_many(
+        self,
+        probs: Iterable[float],
+        risks: Optional[Iterable[str]] = None,
+        csts: Optional[Iterable[Any]] = None,
+        timestamp: Optional[datetime] = None,
+        model_version: Optional[str] = None,
+        recent_sample: int = 50,
+    ):
+        """
+        Пачка результатов (bulk / batch): агрегаты обновляются векторно
+        один раз, в кольцевой буфер попадает только хвост пачки.
+        """
+        timestamp = timestamp or datetime.now()
+        probs = pd.to_numeric(pd.Series(list(probs)), errors="coerce")
+        n = len(probs)
+        if n == 0:
+            return
+        risks = pd.Series(list(risks)) if risks is not None else pd.Series(["UNKNOWN"] * n)
+        csts = pd.Series(list(csts)) if csts is not None else pd.Series([None] * n)
+
+        valid = probs.notna()
+        vals = probs[valid].to_numpy(dtype=float)
+
+        self.total += n
+        self.n_prob += len(vals)
+        self.sum_prob += float(vals.sum())
+        self.hist += np.bincount(self._bins(vals), minlength=self.hist_bins)
+        for level, count in risks.fillna("UNKNOWN").value_counts().items():
+            self.risk_counts[level] += int(count)
+        self._add_bucket(timestamp, len(vals), float(vals.sum()))
+
+        per_customer = (
+            pd.DataFrame({"cst": csts[valid], "p": vals})
+            .dropna(subset=["cst"])
+            .groupby("cst")["p"].agg(["count", "sum"])
+        )
+        for cst, row in per_customer.iterrows():
+            self._add_customer(cst, int(row["count"]), float(row["sum"]))
+
+        ts_str = timestamp.strftime("%Y-%m-%d %H:%M:%S")
+        tail = max(0, n - recent_sample)
+        for cst, prob, risk in zip(csts.iloc[tail:], probs.iloc[tail:], risks.iloc[tail:]):
+            self.recent.append({
+                "timestamp": ts_str,
+                "cst": cst,
+                "fraud_probability": None if pd.isna(prob) else float(prob),
+                "risk_level": risk,
+                "processing_time_ms": None,
+                "model_version": model_version,
+            })
+        self._touch()
+
+    def _bin(self, prob: float) -> int:
+        return min(max(int(prob * self.hist_bins), 0), self.hist_bins - 1)
+
+    def _bins(self, probs: np.ndarray) -> np.ndarray:
+        return np.clip((probs * self.hist_bins).astype(np.int64), 0, self.hist_bins - 1)
+
+    def _add_bucket(self, timestamp: datetime, count: int, sum_prob: float):
+        if count == 0:
+            return
+        key = int(timestamp.timestamp()) // self.bucket_seconds * self.bucket_seconds
+        bucket = self.buckets.get(key)
+        if bucket is None:
+            self.buckets[key] = bucket = [0, 0.0]
+            if len(self.buckets) > self.max_buckets:
+                self.buckets.popitem(last=False)
+        bucket[0] += count
+        bucket[1] += sum_prob
+
+    def _add_customer(self, cst: Any, count: int, sum_prob: float):
+        entry = self.customers.get(cst)
+        if entry is None:
+            self.customers[cst] = entry = [0, 0.0]
+        else:
+            self.customers.move_to_end(cst)
+        entry[0] += count
+        entry[1] += sum_prob
+        if len(self.customers) > self.max_customers:
+            # амортизированно: оставляем половину — четверть самых свежих
+            # (новые клиенты ещё не успели набрать проверок, в т.ч. только что
+            # добавленный) и самых частых из остальных
+            items = list(self.customers.items())
+            fresh_n = max(self.max_customers // 4, 1)
+            fresh, older = items[-fresh_n:], items[:-fresh_n]
+            older.sort(key=lambda kv: kv[1][0], reverse=True)
+            self.customers = OrderedDict(older[: max(self.max_customers // 2 - fresh_n, 0)] + fresh)
+
+    def _touch(self):
+        self.version += 1
+        self._fig_cache.clear()
+
+    # ------------------------------------------------------------------
+    #  Чтение
+    # ------------------------------------------------------------------
+    def recent_df(self, n: int = 10) -> pd.DataFrame:
+        """Последние n проверок, свежие сверху."""
+        rows = [self.recent[-i] for i in range(1, min(n, len(self.recent)) + 1)]
+        return pd.DataFrame(rows)
+
+    def avg_prob(self) -> float:
+        return self.sum_prob / self.n_prob if self.n_prob else 0.0
+
+    def avg_processing_ms(self) -> float:
+        return self.sum_proc / self.n_proc if self.n_proc else 0.0
+
+    def pct_above(self, threshold: float) -> float:
+        """Доля (в %) проверок с fraud_probability ≥ threshold (по гистограмме)."""
+        if not self.n_prob:
+            return 0.0
+        edge = threshold * self.hist_bins
+        full = int(np.ceil(edge))
+        above = self.hist[full:].sum()
+        # частичная корзина — линейная интерполяция
+        if 0 < full <= self.hist_bins and full != edge:
+            above += self.hist[full - 1] * (full - edge)
+        return float(above) / self.n_prob * 100
+
+    def percentiles(self, qs=_PERCENTILES) -> Dict[float, float]:
+        """Перцентили fraud_probability по гистограмме (интерполяция внутри корзины)."""
+        if not self.n_prob:
+            return {}
+        cum = np.cumsum(self.hist)
+        result = {}
+        for q in qs:
+            target = q * self.n_prob
+            i = int(np.searchsorted(cum, target))
+            i = min(i, self.hist_bins - 1)
+            prev = cum[i - 1] if i > 0 else 0
+            inside = (target - prev) / self.hist[i] if self.hist[i] else 0.0
+            result[q] = float((i + inside) / self.hist_bins)
+        return result
+
+    def top_customers(self, top_n: int = 10) -> pd.DataFrame:
+        if not self.customers:
+            return pd.DataFrame()
+        rows = [
+            {"client_id": cst, "checks": count, "avg_prob (%)": round(sum_prob / count * 100, 2)}
+            for cst, (count, sum_prob) in self.customers.items()
+            if count
+        ]
+        df = pd.DataFrame(rows).sort_values("avg_prob (%)", ascending=False).head(top_n)
+        return df.reset_index(drop=True)
+
+    # ------------------------------------------------------------------
+    #  Графики из агрегатов (кэшируются до следующего изменения)
+    # ------------------------------------------------------------------
+    def _cached(self, key: str, build):
+        fig = self._fig_cache.get(key)
+        if fig is None:
+            fig = self._fig_cache[key] = build()
+        return fig
+
+    def hist_figure(self, title="Fraud probability distribution"):
+        def build():
+            width = 100.0 / self.hist_bins
+            centers = (np.arange(self.hist_bins) + 0.5) * width
+            fig = go.Figure(go.Bar(x=centers, y=self.hist, width=width))
+            for q, v in self.percentiles().items():
+                fig.add_vline(x=v * 100, line_dash="dash", annotation_text=f"{int(q*100)}%={v:.2f}", annotation_position="top right")
+            fig.update_layout(title=title, xaxis_title="Fraud probability (%)", yaxis_title="Count", bargap=0, margin=dict(l=10, r=10, t=35, b=10), height=350)
+            return fig
+        return self._cached("hist", build)
+
+    def risk_pie_figure(self, title="Risk level share"):
+        def build():
+            labels = list(self.risk_counts.keys())
+            values = [self.risk_counts[k] for k in labels]
+            fig = go.Figure(go.Pie(labels=labels, values=values, textinfo='label+percent'))
+            fig.update_layout(title=title, margin=dict(l=10, r=10, t=35, b=10), height=350)
+            return fig
+        return self._cached("pie", build)
+
+    def timeseries_figure(self, title="Checks over time"):
+        def build():
+            fig = go.Figure()
+            if self.buckets:
+                xs = [datetime.fromtimestamp(k) for k in self.buckets]
+                counts = [b[0] for b in self.buckets.values()]
+                means = [b[1] / b[0] * 100 if b[0] else 0 for b in self.buckets.values()]
+                fig.add_trace(go.Bar(x=xs, y=counts, name='count', yaxis='y1', opacity=0.6))
+                fig.add_trace(go.Scatter(x=xs, y=means, name='avg_prob(%)', yaxis='y2', mode='lines+markers'))
+            fig.update_layout(
+                title=title,
+                xaxis=dict(type='date'),
+                yaxis=dict(title='Count', side='left'),
+                yaxis2=dict(title='Avg prob (%)', overlaying='y', side='right'),
+                legend=dict(orientation='h'),
+                margin=dict(l=10, r=10, t=35, b=10),
+                height=350
+            )
+            return fig
+        return self._cached("timeseries", build)
@@ -0,0 +1,189 @@
+"""
+Деградация качества вместо доступности при нехватке CPU.
+
+Контроллер смотрит на время в очереди admission control и на время
+скоринга (p95 за скользящее окно) и двигается по уровням:
+
+  0 — полный скоринг: три бустера + SHAP;
+  1 — без SHAP (top_features пустой);
+  2 — без самого медленного бустера (EWMA времени вызова),
+      ensemble_weights оставшихся перенормируются;
+  3 — один бустер: из оставшихся после уровня 2 — с наибольшим весом.
+
+IsolationForest не отключается: anomaly_score — входной признак бустеров
+(и после fast_iforest.py он дешёвый).
+
+Вверх — на один уровень, если p95 выше SLO (не чаще step_up_seconds);
+вниз — на один уровень, если p95 ниже SLO × recover_ratio в течение
+step_down_seconds: гистерезис, чтобы уровень не «дребезжал».
+"""
+
+import threading
+import time
+from collections import deque
+from typing import Any, Deque, Dict, Tuple
+
+import numpy as np
+
+LEVELS = {
+    0: "full",
+    1: "no_shap",
+    2: "drop_slowest_booster",
+    3: "single_booster",
+}
+BOOSTERS = ("catboost", "xgboost", "lightgbm")
+
+
+class DegradationController:
+    """
+    Уровень деградации по сигналам очереди и задержки.
+    """
+
+    def __init__(
+        self,
+        queue_slo_ms: float,
+        latency_slo_ms: float,
+        max_level: int = 3,
+        window_seconds: float = 5.0,
+        step_up_seconds: float = 1.0,
+        step_down_seconds: float = 10.0,
+        recover_ratio: float = 0.5,
+        enabled: bool = True,
+    ):
+        self.queue_slo_ms = queue_slo_ms
+        self.latency_slo_ms = latency_slo_ms
+        self.max_level = min(max_level, max(LEVELS))
+        self.window_seconds = window_seconds
+        self.step_up_seconds = step_up_seconds
+        self.step_down_seconds = step_down_seconds
+        self.recover_ratio = recover_ratio
+        self.enabled = enabled
+
+        self.level = 0
+        self._samples: Deque[Tuple[float, float, float]] = deque(maxlen=5_000)
+        self._lock = threading.Lock()
+        self._last_change = time.monotonic()
+        self._cool_since = None
+        self._last_eval = 0.0
+
+        # EWMA времени вызова каждого бустера, мс
+        self.model_ms: Dict[str, float] = {}
+
+        self.level_changes = 0
+        self.requests_by_level = {level: 0 for level in LEVELS}
+        self.last_signal: Dict[str, float] = {}
+
+    # ------------------------------------------------------------------
+    #  Сигналы
+    # ------------------------------------------------------------------
+    def record(self, queue_ms: float, latency_ms: float):
+        """
+        Один завершённый запрос (колбэк admission control); latency_ms —
+        на одну транзакцию, чтобы пачка не выглядела как перегрузка.
+        """
+        now = time.monotonic()
+        with self._lock:
+            self._samples.append((now, queue_ms, latency_ms))
+            if now - self._last_eval >= 0.25:
+                self._last_eval = now
+                self._evaluate(now)
+
+    def observe_model(self, name: str, ms: float):
+        prev = self.model_ms.get(name)
+        self.model_ms[name] = ms if prev is None else prev * 0.95 + ms * 0.05
+
+    def _evaluate(self, now: float):
+        if not self.enabled:
+            return
+        while self._samples and self._samples[0][0] < now - self.window_seconds:
+            self._samples.popleft()
+        if self._samples:
+            arr = np.asarray(self._samples)
+            queue_p95 = float(np.percentile(arr[:, 1], 95))
+            latency_p95 = float(np.percentile(arr[:, 2], 95))
+        else:
+            queue_p95 = latency_p95 = 0.0
+        self.last_signal = {"queue_p95_ms": queue_p95, "latency_p95_ms": latency_p95}
+
+        hot = queue_p95 > self.queue_slo_ms or latency_p95 > self.latency_slo_ms
+        cool = (
+            queue_p95 < self.queue_slo_ms * self.recover_ratio
+            and latency_p95 < self.latency_slo_ms * self.recover_ratio
+        )
+
+        if hot:
+            self._cool_since = None
+            if self.level < self.max_level and now - self._last_change >= self.step_up_seconds:
+                self._set_level(self.level + 1, now)
+        elif cool and self.level > 0:
+            if self._cool_since is None:
+                self._cool_since = now
+            elif now - self._cool_since >= self.step_down_seconds:
+                self._set_level(self.level - 1, now)
+                self._cool_since = now
+        else:
+            self._cool_since = None
+
+    def _set_level(self, level: int, now: float):
+        print(f"[Degradation] level {self.level} → {level} ({LEVELS[level]}), signal: {self.last_signal}")
+        self.level = level
+        self._last_change = now
+        self.level_changes += 1
+
+    # ------------------------------------------------------------------
+    #  План скоринга
+    # ------------------------------------------------------------------
+    def plan(self, weights) -> Tuple[int, Dict[str, float], bool]:
+        """
+        (уровень, {бустер: перенормированный вес}, считать ли SHAP)
+        для одного запроса.
+        """
+        now = time.monotonic()
+        if now - self._last_eval >= 1.0:
+            # без завершённых запросов (простой) record не вызывается —
+            # уровень всё равно должен уметь опуститься
+            with self._lock:
+                self._last_eval = now
+                self._evaluate(now)
+
+        # += из потоков executor-а — не атомарно
+        with self._lock:
+            level = self.level
+            self.requests_by_level[level] += 1
+        return self._plan_for(level, weights)
+
+    def full_plan(self, weights) -> Tuple[int, Dict[str, float], bool]:
+        """
+        План уровня 0 без учёта в счётчиках — для офлайн-полос (bulk,
+        загрузки, стрим, warm-up): весь файл скорится одним ансамблем.
+        """
+        return self._plan_for(0, weights)
+
+    def _plan_for(self, level: int, weights) -> Tuple[int, Dict[str, float], bool]:
+        active = dict(zip(BOOSTERS, weights))
+        if level >= 2 and len(active) > 1:
+            slowest = max(active, key=lambda name: self.model_ms.get(name, 0.0))
+            active.pop(slowest)
+        if level >= 3 and len(active) > 1:
+            best = max(active, key=active.get)
+            active = {best: active[best]}
+        total = sum(active.values())
+        if total > 0:
+            active = {name: w / total for name, w in active.items()}
+        return level, active, level < 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            requests_by_level = dict(self.requests_by_level)
+        return {
+            "enabled": self.enabled,
+            "level": self.level,
+            "level_name": LEVELS[self.level],
+            "max_level": self.max_level,
+            "queue_slo_ms": self.queue_slo_ms,
+            "latency_slo_ms": self.latency_slo_ms,
+            "signal": dict(self.last_signal),
+            "level_changes": self.level_changes,
+            "requests_by_level": requests_by_level,
+            "booster_ms": {name: round(ms, 3) for name, ms in self.model_ms.items()},
+        }
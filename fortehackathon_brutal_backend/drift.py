@@ -0,0 +1,330 @@
+"""
+Онлайн-мониторинг дрейфа входных признаков и скоров моделей.
+
+Референс — гистограммы по квантильным корзинам, посчитанные на
+обучающей выборке и сохранённые в model_package.pkl (ключ
+"drift_reference"):
+
+    python drift.py build --model model_package.pkl --data train_transactions.csv
+
+Живой трафик раскладывается по тем же корзинам: на транзакцию — один
+векторный поиск корзины по всем колонкам и инкремент счётчиков
+(порядка 10–20 мкс при ~20 мс на сам скоринг; память фиксирована:
+колонки × корзины).
+Сравнение — PSI и KS (по кумулятивным гистограммам) для каждого
+признака, anomaly_score, скоров бустеров и итоговой вероятности;
+плюс доля алертов против fraud_rate обучения. GET /stats/drift.
+
+Окна: текущее (сбрасывается раз в window_seconds), предыдущее
+полное и всё время с запуска. Если в пакете нет референса, он
+строится из первых bootstrap_rows живых транзакций (reference_source =
+"live_bootstrap") — тогда дрейф считается относительно начала работы.
+"""
+
+import argparse
+import threading
+import time
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+
+SCORE_COLUMNS = ("catboost", "xgboost", "lightgbm", "fraud_probability")
+PSI_MODERATE = 0.1
+PSI_SIGNIFICANT = 0.25
+_EPS = 1e-4
+
+
+def build_reference(
+    X: np.ndarray,
+    columns: Sequence[str],
+    scores: Dict[str, np.ndarray],
+    bins: int = 20,
+    fraud_rate: Optional[float] = None,
+) -> Dict[str, Any]:
+    """
+    Референс-профиль: для каждой колонки — внутренние границы квантильных
+    корзин (до bins - 1, дубликаты у дискретных признаков схлопываются)
+    и доли строк по корзинам (включая хвосты за крайними границами).
+    """
+    profile: Dict[str, Any] = {"columns": {}, "rows": int(len(X)), "fraud_rate": fraud_rate}
+    series = {name: X[:, i] for i, name in enumerate(columns)}
+    series.update(scores)
+    qs = np.linspace(0, 1, bins + 1)[1:-1]
+    for name, values in series.items():
+        values = np.asarray(values, dtype=float)
+        values = values[np.isfinite(values)]
+        if len(values) == 0:
+            continue
+        edges = np.unique(np.quantile(values, qs))
+        counts = np.bincount(np.searchsorted(edges, values, side="right"), minlength=len(edges) + 1)
+        profile["columns"][name] = {
+            "edges": edges.tolist(),
+            "share": (counts / counts.sum()).tolist(),
+        }
+    return profile
+
+
+def _psi(expected: np.ndarray, actual: np.ndarray) -> float:
+    e = np.clip(expected, _EPS, None)
+    a = np.clip(actual, _EPS, None)
+    return float(np.sum((a - e) * np.log(a / e)))
+
+
+def _ks(expected: np.ndarray, actual: np.ndarray) -> float:
+    return float(np.max(np.abs(np.cumsum(expected) - np.cumsum(actual))))
+
+
+class _Window:
+    __slots__ = ("counts", "rows", "alerts", "started")
+
+    def __init__(self, shape):
+        self.counts = np.zeros(shape, dtype=np.int64)
+        self.rows = 0
+        self.alerts = 0
+        self.started = time.time()
+
+
+class DriftMonitor:
+    """
+    Гистограммы живого трафика по корзинам референса + PSI / KS.
+    """
+
+    def __init__(
+        self,
+        feature_columns: Sequence[str],
+        reference: Optional[Dict[str, Any]] = None,
+        fraud_rate: Optional[float] = None,
+        window_seconds: float = 3600.0,
+        bootstrap_rows: int = 5000,
+        enabled: bool = True,
+    ):
+        self.feature_columns = list(feature_columns)
+        self.columns = self.feature_columns + list(SCORE_COLUMNS)
+        self.window_seconds = window_seconds
+        self.bootstrap_rows = bootstrap_rows
+        self.enabled = enabled
+        self._lock = threading.Lock()
+
+        self.reference: Optional[Dict[str, Any]] = None
+        self.reference_source = "none"
+        self.fraud_rate = fraud_rate
+        self._bootstrap: Optional[np.ndarray] = None
+        self._bootstrap_alerts = 0
+        self._bootstrap_n = 0
+        if reference is not None:
+            self._install(reference, "model_package")
+        elif enabled and bootstrap_rows > 0:
+            self._bootstrap = np.full((bootstrap_rows, len(self.columns)), np.nan)
+            self.reference_source = "live_bootstrap_pending"
+
+    # ------------------------------------------------------------------
+    def _install(self, reference: Dict[str, Any], source: str):
+        """Границы референса → матрица (колонки × max корзин) для векторного поиска."""
+        ref_columns = reference["columns"]
+        self.tracked = [i for i, name in enumerate(self.columns) if name in ref_columns]
+        width = max((len(ref_columns[self.columns[i]]["edges"]) for i in self.tracked), default=0)
+        # недостающие границы — +inf: значение в них никогда не попадает
+        self._edges = np.full((len(self.tracked), max(width, 1)), np.inf)
+        self._ref_share: List[np.ndarray] = []
+        for row, i in enumerate(self.tracked):
+            edges = ref_columns[self.columns[i]]["edges"]
+            self._edges[row, :len(edges)] = edges
+            self._ref_share.append(np.asarray(ref_columns[self.columns[i]]["share"], dtype=float))
+        self._n_bins = self._edges.shape[1] + 1
+        # все колонки в референсе — без лишней выборки на горячем пути
+        self._tracked_idx = None if len(self.tracked) == len(self.columns) else np.asarray(self.tracked, dtype=np.intp)
+        self._offsets = np.arange(len(self.tracked)) * (self._n_bins + 1)
+
+        shape = (len(self.tracked), self._n_bins + 1)
+        self._current = _Window(shape)
+        self._previous: Optional[_Window] = None
+        # сумма закрытых окон; «всё время» = она + текущее окно
+        self._closed = np.zeros(shape, dtype=np.int64)
+        self._closed_rows = 0
+        self._closed_alerts = 0
+        if self.fraud_rate is None:
+            self.fraud_rate = reference.get("fraud_rate")
+        self._started = time.time()
+        self.reference = reference
+        self.reference_source = source
+
+    # ------------------------------------------------------------------
+    def record(self, features: np.ndarray, scores: Dict[str, Optional[float]], fraud_prob: float, is_fraud: bool):
+        """
+        Одна скоренная транзакция: features — вектор признаков модели
+        (feature_cols + anomaly_score), scores — скоры бустеров (None —
+        бустер отключён деградацией).
+        """
+        if not self.enabled:
+            return
+        catboost, xgboost, lightgbm = scores.get("catboost"), scores.get("xgboost"), scores.get("lightgbm")
+        values = np.concatenate((features, (
+            np.nan if catboost is None else catboost,
+            np.nan if xgboost is None else xgboost,
+            np.nan if lightgbm is None else lightgbm,
+            fraud_prob,
+        )))
+
+        if self.reference is None:
+            self._record_bootstrap(values, is_fraud)
+            return
+
+        if self._tracked_idx is not None:
+            values = values[self._tracked_idx]
+        # корзина = число границ не больше значения; NaN — в отдельную
+        # последнюю корзину, в метрики она не входит
+        bins = (values[:, None] >= self._edges).sum(axis=1)
+        missing = np.isnan(values)
+        if missing.any():
+            bins[missing] = self._n_bins
+        flat_idx = self._offsets + bins
+        now = time.time()
+        with self._lock:
+            current = self._current
+            if now - current.started >= self.window_seconds:
+                self._closed += current.counts
+                self._closed_rows += current.rows
+                self._closed_alerts += current.alerts
+                self._previous = current
+                current = self._current = _Window(current.counts.shape)
+            current.counts.ravel()[flat_idx] += 1
+            current.rows += 1
+            current.alerts += bool(is_fraud)
+
+    def _record_bootstrap(self, values: np.ndarray, is_fraud: bool):
+        with self._lock:
+            if self.reference is not None or self._bootstrap is None:
+                return
+            self._bootstrap[self._bootstrap_n] = values
+            self._bootstrap_n += 1
+            self._bootstrap_alerts += bool(is_fraud)
+            if self._bootstrap_n < self.bootstrap_rows:
+                return
+            sample = self._bootstrap
+            self._bootstrap = None
+            scores = {name: sample[:, len(self.feature_columns) + i] for i, name in enumerate(SCORE_COLUMNS)}
+            reference = build_reference(
+                sample[:, :len(self.feature_columns)],
+                self.feature_columns,
+                scores,
+                fraud_rate=self._bootstrap_alerts / self.bootstrap_rows,
+            )
+            self._install(reference, "live_bootstrap")
+            print(f"[Drift] reference built from the first {self.bootstrap_rows} live transactions")
+
+    def estimated_bytes(self) -> int:
+        """Счётчики окон и границы (или буфер bootstrap) — фиксированный размер."""
+        with self._lock:
+            if self.reference is None:
+                return self._bootstrap.nbytes if self._bootstrap is not None else 0
+            windows = [self._current, self._previous]
+            return (self._edges.nbytes + self._closed.nbytes
+                    + sum(w.counts.nbytes for w in windows if w is not None))
+
+    # ------------------------------------------------------------------
+    def report(self, window: str = "current", top_n: int = 20) -> Dict[str, Any]:
+        base = {
+            "enabled": self.enabled,
+            "reference_source": self.reference_source,
+            "reference_rows": self.reference["rows"] if self.reference else None,
+        }
+        if self.reference is None:
+            return {**base, "bootstrap_rows_collected": self._bootstrap_n, "bootstrap_rows": self.bootstrap_rows}
+
+        with self._lock:
+            if window == "total":
+                counts = self._closed + self._current.counts
+                rows = self._closed_rows + self._current.rows
+                alerts = self._closed_alerts + self._current.alerts
+                started = self._started
+            else:
+                chosen = self._current if window == "current" else self._previous
+                if chosen is None:
+                    return {**base, "window": window, "rows": 0, "columns": []}
+                counts = chosen.counts.copy()
+                rows, alerts, started = chosen.rows, chosen.alerts, chosen.started
+
+        metrics = []
+        for row, i in enumerate(self.tracked):
+            observed = counts[row]
+            expected = self._ref_share[row]
+            observed = observed[:len(expected)]
+            n = observed.sum()
+            if n == 0:
+                continue
+            actual = observed / n
+            psi = _psi(expected, actual)
+            metrics.append({
+                "column": self.columns[i],
+                "kind": "score" if self.columns[i] in SCORE_COLUMNS or self.columns[i] == "anomaly_score" else "feature",
+                "psi": round(psi, 4),
+                "ks": round(_ks(expected, actual), 4),
+                "status": "significant" if psi >= PSI_SIGNIFICANT else "moderate" if psi >= PSI_MODERATE else "stable",
+                "rows": int(n),
+            })
+        metrics.sort(key=lambda m: -m["psi"])
+        return {
+            **base,
+            "window": window,
+            "window_started_at": started,
+            "rows": rows,
+            "alert_rate": round(alerts / rows, 5) if rows else None,
+            "reference_fraud_rate": self.fraud_rate,
+            "drifted": {
+                "significant": sum(m["status"] == "significant" for m in metrics),
+                "moderate": sum(m["status"] == "moderate" for m in metrics),
+            },
+            "columns": metrics[:top_n],
+        }
+
+
+# ----------------------------------------------------------------------
+#  Офлайн-сборка референса в пакет модели
+# ----------------------------------------------------------------------
+def _build_command(args):
+    import joblib
+
+    from bulk_scoring import clean_bulk_frame, read_bulk_csv
+    from model import FraudDetectionAPI
+    from records import TxRecord
+
+    df, report = read_bulk_csv(args.data)
+    df = clean_bulk_frame(df)
+    print(f"[Drift] {report['rows']} rows read, {len(df)} valid")
+
+    detector = FraudDetectionAPI(args.model)
+    features: List[np.ndarray] = []
+    batch = detector.score_records(
+        TxRecord.from_columns(df["cst_dim_id"], df["amount"], df["direction"], df["transdatetime"]),
+        features_out=features,
+    )
+    scores = {**batch.scores, "fraud_probability": batch.fraud_probability}
+    pkg = joblib.load(args.model)
+    reference = build_reference(
+        np.vstack(features),
+        pkg["feature_cols"] + ["anomaly_score"],
+        scores,
+        bins=args.bins,
+        fraud_rate=args.fraud_rate if args.fraud_rate is not None else pkg.get("fraud_rate"),
+    )
+    pkg["drift_reference"] = reference
+    joblib.dump(pkg, args.output or args.model)
+    print(f"[Drift] reference for {len(reference['columns'])} columns saved to {args.output or args.model}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Референс-профиль для мониторинга дрейфа")
+    sub = parser.add_subparsers(dest="command", required=True)
+    build = sub.add_parser("build", help="прогнать обучающие транзакции через модель и сохранить профиль в пакет")
+    build.add_argument("--model", default="model_package.pkl")
+    build.add_argument("--data", required=True, help="CSV транзакций (формат /bulk_predict)")
+    build.add_argument("--output", help="куда сохранить пакет (по умолчанию — поверх --model)")
+    build.add_argument("--bins", type=int, default=20)
+    build.add_argument("--fraud-rate", type=float, default=None, help="доля фрода в обучении (metadata.json)")
+    args = parser.parse_args()
+    if args.command == "build":
+        _build_command(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,7 @@
 from datetime import datetime
 from typing import Optional, List, Dict, Any
 
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 
 
 class Stats(BaseModel):
@@ -9,12 +9,18 @@ class Stats(BaseModel):
     model_version: str
     threshold: float
     num_features: int
+    idempotency_cache: Optional[Dict[str, int]] = None
+    graph_index: Optional[Dict[str, int]] = None
+    history_retention: Optional[Dict[str, Any]] = None
+    thread_budget: Optional[Dict[str, Any]] = None
+    degradation: Optional[Dict[str, Any]] = None
 
 
 class Models(BaseModel):  # индивидуальные скоринги моделей
-    catboost: float
-    xgboost: float
-    lightgbm: float
+    # None — бустер отключён уровнем деградации (см. degradation.py)
+    catboost: Optional[float] = None
+    xgboost: Optional[float] = None
+    lightgbm: Optional[float] = None
     anomaly: float
 
 
@@ -54,3 +60,21 @@ class TransactionOutput(BaseModel):
 
     # --- новое поле для React (график SHAP) ---
     top_features: Optional[List[TopFeature]] = None
+
+    # 0 — полный скоринг; 1+ — упрощён под нагрузкой (см. degradation.py)
+    degradation_level: int = 0
+
+
+class UploadCreate(BaseModel):
+    """Сессия resumable-загрузки CSV (см. uploads.py)."""
+    filename: Optional[str] = None
+    # число кусков можно не знать заранее — тогда передаётся в complete
+    total_chunks: Optional[int] = None
+    # SHAP-колонки в результате — как explain у /bulk_predict
+    explain: bool = False
+    explain_top_k: int = Field(default=5, ge=1, le=20)
+    explain_min_score: Optional[float] = Field(default=None, ge=0.0, le=1.0)
+
+
+class UploadComplete(BaseModel):
+    total_chunks: Optional[int] = None
@@ -0,0 +1,210 @@
+"""
+Векторизованный скорер IsolationForest.
+
+sklearn.IsolationForest.decision_function на каждый вызов валидирует вход
+и обходит каждое дерево отдельно (tree.apply + decision_path) — для одной
+строки фиксированные накладные расходы составляют большую часть задержки.
+
+Здесь при загрузке модели все деревья один раз «сплющиваются» в общие
+массивы узлов:
+  feature / threshold / left / right — по всем деревьям подряд
+  (у листа left = right = сам лист, обход на нём «стоит на месте»);
+  leaf_depth — вклад листа в глубину:
+      decision_path_length + c(n_node_samples) - 1,
+  как в sklearn._compute_score_samples.
+Обход N строк по всем деревьям — max_depth шагов над массивом (N, n_trees)
+в NumPy, либо (если установлен numba) компилированное ядро. numba тянет
+llvmlite и компиляцию, поэтому ядро включается отдельно (enable_numba) —
+в фоне после готовности сервиса, а не на холодном старте. Глубины по
+деревьям оба пути складывают в одном порядке (слева направо, без
+попарного суммирования NumPy) — скор не зависит от того, включился ли
+numba, вплоть до бита.
+
+score = -2 ** (-Σ depth / (n_estimators * c(max_samples))) - offset_
+"""
+
+import threading
+import warnings
+
+import numpy as np
+
+
+def _average_path_length(n_samples) -> np.ndarray:
+    """c(n) — средняя длина пути неуспешного поиска в BST (как в sklearn)."""
+    n = np.asarray(n_samples, dtype=np.float64)
+    out = np.zeros_like(n)
+    mask_2 = n == 2
+    rest = n > 2
+    out[mask_2] = 1.0
+    out[rest] = 2.0 * (np.log(n[rest] - 1.0) + np.euler_gamma) - 2.0 * (n[rest] - 1.0) / n[rest]
+    return out
+
+
+def _node_depths(left: np.ndarray, right: np.ndarray) -> np.ndarray:
+    """Глубина узлов дерева (корень — 0); дети всегда правее родителя."""
+    depths = np.zeros(len(left), dtype=np.int64)
+    for node in range(len(left)):
+        if left[node] != -1:
+            depths[left[node]] = depths[node] + 1
+            depths[right[node]] = depths[node] + 1
+    return depths
+
+
+_numba_kernel = None
+_numba_lock = threading.Lock()
+
+
+def _load_numba_kernel():
+    """Импортирует numba и собирает ядро обхода; None, если numba не установлен."""
+    global _numba_kernel
+    with _numba_lock:
+        if _numba_kernel is not None:
+            return _numba_kernel
+        try:
+            from numba import njit
+        except ImportError:  # numba опционален
+            return None
+
+        @njit(cache=True, nogil=True)
+        def _traverse_numba(X, roots, feature, threshold, left, right, leaf_depth):
+            n_rows = X.shape[0]
+            out = np.zeros(n_rows, dtype=np.float64)
+            for i in range(n_rows):
+                total = 0.0
+                for root in roots:
+                    node = root
+                    while left[node] != node:
+                        if X[i, feature[node]] <= threshold[node]:
+                            node = left[node]
+                        else:
+                            node = right[node]
+                    total += leaf_depth[node]
+                out[i] = total
+            return out
+
+        _numba_kernel = _traverse_numba
+        return _numba_kernel
+
+
+class FlatIsolationForest:
+    """
+    Сплющенный обученный IsolationForest: decision_function совпадает
+    с sklearn в пределах точности float.
+    """
+
+    def __init__(self, iso):
+        roots, feature, threshold, left, right, leaf_depth = [], [], [], [], [], []
+        offset = 0
+        max_depth = 0
+        for est, features in zip(iso.estimators_, iso.estimators_features_):
+            tree = est.tree_
+            t_left = tree.children_left.astype(np.int64)
+            t_right = tree.children_right.astype(np.int64)
+            is_leaf = t_left == -1
+            idx = np.arange(tree.node_count, dtype=np.int64)
+
+            depths = _node_depths(t_left, t_right)
+            max_depth = max(max_depth, int(depths.max()))
+
+            roots.append(offset)
+            # признак дерева — индекс в подвыборке признаков → индекс столбца X
+            feature.append(np.where(is_leaf, 0, np.asarray(features)[np.maximum(tree.feature, 0)]))
+            threshold.append(np.where(is_leaf, 0.0, tree.threshold))
+            left.append(np.where(is_leaf, idx, t_left) + offset)
+            right.append(np.where(is_leaf, idx, t_right) + offset)
+            leaf_depth.append(np.where(
+                is_leaf,
+                depths + 1 + _average_path_length(tree.n_node_samples) - 1.0,
+                0.0,
+            ))
+            offset += tree.node_count
+
+        self.roots = np.asarray(roots, dtype=np.int64)
+        self.feature = np.concatenate(feature).astype(np.int64)
+        self.threshold = np.concatenate(threshold).astype(np.float64)
+        self.left = np.concatenate(left)
+        self.right = np.concatenate(right)
+        self.leaf_depth = np.concatenate(leaf_depth).astype(np.float64)
+        self.max_depth = max_depth
+        self.n_features = iso.n_features_in_
+
+        denominator = len(iso.estimators_) * _average_path_length([iso.max_samples_])[0]
+        self.inv_denominator = 1.0 / denominator if denominator else None
+        self.offset_ = float(iso.offset_)
+        self._kernel = None
+
+    @property
+    def use_numba(self) -> bool:
+        return self._kernel is not None
+
+    def enable_numba(self) -> bool:
+        """
+        Компилирует ядро numba, сверяет его с NumPy-обходом (побитово) и
+        включает. False — numba не установлен или ядро не совпало.
+        """
+        kernel = _load_numba_kernel()
+        if kernel is None:
+            return False
+        rng = np.random.default_rng(0)
+        X = rng.choice(self.threshold, size=(64, self.n_features)).astype(np.float32)
+        expected = self._depths(X)
+        got = kernel(X, self.roots, self.feature, self.threshold, self.left, self.right, self.leaf_depth)
+        if not np.array_equal(expected, got):
+            print("[FlatIsolationForest] numba kernel mismatch, staying on NumPy")
+            return False
+        self._kernel = kernel
+        return True
+
+    # ------------------------------------------------------------------
+    def _depths(self, X: np.ndarray) -> np.ndarray:
+        kernel = self._kernel
+        if kernel is not None:
+            return kernel(X, self.roots, self.feature, self.threshold,
+                          self.left, self.right, self.leaf_depth)
+        rows = np.arange(X.shape[0])[:, None]
+        nodes = np.broadcast_to(self.roots, (X.shape[0], len(self.roots)))
+        for _ in range(self.max_depth):
+            go_left = X[rows, self.feature[nodes]] <= self.threshold[nodes]
+            nodes = np.where(go_left, self.left[nodes], self.right[nodes])
+        # последовательно по деревьям, как в ядре numba (sum() — попарно)
+        return np.cumsum(self.leaf_depth[nodes], axis=1)[:, -1]
+
+    def score_samples(self, X) -> np.ndarray:
+        # sklearn обходит деревья в float32 — приводим так же
+        X = np.ascontiguousarray(np.asarray(X, dtype=np.float32))
+        if X.ndim != 2 or X.shape[1] != self.n_features:
+            raise ValueError(f"Expected {self.n_features} features, got shape {X.shape}")
+        depths = self._depths(X)
+        if self.inv_denominator is None:
+            return -np.full(len(X), 0.5)
+        return -(2.0 ** (-depths * self.inv_denominator))
+
+    def decision_function(self, X) -> np.ndarray:
+        return self.score_samples(X) - self.offset_
+
+
+def make_anomaly_scorer(iso, check_rows: int = 256):
+    """
+    Сплющивает обученный IsolationForest и сверяет с sklearn на синтетических
+    строках. Если модель не похожа на IsolationForest или сверка не прошла —
+    возвращает исходный estimator (у обоих есть decision_function).
+    """
+    try:
+        flat = FlatIsolationForest(iso)
+        rng = np.random.default_rng(0)
+        # значения вокруг реальных порогов, чтобы пройти по разным веткам
+        inner = flat.threshold[flat.left != np.arange(len(flat.left))]
+        X = rng.choice(inner, size=(check_rows, flat.n_features)) + rng.normal(0, 1e-3, (check_rows, flat.n_features))
+        with warnings.catch_warnings():
+            # модель обучена на DataFrame — sklearn ругается на ndarray без имён
+            warnings.simplefilter("ignore", UserWarning)
+            expected = iso.decision_function(X)
+        got = flat.decision_function(X)
+        if not np.allclose(expected, got, rtol=1e-6, atol=1e-9):
+            raise ValueError(f"max |diff| = {np.abs(expected - got).max():.3g}")
+    except Exception as e:
+        print(f"[FlatIsolationForest] fallback to sklearn: {e}")
+        return iso
+    print(f"[FlatIsolationForest] {len(flat.roots)} trees, {len(flat.left)} nodes, "
+          f"max_depth={flat.max_depth}")
+    return flat
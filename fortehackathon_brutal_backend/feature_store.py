@@ -0,0 +1,277 @@
+"""
+Локальный feature store поведенческих признаков клиента.
+
+Офлайн-шаг (build) пишет по одному вектору на cst_dim_id в один файл:
+
+    b"BFS1" | uint32 длина заголовка | JSON-заголовок (выравнен до 8 байт)
+    | int64[n] отсортированные cst_dim_id | float32[n, k] значения
+
+В онлайне файл открывается через np.memmap, поиск клиента — бинарный
+(np.searchsorted, O(log n)), страницы подтягивает ОС по мере обращения.
+
+Обновление без рестарта: новый файл пишется рядом и атомарно
+подменяется через os.replace(); читатель раз в check_seconds
+сверяет (inode, mtime) и переоткрывает mapping. Запросы, успевшие
+взять старый mapping, дочитывают его — файл остаётся жив, пока открыт.
+Так же подхватывается файл, которого не было при старте (или который
+не открылся): до его появления lookup отдаёт None.
+
+Сборка:
+    python feature_store.py build --input patterns.csv --output behavioral_store.bin
+"""
+
+import json
+import os
+import struct
+import tempfile
+import threading
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+MAGIC = b"BFS1"
+_ID_COL = "cst_dim_id"
+# поля транзакции, которые считаются онлайн и в store не попадают
+_SKIP_COLS = {"cst_dim_id", "transdate", "transdatetime", "amount", "direction", "target"}
+
+
+class _Mapping:
+    """Один открытый файл store (иммутабельный снимок)."""
+
+    def __init__(self, path: str):
+        st = os.stat(path)
+        self.signature = (st.st_ino, st.st_mtime_ns, st.st_size)
+
+        with open(path, "rb") as f:
+            magic = f.read(4)
+            if magic != MAGIC:
+                raise ValueError(f"{path}: not a behavioral feature store file")
+            (header_len,) = struct.unpack("<I", f.read(4))
+            header = json.loads(f.read(header_len).decode("utf-8"))
+
+        self.header = header
+        self.columns: List[str] = header["columns"]
+        n, k = header["n"], len(self.columns)
+        offset = 8 + header_len
+
+        if n == 0:
+            # mmap нулевой длины невозможен — пустой store
+            self.ids = np.empty(0, dtype="<i8")
+            self.values = np.empty((0, k), dtype="<f4")
+            return
+
+        self.ids = np.memmap(path, dtype="<i8", mode="r", offset=offset, shape=(n,))
+        self.values = np.memmap(
+            path, dtype="<f4", mode="r", offset=offset + 8 * n, shape=(n, k)
+        )
+
+    def lookup(self, cst_id: int) -> Optional[Dict[str, float]]:
+        ids = self.ids
+        pos = int(np.searchsorted(ids, cst_id))
+        if pos >= len(ids) or ids[pos] != cst_id:
+            return None
+        return dict(zip(self.columns, self.values[pos].tolist()))
+
+
+class BehavioralFeatureStore:
+    """
+    Read-only доступ к поведенческим векторам по cst_dim_id
+    с атомарным переоткрытием файла при его подмене.
+    """
+
+    def __init__(self, path: str, check_seconds: float = 5.0):
+        self.path = path
+        self.check_seconds = check_seconds
+        # None — файла нет (ещё не собран) или он не открылся
+        self._mapping: Optional[_Mapping] = None
+        self._next_check = 0.0
+        self._reload_lock = threading.Lock()
+        self.reloads = 0
+        self.maybe_reload()
+
+    @classmethod
+    def open_optional(cls, path: Optional[str], check_seconds: float = 5.0):
+        """
+        Store по пути из конфига; None, только если путь не задан. Файла
+        может ещё не быть — он подхватится при появлении.
+        """
+        if not path:
+            return None
+        return cls(path, check_seconds=check_seconds)
+
+    @property
+    def loaded(self) -> bool:
+        return self._mapping is not None
+
+    @property
+    def columns(self) -> List[str]:
+        mapping = self._mapping
+        return mapping.columns if mapping is not None else []
+
+    def __len__(self) -> int:
+        mapping = self._mapping
+        return len(mapping.ids) if mapping is not None else 0
+
+    def lookup(self, cst_id: int) -> Optional[Dict[str, float]]:
+        """Поведенческие признаки клиента или None, если клиента нет в store."""
+        if time.monotonic() >= self._next_check:
+            self.maybe_reload()
+        mapping = self._mapping
+        return mapping.lookup(cst_id) if mapping is not None else None
+
+    def maybe_reload(self) -> bool:
+        """Открывает файл, если он появился или был атомарно подменён."""
+        # проверку делает один поток, остальные читают текущий mapping
+        if not self._reload_lock.acquire(blocking=False):
+            return False
+        try:
+            self._next_check = time.monotonic() + self.check_seconds
+            try:
+                st = os.stat(self.path)
+            except FileNotFoundError:
+                return False
+            previous = self._mapping
+            if previous is not None and (st.st_ino, st.st_mtime_ns, st.st_size) == previous.signature:
+                return False
+            try:
+                mapping = _Mapping(self.path)
+            except Exception as e:
+                print(f"[FeatureStore] open of {self.path} failed, keeping old data: {e}")
+                return False
+            self._mapping = mapping
+            if previous is None:
+                print(f"[FeatureStore] {self.path}: {len(mapping.ids)} customers, {len(mapping.columns)} features")
+            else:
+                self.reloads += 1
+                print(f"[FeatureStore] reloaded {self.path}: {len(mapping.ids)} customers")
+            return True
+        finally:
+            self._reload_lock.release()
+
+
+# ----------------------------------------------------------------------
+#  Офлайн-сборка
+# ----------------------------------------------------------------------
+def build_feature_store(
+    df: pd.DataFrame,
+    output_path: str,
+    columns: Optional[List[str]] = None,
+    encoders: Optional[Dict[str, Any]] = None,
+) -> int:
+    """
+    Пишет store из таблицы поведенческих паттернов (строка = клиент/дата).
+    Для каждого cst_dim_id берётся последняя по transdate строка.
+    Категориальные колонки кодируются энкодерами модели (если переданы).
+
+    Запись атомарная: временный файл в той же папке + os.replace().
+    Возвращает число клиентов.
+    """
+    df = df.copy()
+    df[_ID_COL] = pd.to_numeric(df[_ID_COL], errors="coerce")
+    df = df.dropna(subset=[_ID_COL])
+    df[_ID_COL] = df[_ID_COL].astype("int64")
+
+    if "transdate" in df.columns:
+        df["_ts"] = pd.to_datetime(df["transdate"], errors="coerce")
+        df = df.sort_values([_ID_COL, "_ts"], kind="mergesort")
+    else:
+        df = df.sort_values(_ID_COL, kind="mergesort")
+    df = df.drop_duplicates(subset=[_ID_COL], keep="last")
+
+    if columns is None:
+        columns = [c for c in df.columns if c not in _SKIP_COLS and not c.startswith("_")]
+    encoders = encoders or {}
+
+    values = np.zeros((len(df), len(columns)), dtype="<f4")
+    for j, col in enumerate(columns):
+        series = df[col]
+        if col in encoders:
+            le = encoders[col]
+            known = set(le.classes_)
+            fallback = le.classes_[0]
+            series = series.astype(str).map(lambda v: v if v in known else fallback)
+            values[:, j] = le.transform(series)
+        else:
+            values[:, j] = pd.to_numeric(series, errors="coerce").fillna(0).to_numpy()
+
+    ids = df[_ID_COL].to_numpy(dtype="<i8")
+
+    header = {
+        "columns": list(columns),
+        "n": int(len(ids)),
+        "built_at": datetime.now().isoformat(timespec="seconds"),
+    }
+    # заголовок добиваем пробелами, чтобы массивы начинались с границы 8 байт
+    header_bytes = json.dumps(header).encode("utf-8")
+    header_bytes = header_bytes.ljust((8 + len(header_bytes) + 7) // 8 * 8 - 8, b" ")
+
+    out_dir = os.path.dirname(os.path.abspath(output_path))
+    fd, tmp_path = tempfile.mkstemp(prefix=".bfs_", dir=out_dir)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(MAGIC)
+            f.write(struct.pack("<I", len(header_bytes)))
+            f.write(header_bytes)
+            f.write(ids.tobytes())
+            f.write(np.ascontiguousarray(values).tobytes())
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, output_path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+
+    return len(ids)
+
+
+def _read_patterns_csv(path: str) -> pd.DataFrame:
+    # как в /bulk_predict: utf-8, иначе банковский cp1251 + ';' + skiprows=1
+    try:
+        return pd.read_csv(path, encoding="utf-8")
+    except UnicodeDecodeError:
+        return pd.read_csv(path, encoding="cp1251", sep=";", skiprows=1, low_memory=False)
+
+
+def main():
+    import argparse
+
+    import joblib
+
+    from config import MODEL_DIR
+
+    parser = argparse.ArgumentParser(description="Behavioral feature store builder")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+
+    build = sub.add_parser("build", help="собрать store из CSV/Parquet с поведенческими паттернами")
+    build.add_argument("--input", required=True)
+    build.add_argument("--output", required=True)
+    build.add_argument("--model", default=MODEL_DIR, help="model_package.pkl (feature_cols и энкодеры)")
+
+    args = parser.parse_args()
+
+    if args.input.endswith(".parquet"):
+        df = pd.read_parquet(args.input)
+    else:
+        df = _read_patterns_csv(args.input)
+
+    columns = None
+    encoders = None
+    if args.model and os.path.exists(args.model):
+        pkg = joblib.load(args.model)
+        encoders = pkg.get("encoders", {})
+        columns = [
+            c for c in pkg["feature_cols"]
+            if c in df.columns and c not in _SKIP_COLS
+        ]
+
+    t0 = time.perf_counter()
+    n = build_feature_store(df, args.output, columns=columns, encoders=encoders)
+    print(f"✓ {args.output}: {n} customers in {time.perf_counter() - t0:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
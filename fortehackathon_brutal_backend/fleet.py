@@ -0,0 +1,202 @@
+"""
+Общее желаемое состояние воркеров serve.py (prefork).
+
+Admin-запрос попадает в один воркер, а перезагрузка модели и
+shadow-кандидат должны действовать во всех. Поэтому изменение
+публикуется в каталог FLEET_DIR, и каждый воркер применяет его сам:
+
+  • control.json — желаемое состояние по секциям ("model", "shadow"),
+    у каждой секции растущий seq; пишется под flock атомарной заменой;
+  • workers/<pid>.json — что применил воркер и его статус (модель,
+    статистика shadow), для /admin/model/status и /admin/shadow.
+
+FleetSync — поток воркера: раз в poll_seconds читает control.json,
+применяет секции с новым seq и публикует свой статус. Мастер serve.py
+только создаёт и очищает каталог — моделей и потоков в нём нет.
+Воркер, перезапущенный после падения, форкается со старой моделью
+мастера и догоняет опубликованное состояние на первом опросе.
+"""
+
+import fcntl
+import json
+import os
+import shutil
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+
+class FleetControl:
+    """Файлы каталога FLEET_DIR: control.json и статусы воркеров."""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self.path = os.path.join(directory, "control.json")
+        self.workers_dir = os.path.join(directory, "workers")
+        os.makedirs(self.workers_dir, exist_ok=True)
+
+    def reset(self):
+        """Чистый каталог — при старте мастера (состояние прошлого запуска не применяется)."""
+        shutil.rmtree(self.directory, ignore_errors=True)
+        os.makedirs(self.workers_dir, exist_ok=True)
+
+    # ------------------------------------------------------------------
+    #  Желаемое состояние
+    # ------------------------------------------------------------------
+    def read(self) -> Dict[str, Dict[str, Any]]:
+        try:
+            with open(self.path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def publish(self, section: str, values: Dict[str, Any]) -> int:
+        """Новое значение секции; возвращает её seq."""
+        with open(os.path.join(self.directory, "control.lock"), "a") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            state = self.read()
+            seq = state.get(section, {}).get("seq", 0) + 1
+            state[section] = {"seq": seq, **values}
+            _write_json(self.path, state)
+        return seq
+
+    # ------------------------------------------------------------------
+    #  Статусы воркеров
+    # ------------------------------------------------------------------
+    def write_worker(self, pid: int, status: Dict[str, Any]):
+        _write_json(os.path.join(self.workers_dir, f"{pid}.json"), status)
+
+    def remove_worker(self, pid: int):
+        try:
+            os.remove(os.path.join(self.workers_dir, f"{pid}.json"))
+        except OSError:
+            pass
+
+    def workers(self) -> List[Dict[str, Any]]:
+        """Статусы живых воркеров (файлы завершившихся процессов пропускаются)."""
+        result = []
+        for name in sorted(os.listdir(self.workers_dir)):
+            pid, ext = os.path.splitext(name)
+            if ext != ".json" or not pid.isdigit() or not _alive(int(pid)):
+                continue
+            try:
+                with open(os.path.join(self.workers_dir, name)) as f:
+                    result.append(json.load(f))
+            except (OSError, ValueError):
+                continue
+        return result
+
+
+class FleetSync:
+    """
+    Поток воркера: применяет изменённые секции control.json и публикует статус.
+
+    appliers[section](values) применяет секцию в этом процессе;
+    RuntimeError — «занято, повторить на следующем опросе», другие
+    ошибки запоминаются в статусе, и секция считается обработанной.
+    """
+
+    def __init__(
+        self,
+        control: FleetControl,
+        appliers: Dict[str, Callable[[Dict[str, Any]], Any]],
+        status: Callable[[], Dict[str, Any]],
+        poll_seconds: float = 1.0,
+    ):
+        self.control = control
+        self.appliers = appliers
+        self.status = status
+        self.poll_seconds = poll_seconds
+        self.pid = os.getpid()
+        self.applied: Dict[str, int] = {section: 0 for section in appliers}
+        self.errors: Dict[str, str] = {}
+
+        # опрос и локальное применение admin-запроса не пересекаются
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def change(self, section: str, values: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Admin-запрос в этом воркере: применить здесь и, если получилось,
+        опубликовать остальным. Ошибки применения пробрасываются вызывающему.
+        """
+        with self._lock:
+            result = self.appliers[section](values)
+            seq = self.control.publish(section, values)
+            self.applied[section] = seq
+            self.errors.pop(section, None)
+        self._publish_status()
+        return {"result": result, "seq": seq}
+
+    def poll(self):
+        state = self.control.read()
+        with self._lock:
+            for section, apply in self.appliers.items():
+                desired = state.get(section)
+                if desired is None or desired["seq"] <= self.applied[section]:
+                    continue
+                values = {k: v for k, v in desired.items() if k != "seq"}
+                try:
+                    apply(values)
+                except RuntimeError as e:
+                    print(f"[Fleet] {section} #{desired['seq']} postponed: {e}")
+                    continue
+                except Exception as e:
+                    self.errors[section] = str(e)
+                    print(f"[Fleet] {section} #{desired['seq']} failed in pid={self.pid}: {e}")
+                else:
+                    self.errors.pop(section, None)
+                    print(f"[Fleet] {section} #{desired['seq']} applied in pid={self.pid}")
+                self.applied[section] = desired["seq"]
+        self._publish_status()
+
+    def _publish_status(self):
+        self.control.write_worker(self.pid, {
+            "pid": self.pid,
+            "updated_at": time.time(),
+            "applied": dict(self.applied),
+            "errors": dict(self.errors),
+            **self.status(),
+        })
+
+    def desired_seq(self) -> Dict[str, int]:
+        return {section: values.get("seq", 0) for section, values in self.control.read().items()}
+
+    # ------------------------------------------------------------------
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="fleet-sync", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+        self.control.remove_worker(self.pid)
+
+    def _run(self):
+        while True:
+            try:
+                self.poll()
+            except Exception as e:
+                print(f"[Fleet] poll failed: {e}")
+            if self._stopped.wait(self.poll_seconds):
+                return
+
+
+def _write_json(path: str, data: Any):
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(data, f, default=str)
+    os.replace(tmp, path)
+
+
+def _alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
@@ -0,0 +1,323 @@
+"""
+Глобальный инкрементальный граф «клиент → direction» для графовых фичей.
+
+Раньше receiver_in_degree был захардкожен в 1, а sender_out_degree и
+pair_count считались проходом по истории одного клиента. Индекс держит
+рёбра всех клиентов процесса и отвечает за O(1) на запрос
+(сумма не более чем по retention_days дневным корзинам).
+
+Устройство:
+  • клиенты и direction получают компактные int id, ребро = одно int;
+  • для ребра храним день последней транзакции и отсортированные
+    моменты транзакций (секунды);
+  • для direction — гистограмма «сколько отправителей последний раз
+    были активны в день d» (in-degree за окно = сумма корзин окна);
+  • для клиента — множество его direction.
+
+pair_count и sender_out_degree, как и раньше по истории клиента,
+считают только транзакции строго раньше текущей (ts < текущего):
+бинарный поиск по моментам рёбер клиента. receiver_in_degree —
+по дневным корзинам, с точностью до дня: отправитель, впервые
+пришедший в direction позже в тот же день, уже учтён.
+
+Память ограничена: всё старше retention_days от самой свежей
+транзакции вычищается (sweep), пустые клиенты/direction удаляются.
+retention_days — HISTORY_RETENTION_DAYS, но не меньше самого длинного
+окна фичей (60 дней). Чистка не обходит все рёбра: рёбра разложены по
+дневным корзинам (день последней транзакции / дни с транзакциями), и
+при смене дня снимаются только корзины старше окна. Транзакции позже
+часов сервера плюс HISTORY_FUTURE_SKEW_HOURS день чистки не двигают.
+
+Транзакции «из прошлого» (не по порядку) учитываются в своих корзинах,
+но distinct-счётчики ребра переезжают только вперёд по времени.
+"""
+
+import sys
+import threading
+from bisect import bisect_left, insort
+from typing import Any, Dict, List, Optional, Set
+
+import numpy as np
+import pandas as pd
+
+from config import HISTORY_RETENTION_DAYS
+from history_retention import is_future
+from memory_report import sampled_bytes
+
+# окна фичей; самое длинное — фича без суффикса (receiver_in_degree и т.д.)
+WINDOWS = (7, 30, 60)
+_DAY_SECONDS = 86_400
+
+
+def _seconds(ts) -> float:
+    return pd.Timestamp(ts).timestamp()
+
+
+def _prior_count(times: Optional[List[float]], start: float, end: float) -> int:
+    """Число моментов в [start, end) — строго раньше end."""
+    if not times:
+        return 0
+    return bisect_left(times, end) - bisect_left(times, start)
+
+
+def _window_sum(hist: Optional[Dict[int, int]], first_day: int, last_day: int) -> int:
+    if not hist:
+        return 0
+    return sum(cnt for d, cnt in hist.items() if first_day <= d <= last_day)
+
+
+def _hist_move(hist: Dict[int, int], old_day: Optional[int], new_day: int):
+    if old_day is not None:
+        _hist_dec(hist, old_day)
+    hist[new_day] = hist.get(new_day, 0) + 1
+
+
+def _hist_dec(hist: Dict[int, int], day: int):
+    left = hist[day] - 1
+    if left:
+        hist[day] = left
+    else:
+        del hist[day]
+
+
+class DirectionGraphIndex:
+    """
+    Потокобезопасный индекс рёбер (cst_dim_id → direction) со скользящими окнами.
+    """
+
+    def __init__(self, retention_days: int = HISTORY_RETENTION_DAYS):
+        # короче самого длинного окна нельзя — фичи за 60 дней обрезались бы
+        self.retention_days = max(retention_days, WINDOWS[-1])
+
+        self._customer_ids: Dict[int, int] = {}
+        self._direction_ids: Dict[str, int] = {}
+        # обратные таблицы id → ключ: чистка удаляет клиентов/direction без обхода
+        self._customer_keys: Dict[int, int] = {}
+        self._direction_keys: Dict[int, str] = {}
+        self._next_customer = 0
+        self._next_direction = 0
+
+        # ребро (cid << 32 | did) → последний день / отсортированные моменты транзакций
+        self._edge_last: Dict[int, int] = {}
+        self._edge_times: Dict[int, List[float]] = {}
+        # дневные корзины рёбер: день → рёбра, у которых это последний день /
+        # у которых есть транзакции в этот день
+        self._last_days: Dict[int, Set[int]] = {}
+        self._count_days: Dict[int, Set[int]] = {}
+        # did → {день: число отправителей, последний раз активных в этот день}
+        self._in_hist: Dict[int, Dict[int, int]] = {}
+        # cid → direction клиента (did)
+        self._out_dirs: Dict[int, Set[int]] = {}
+
+        self._max_day: Optional[int] = None
+        self._lock = threading.Lock()
+
+    # ------------------------------------------------------------------
+    @classmethod
+    def from_history(cls, history: Dict[int, list], retention_days: int = HISTORY_RETENTION_DAYS):
+        """Строит индекс из истории вида {cst_dim_id: [(ts, amount, direction), ...]}."""
+        index = cls(retention_days=retention_days)
+        for cst_id, entries in history.items():
+            for entry in entries:
+                index.add(cst_id, entry[2], entry[0])
+        return index
+
+    def add(self, cst_id: int, direction: str, ts):
+        """Учитывает транзакцию cst_id → direction в момент ts."""
+        seconds = _seconds(ts)
+        day = int(seconds // _DAY_SECONDS)
+        future = is_future(ts)
+        with self._lock:
+            cid = self._customer_ids.get(cst_id)
+            if cid is None:
+                cid = self._customer_ids[cst_id] = self._next_customer
+                self._customer_keys[cid] = cst_id
+                self._next_customer += 1
+            did = self._direction_ids.get(direction)
+            if did is None:
+                did = self._direction_ids[direction] = self._next_direction
+                self._direction_keys[did] = direction
+                self._next_direction += 1
+
+            edge = (cid << 32) | did
+            prev = self._edge_last.get(edge)
+            if prev is None or day > prev:
+                _hist_move(self._in_hist.setdefault(did, {}), prev, day)
+                self._out_dirs.setdefault(cid, set()).add(did)
+                self._edge_last[edge] = day
+                if prev is not None:
+                    self._last_days[prev].discard(edge)
+                self._last_days.setdefault(day, set()).add(edge)
+
+            insort(self._edge_times.setdefault(edge, []), seconds)
+            self._count_days.setdefault(day, set()).add(edge)
+
+            # водяной знак двигают только транзакции не из «будущего»
+            if not future and (self._max_day is None or day > self._max_day):
+                advanced = self._max_day is not None
+                self._max_day = day
+                # вычищаем старое раз в «день данных»
+                if advanced:
+                    self._sweep_locked()
+
+    def edge_features(self, cst_id: int, direction: str, ts) -> Dict[str, int]:
+        """
+        Графовые фичи транзакции cst_id → direction в момент ts (сама она ещё не учтена).
+
+          receiver_in_degree — число разных отправителей в direction,
+                               включая текущего (по дням окна);
+          sender_out_degree  — число разных direction клиента с транзакциями
+                               строго раньше ts;
+          pair_count         — число транзакций клиента в этот direction
+                               строго раньше ts.
+
+        Без суффикса — окно retention_days, плюс варианты *_7d / *_30d.
+        """
+        seconds = _seconds(ts)
+        day = int(seconds // _DAY_SECONDS)
+        with self._lock:
+            cid = self._customer_ids.get(cst_id)
+            did = self._direction_ids.get(direction)
+            in_hist = self._in_hist.get(did) if did is not None else None
+            edge = (cid << 32) | did if cid is not None and did is not None else None
+            edge_last = self._edge_last.get(edge) if edge is not None else None
+            # моменты всех рёбер клиента: direction клиента — единицы / десятки
+            sender_times = [
+                self._edge_times[(cid << 32) | out_did] for out_did in self._out_dirs.get(cid, ())
+            ] if cid is not None else []
+            edge_times = self._edge_times.get(edge) if edge is not None else None
+
+            result: Dict[str, int] = {}
+            for window in WINDOWS:
+                first_day = day - window + 1
+                start = first_day * _DAY_SECONDS
+                in_degree = _window_sum(in_hist, first_day, day)
+                # текущий отправитель входит в in-degree, даже если ребро новое
+                if edge_last is None or not (first_day <= edge_last <= day):
+                    in_degree += 1
+
+                suffix = "" if window == WINDOWS[-1] else f"_{window}d"
+                result["receiver_in_degree" + suffix] = in_degree
+                result["sender_out_degree" + suffix] = sum(
+                    1 for times in sender_times if _prior_count(times, start, seconds)
+                )
+                result["pair_count" + suffix] = _prior_count(edge_times, start, seconds)
+        return result
+
+    # ------------------------------------------------------------------
+    def sweep(self):
+        """Удаляет корзины и рёбра старше retention_days от самой свежей транзакции."""
+        with self._lock:
+            self._sweep_locked()
+
+    def _sweep_locked(self):
+        if self._max_day is None:
+            return
+        cutoff = self._max_day - self.retention_days + 1
+
+        # рёбра, последний день которых выпал из окна, — целиком
+        for last in [d for d in self._last_days if d < cutoff]:
+            for edge in self._last_days.pop(last):
+                del self._edge_last[edge]
+                self._edge_times.pop(edge, None)
+                cid, did = edge >> 32, edge & 0xFFFFFFFF
+                _hist_dec(self._in_hist[did], last)
+                self._out_dirs[cid].discard(did)
+                # клиенты и direction без рёбер больше не нужны
+                if not self._in_hist[did]:
+                    del self._in_hist[did]
+                    del self._direction_ids[self._direction_keys.pop(did)]
+                if not self._out_dirs[cid]:
+                    del self._out_dirs[cid]
+                    del self._customer_ids[self._customer_keys.pop(cid)]
+
+        # у живых рёбер — только выпавшие моменты
+        start = cutoff * _DAY_SECONDS
+        for day in [d for d in self._count_days if d < cutoff]:
+            for edge in self._count_days.pop(day):
+                times = self._edge_times.get(edge)
+                if times is not None:
+                    del times[:bisect_left(times, start)]
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "customers": len(self._customer_ids),
+                "directions": len(self._direction_ids),
+                "edges": len(self._edge_last),
+            }
+
+    def memory_stats(self) -> Dict[str, Any]:
+        """
+        Оценка памяти: таблицы словарей целиком + ключи/значения и
+        вложенные дневные корзины по выборке (без обхода всех рёбер).
+        """
+        with self._lock:
+            tables = (self._customer_ids, self._direction_ids, self._customer_keys, self._direction_keys,
+                      self._edge_last, self._edge_times, self._in_hist, self._out_dirs)
+            estimated = sum(sys.getsizeof(table) for table in tables)
+            # int-ключи и id: по объекту int на ключ и значение
+            estimated += 2 * 28 * (len(self._customer_ids) + len(self._edge_last))
+            # дневные корзины: множества рёбер (ребро — в одной «последней» и в корзинах счётчиков)
+            for buckets in (self._last_days, self._count_days):
+                estimated += sys.getsizeof(buckets) + sum(sys.getsizeof(edges) for edges in buckets.values())
+            estimated += sampled_bytes(iter(self._direction_ids), len(self._direction_ids))
+            for nested in (self._edge_times, self._in_hist, self._out_dirs):
+                estimated += 28 * len(nested) + sampled_bytes(iter(nested.values()), len(nested))
+            return {
+                "customers": len(self._customer_ids),
+                "directions": len(self._direction_ids),
+                "edges": len(self._edge_last),
+                "estimated_bytes": estimated,
+            }
+
+
+# ----------------------------------------------------------------------
+#  Офлайн-скоринг по партициям (batch_score.py)
+# ----------------------------------------------------------------------
+def precompute_edge_features(history: Dict[int, list], rows, retention_days: int = HISTORY_RETENTION_DAYS):
+    """
+    Графовые фичи строк (cst_dim_id, direction, ts) в порядке строк —
+    так же, как их видит последовательный онлайн-путь: фичи строки до её
+    добавления в индекс. Граф общий для всех клиентов, поэтому при
+    разбиении по cst_dim_id он считается одним проходом заранее.
+    Возвращает (имена фичей, int64-матрица строки × фичи).
+    """
+    index = DirectionGraphIndex.from_history(history, retention_days=retention_days)
+    names = None
+    values = []
+    for cst_id, direction, ts in rows:
+        features = index.edge_features(cst_id, direction, ts)
+        if names is None:
+            names = list(features)
+        values.append([features[name] for name in names])
+        index.add(cst_id, direction, ts)
+    return names or [], np.asarray(values, dtype=np.int64).reshape(len(values), len(names or []))
+
+
+class EdgeFeatureReplay:
+    """
+    Подменяет DirectionGraphIndex в процессе-партиции: отдаёт заранее
+    посчитанные фичи строк по порядку (add — ничего не делает).
+    Строки партиции должны скориться в том же порядке.
+    """
+
+    def __init__(self, names, values, cst_ids, directions):
+        self._names = names
+        self._values = values
+        self._keys = list(zip(cst_ids, directions))
+        self._pos = 0
+
+    def edge_features(self, cst_id: int, direction: str, ts) -> Dict[str, int]:
+        expected = self._keys[self._pos]
+        if expected != (cst_id, direction):
+            raise RuntimeError(f"graph replay out of order: expected {expected}, got {(cst_id, direction)}")
+        row = self._values[self._pos]
+        self._pos += 1
+        return {name: int(value) for name, value in zip(self._names, row)}
+
+    def add(self, cst_id: int, direction: str, ts):
+        pass
+
+    def stats(self) -> Dict[str, int]:
+        return {"replayed": self._pos, "rows": len(self._keys)}
@@ -0,0 +1,212 @@
+"""
+Управление памятью истории клиентов (FraudDetectionAPI.history).
+
+_update_history чистит записи старше 60 дней только у клиента, который
+сейчас совершил транзакцию; ушедшие клиенты оставались в памяти навсегда.
+Здесь две части:
+
+  • фоновый инкрементальный sweeper: за один шаг обходит не больше
+    sweep_batch клиентов, удаляет записи старше retention_days от
+    «водяного знака» (самой свежей увиденной транзакции) и выкидывает
+    клиентов с пустой историей. Транзакции позже часов сервера плюс
+    future_skew водяной знак не двигают — одна запись с датой 2099
+    иначе стёрла бы всю историю;
+  • бюджет памяти: при превышении оценки в байтах выселяются клиенты,
+    дольше всех не проявлявшие активность (LRU по порядку запросов).
+
+Оценка памяти — число записей × байт на запись + число клиентов ×
+накладные расходы на клиента; байты на запись измеряются по выборке.
+"""
+
+import random
+import sys
+import threading
+import time
+from collections import OrderedDict
+from datetime import timedelta
+from typing import Any, Dict, Hashable, List, Optional
+
+import pandas as pd
+
+from config import HISTORY_FUTURE_SKEW_HOURS
+
+# накладные расходы на клиента: слот dict истории + пустой list + узел OrderedDict
+_CUSTOMER_OVERHEAD_BYTES = 56 + 104 + 8 + 100
+
+
+def is_future(ts, skew: timedelta = timedelta(hours=HISTORY_FUTURE_SKEW_HOURS)) -> bool:
+    """ts позже часов сервера больше чем на skew (наивное время — как UTC, как в graph_index)."""
+    return pd.Timestamp(ts).timestamp() > time.time() + skew.total_seconds()
+
+
+def estimate_entry_bytes(history: Dict[Hashable, list], sample: int = 200) -> float:
+    """Средний размер одной записи (ts, amount, direction) по случайной выборке клиентов."""
+    if not history:
+        return 200.0
+    keys = random.sample(list(history.keys()), min(sample, len(history)))
+    total = 0
+    count = 0
+    for key in keys:
+        for entry in history[key]:
+            # direction — обычно общий интернированный объект, но считаем честно
+            total += 8 + sys.getsizeof(entry) + sum(sys.getsizeof(x) for x in entry)
+            count += 1
+    return total / count if count else 200.0
+
+
+class HistoryRetention:
+    """
+    Держит порядок активности клиентов, счётчики и фоновый sweeper.
+    Все изменения истории выполняются под self.lock.
+    """
+
+    def __init__(
+        self,
+        history: Dict[Hashable, list],
+        retention_days: int = 60,
+        memory_budget_mb: float = 0.0,
+        sweep_batch: int = 2000,
+        sweep_interval: float = 1.0,
+        start: bool = True,
+        future_skew_hours: float = HISTORY_FUTURE_SKEW_HOURS,
+    ):
+        self.history = history
+        self.retention = timedelta(days=retention_days)
+        self.future_skew = timedelta(hours=future_skew_hours)
+        self.memory_budget_bytes = int(memory_budget_mb * 1024 * 1024)
+        self.sweep_batch = sweep_batch
+        self.sweep_interval = sweep_interval
+
+        self.lock = threading.RLock()
+
+        # клиенты в порядке последней активности: первый — самый «старый»
+        self.activity: "OrderedDict[Hashable, None]" = OrderedDict.fromkeys(history.keys())
+        self.total_entries = sum(len(v) for v in history.values())
+        self.watermark = None
+        for entries in history.values():
+            for entry in reversed(entries):
+                if not is_future(entry[0], self.future_skew):
+                    if self.watermark is None or entry[0] > self.watermark:
+                        self.watermark = entry[0]
+                    break
+        self.future_entries = 0
+        self.entry_bytes = estimate_entry_bytes(history)
+
+        self.expired_entries = 0
+        self.dropped_customers = 0
+        self.evicted_customers = 0
+        self.evicted_entries = 0
+        self.sweep_passes = 0
+        self._sweep_cursor: Optional[List[Hashable]] = None
+        self._sweep_pos = 0
+
+        self._stopped = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        if start:
+            self.start()
+
+    # ------------------------------------------------------------------
+    #  Горячий путь (вызывается из _update_history под self.lock)
+    # ------------------------------------------------------------------
+    def touch(self, cst_id: Hashable, ts, entries_delta: int):
+        self.activity[cst_id] = None
+        self.activity.move_to_end(cst_id)
+        self.total_entries += entries_delta
+        if self.watermark is None or ts > self.watermark:
+            if is_future(ts, self.future_skew):
+                self.future_entries += 1
+            else:
+                self.watermark = ts
+        if self.memory_budget_bytes and self.estimated_bytes() > self.memory_budget_bytes:
+            self._evict_locked()
+
+    # ------------------------------------------------------------------
+    #  Фоновая часть
+    # ------------------------------------------------------------------
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="history-retention", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+
+    def _run(self):
+        while not self._stopped.wait(self.sweep_interval):
+            try:
+                self.sweep_step()
+            except Exception as e:
+                print(f"[HistoryRetention] sweep failed: {e}")
+
+    def sweep_step(self) -> int:
+        """
+        Один инкрементальный шаг: обрабатывает до sweep_batch клиентов.
+        Возвращает число удалённых записей.
+        """
+        with self.lock:
+            if self.watermark is None:
+                return 0
+            if self._sweep_cursor is None or self._sweep_pos >= len(self._sweep_cursor):
+                # новый проход по снимку ключей (сам снимок — один list() под lock)
+                self._sweep_cursor = list(self.history.keys())
+                self._sweep_pos = 0
+                self.sweep_passes += 1
+
+            cutoff = self.watermark - self.retention
+            chunk = self._sweep_cursor[self._sweep_pos:self._sweep_pos + self.sweep_batch]
+            self._sweep_pos += len(chunk)
+
+            removed = 0
+            for cst_id in chunk:
+                entries = self.history.get(cst_id)
+                if entries is None:
+                    continue
+                if entries and entries[0][0] < cutoff:
+                    kept = [h for h in entries if h[0] >= cutoff]
+                    removed += len(entries) - len(kept)
+                    entries = kept
+                    self.history[cst_id] = kept
+                if not entries:
+                    del self.history[cst_id]
+                    self.activity.pop(cst_id, None)
+                    self.dropped_customers += 1
+
+            self.total_entries -= removed
+            self.expired_entries += removed
+
+            if self.memory_budget_bytes and self.estimated_bytes() > self.memory_budget_bytes:
+                self._evict_locked()
+            return removed
+
+    def _evict_locked(self):
+        # выселяем до 90% бюджета, чтобы не выселять на каждом запросе
+        target = int(self.memory_budget_bytes * 0.9)
+        while self.activity and self.estimated_bytes() > target:
+            cst_id, _ = self.activity.popitem(last=False)
+            entries = self.history.pop(cst_id, None) or []
+            self.total_entries -= len(entries)
+            self.evicted_entries += len(entries)
+            self.evicted_customers += 1
+
+    # ------------------------------------------------------------------
+    def estimated_bytes(self) -> int:
+        return int(self.total_entries * self.entry_bytes + len(self.history) * _CUSTOMER_OVERHEAD_BYTES)
+
+    def stats(self) -> Dict[str, Any]:
+        with self.lock:
+            return {
+                "customers": len(self.history),
+                "entries": self.total_entries,
+                "estimated_bytes": self.estimated_bytes(),
+                "memory_budget_bytes": self.memory_budget_bytes,
+                "bytes_per_entry": round(self.entry_bytes, 1),
+                "watermark": str(self.watermark) if self.watermark is not None else None,
+                "future_entries": self.future_entries,
+                "expired_entries": self.expired_entries,
+                "dropped_customers": self.dropped_customers,
+                "evicted_customers": self.evicted_customers,
+                "evicted_entries": self.evicted_entries,
+                "sweep_passes": self.sweep_passes,
+            }
@@ -0,0 +1,137 @@
+"""
+Идемпотентный скоринг: ограниченный LRU/TTL-кэш результатов
+по id транзакции (или заголовку Idempotency-Key).
+
+Повторная отправка той же транзакции (ретрай апстрима) получает
+сохранённый результат без пересчёта и без повторной записи в историю.
+Одновременные дубликаты схлопываются в одно вычисление.
+"""
+
+import itertools
+import sys
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, Hashable, List, Optional, Tuple
+
+from memory_report import deep_sizeof
+
+
+class IdempotencyCache:
+    """
+    Потокобезопасный LRU-кэш с TTL и схлопыванием конкурентных дубликатов.
+    """
+
+    def __init__(self, max_size: int = 100_000, ttl_seconds: float = 86_400.0):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+
+        self._entries: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self._in_flight: Dict[Hashable, Future] = {}
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+
+    def get_or_compute(
+        self,
+        key: Hashable,
+        compute: Callable[[], Any],
+        replayed_out: Optional[List[bool]] = None,
+        refresh: Optional[Callable[[Any], Any]] = None,
+    ) -> Any:
+        """
+        Возвращает сохранённый результат по ключу либо вычисляет его.
+        Если тот же ключ уже считается в другом потоке — ждёт его результат.
+        replayed_out — сюда добавляется True, если результат не вычислен
+        этим вызовом (из кэша или чужого вычисления), иначе False.
+        refresh(сохранённое) — на попадании в кэш: новое значение вместо
+        сохранённого (с тем же сроком жизни) или None — оставить как есть.
+        """
+        now = time.monotonic()
+        hit = None
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires_at, value = entry
+                if expires_at > now:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    if replayed_out is not None:
+                        replayed_out.append(True)
+                    if refresh is None:
+                        return value
+                    hit = entry
+                else:
+                    del self._entries[key]
+
+            if hit is None:
+                future = self._in_flight.get(key)
+                owner = future is None
+                if owner:
+                    future = Future()
+                    self._in_flight[key] = future
+                    self.misses += 1
+                else:
+                    self.coalesced += 1
+
+        if hit is not None:
+            # пересчёт — вне lock; записываем, если запись не вытеснили
+            fresh = refresh(value)
+            if fresh is None:
+                return value
+            with self._lock:
+                if self._entries.get(key) is hit:
+                    self._entries[key] = (expires_at, fresh)
+            return fresh
+
+        if not owner:
+            value = future.result()
+            if replayed_out is not None:
+                replayed_out.append(True)
+            return value
+
+        try:
+            value = compute()
+        except BaseException as e:
+            # ошибки не кэшируем: ретрай должен посчитать заново
+            with self._lock:
+                del self._in_flight[key]
+            future.set_exception(e)
+            raise
+
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+            del self._in_flight[key]
+        future.set_result(value)
+        if replayed_out is not None:
+            replayed_out.append(False)
+        return value
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "in_flight": len(self._in_flight),
+                "hits": self.hits,
+                "misses": self.misses,
+                "coalesced": self.coalesced,
+                "evictions": self.evictions,
+            }
+
+    def memory_stats(self) -> Dict[str, int]:
+        """Оценка памяти: таблица LRU + результаты по выборке последних записей."""
+        with self._lock:
+            size = len(self._entries)
+            table = sys.getsizeof(self._entries)
+            sample = list(itertools.islice(reversed(self._entries.values()), 32))
+        per_entry = sum(deep_sizeof(entry) for entry in sample) / len(sample) if sample else 0
+        return {"entries": size, "estimated_bytes": int(table + per_entry * size)}
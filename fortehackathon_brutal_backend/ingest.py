@@ -0,0 +1,301 @@
+"""
+Чтение CSV для batch-скоринга: диалект по образцу, разбор за один проход.
+
+Раньше /bulk_predict декодировал весь файл как utf-8 и при ошибке разбирал
+его заново как cp1251, а дашборд перебирал до девяти пар
+«кодировка × разделитель». Здесь:
+
+  • sniff() по образцу (начало и конец файла, SAMPLE_BYTES) определяет
+    кодировку (utf-8 / BOM / cp1251), разделитель (самое устойчивое число
+    полей по строкам), сколько строк до заголовка (банковская выгрузка
+    начинается со строки-названия) и десятичную запятую;
+  • read_csv() разбирает файл один раз многопоточным pyarrow.csv;
+    числовые колонки (amount) чистятся от кавычек и разделителей тысяч,
+    десятичный знак определяется по каждому значению (см.
+    _normalize_numbers_arrow) — в Arrow compute, без Python-цикла по строкам;
+  • отчёт — строки, байты, время и rows/s.
+
+Без pyarrow — тот же диалект и та же очистка через pandas (C-парсер).
+"""
+
+import csv
+import io
+import re
+import time
+from collections import Counter
+from typing import Any, Dict, Iterable, Optional, Sequence, Tuple, Union
+
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.csv as pa_csv
+except ImportError:  # pyarrow опционален — разбор через pandas
+    pa = None
+
+SAMPLE_BYTES = 64 * 1024
+DELIMITERS = (",", ";", "\t", "|")
+
+# пробелы (в т.ч. неразрывные) как разделители тысяч и остатки кавычек;
+# в RE2 (Arrow compute) \s — только ASCII, неразрывные пробелы перечислены явно
+_NUMBER_JUNK_RE2 = r"[\s\x{00A0}\x{202F}\"']"
+# pandas со строками на pyarrow тоже разбирает regex через RE2 — те же символы явно
+_NUMBER_JUNK_PY = "[\\s\u00a0\u202f\"']"
+_NUMBER_RE = r"^[+-]?(\d+\.?\d*|\.\d+)([eE][+-]?\d+)?$"
+_COMMA_NUMBER_RE = re.compile(r"^[+-]?\d{1,3}([\s.]?\d{3})*,\d+$")
+# «.» / «,» как разделитель тысяч: ровно по 3 цифры в группах (RE2 и re)
+_GROUPED_COMMA = r"^[+-]?\d{1,3}(?:,\d{3})+$"
+_GROUPED_DOT = r"^[+-]?\d{1,3}(?:\.\d{3})+$"
+# из двух знаков десятичный — последний
+_DOT_LAST = r"\.\d*$"
+_COMMA_LAST = r",\d*$"
+
+
+class CsvDialect:
+    """
+    Что sniff() узнал о файле; сериализуется в dict (курсор uploads.py).
+    """
+
+    def __init__(self, encoding: str = "utf-8", delimiter: str = ",", skip_rows: int = 0, decimal: str = "."):
+        self.encoding = encoding
+        self.delimiter = delimiter
+        self.skip_rows = skip_rows
+        self.decimal = decimal
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "encoding": self.encoding,
+            "delimiter": self.delimiter,
+            "skip_rows": self.skip_rows,
+            "decimal": self.decimal,
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "CsvDialect":
+        return cls(**data)
+
+    def __repr__(self):
+        return f"CsvDialect({self.to_dict()})"
+
+
+# ----------------------------------------------------------------------
+#  Диалект
+# ----------------------------------------------------------------------
+def _complete_lines(sample: bytes, at_eof: bool) -> bytes:
+    """Отрезает последнюю неполную строку (и разрезанный многобайтный символ)."""
+    if at_eof:
+        return sample
+    cut = sample.rfind(b"\n")
+    return sample[: cut + 1] if cut >= 0 else sample
+
+
+def _sniff_encoding(head: bytes, tail: bytes) -> str:
+    if head.startswith(b"\xef\xbb\xbf"):
+        return "utf-8-sig"
+    try:
+        head.decode("utf-8")
+        tail.decode("utf-8")
+        return "utf-8"
+    except UnicodeDecodeError:
+        # исходная банковская выгрузка
+        return "cp1251"
+
+
+def sniff(sample: bytes, tail: bytes = b"", at_eof: bool = False, expected_columns: Iterable[str] = ()) -> CsvDialect:
+    """
+    Диалект по образцу начала файла (и, если есть, конца).
+    expected_columns помогают найти строку заголовка.
+    """
+    head = _complete_lines(sample, at_eof)
+    tail = tail[tail.find(b"\n") + 1:] if tail else b""
+    encoding = _sniff_encoding(head, tail)
+    lines = head.decode(encoding, errors="replace").splitlines()[:200]
+
+    # разделитель: самое частое число полей > 1, встречающееся в большинстве строк
+    best = (0.0, 0, ",")
+    for delimiter in DELIMITERS:
+        counts = [len(row) for row in csv.reader(lines, delimiter=delimiter) if row]
+        if not counts:
+            continue
+        fields, hits = Counter(counts).most_common(1)[0]
+        if fields < 2:
+            continue
+        if (hits / len(counts), fields) > best[:2]:
+            best = (hits / len(counts), fields, delimiter)
+    _, fields, delimiter = best
+
+    # заголовок: первая строка с ожидаемыми колонками, иначе — с типичным числом полей
+    # (индекс строки = индекс сырой строки файла: пустые строки тоже считаются)
+    expected = set(expected_columns)
+    rows = list(csv.reader(lines, delimiter=delimiter))
+    skip_rows = 0
+    for i, row in enumerate(rows):
+        names = {name.strip() for name in row}
+        if (expected and expected <= names) or (not expected and len(row) == fields):
+            skip_rows = i
+            break
+
+    # десятичная запятая: числа вида «1 234,56» / «1.234,56» в строках
+    # данных начала и конца файла. Это только подсказка для одиночного
+    # «1.500» / «1,500» — знак каждого значения решается при разборе
+    decimal = "."
+    if delimiter != ",":
+        tail_rows = csv.reader(tail.decode(encoding, errors="replace").splitlines()[-200:], delimiter=delimiter)
+        values = (value.strip("\"' ") for row in [*rows[skip_rows + 1:], *tail_rows] for value in row)
+        if any(_COMMA_NUMBER_RE.match(value) for value in values):
+            decimal = ","
+    return CsvDialect(encoding=encoding, delimiter=delimiter, skip_rows=skip_rows, decimal=decimal)
+
+
+# ----------------------------------------------------------------------
+#  Разбор
+# ----------------------------------------------------------------------
+def _normalize_numbers_arrow(column, decimal: str):
+    """
+    Строковая колонка Arrow → float64; мусор → null (как errors="coerce").
+
+    Десятичный знак — по каждому значению, а не по файлу (в образце для
+    sniff могли быть только целые суммы):
+      • есть и «.», и «,» — десятичный последний («1,234.56», «1.234,56»);
+      • запятая — десятичная, если за ней не группы ровно по 3 цифры:
+        «1500,50» → 1500.5, «1,500» / «1,234,567» → тысячи;
+      • точка — десятичная, кроме нескольких групп по 3 цифры
+        («1.234.567») и одиночной «1.500» в файле с десятичной запятой.
+    """
+    column = pc.replace_substring_regex(column, _NUMBER_JUNK_RE2, "")
+    has_comma = pc.match_substring(column, ",")
+    has_dot = pc.match_substring(column, ".")
+    comma_group = pc.match_substring_regex(column, _GROUPED_COMMA)
+    dot_group = pc.match_substring_regex(column, _GROUPED_DOT)
+    if decimal != ",":
+        dot_group = pc.and_(dot_group, pc.greater(pc.count_substring(column, "."), 1))
+    comma_thousands = pc.and_(has_comma, pc.if_else(has_dot, pc.match_substring_regex(column, _DOT_LAST), comma_group))
+    dot_thousands = pc.and_(has_dot, pc.if_else(has_comma, pc.match_substring_regex(column, _COMMA_LAST), dot_group))
+
+    column = pc.if_else(comma_thousands, pc.replace_substring(column, ",", ""), column)
+    column = pc.if_else(dot_thousands, pc.replace_substring(column, ".", ""), column)
+    column = pc.replace_substring(column, ",", ".")
+    valid = pc.match_substring_regex(column, _NUMBER_RE)
+    column = pc.if_else(valid, column, pa.scalar(None, pa.string()))
+    return pc.cast(column, pa.float64())
+
+
+def _normalize_numbers_pandas(series: pd.Series, decimal: str) -> pd.Series:
+    """То же правило, что у _normalize_numbers_arrow."""
+    series = series.astype(str).str.replace(_NUMBER_JUNK_PY, "", regex=True)
+    has_comma = series.str.contains(",", regex=False)
+    has_dot = series.str.contains(".", regex=False)
+    comma_group = series.str.match(_GROUPED_COMMA)
+    dot_group = series.str.match(_GROUPED_DOT)
+    if decimal != ",":
+        dot_group &= series.str.count(r"\.") > 1
+    comma_thousands = has_comma & ((has_dot & series.str.contains(_DOT_LAST, regex=True)) | (~has_dot & comma_group))
+    dot_thousands = has_dot & ((has_comma & series.str.contains(_COMMA_LAST, regex=True)) | (~has_comma & dot_group))
+
+    series = series.where(~comma_thousands, series.str.replace(",", "", regex=False))
+    series = series.where(~dot_thousands, series.str.replace(".", "", regex=False))
+    series = series.str.replace(",", ".", regex=False)
+    return pd.to_numeric(series, errors="coerce")
+
+
+def _read_arrow(source, dialect: CsvDialect, numeric_columns, string_columns):
+    invalid_rows = 0
+
+    def skip_invalid(row):
+        nonlocal invalid_rows
+        invalid_rows += 1
+        return "skip"
+
+    column_types = {name: pa.string() for name in (*numeric_columns, *string_columns)}
+    table = pa_csv.read_csv(
+        source,
+        read_options=pa_csv.ReadOptions(
+            encoding=dialect.encoding,
+            skip_rows=dialect.skip_rows,
+            use_threads=True,
+        ),
+        parse_options=pa_csv.ParseOptions(
+            delimiter=dialect.delimiter,
+            invalid_row_handler=skip_invalid,
+        ),
+        convert_options=pa_csv.ConvertOptions(
+            column_types=column_types,
+            decimal_point=dialect.decimal,
+            strings_can_be_null=True,
+        ),
+    )
+    for name in numeric_columns:
+        if name in table.column_names:
+            index = table.column_names.index(name)
+            table = table.set_column(index, name, _normalize_numbers_arrow(table.column(name), dialect.decimal))
+    return table.to_pandas(), invalid_rows
+
+
+def _read_pandas(source, dialect: CsvDialect, numeric_columns, string_columns):
+    df = pd.read_csv(
+        source,
+        encoding=dialect.encoding,
+        sep=dialect.delimiter,
+        skiprows=dialect.skip_rows,
+        decimal=dialect.decimal,
+        dtype={name: str for name in (*numeric_columns, *string_columns)},
+        on_bad_lines="skip",
+        low_memory=False,
+    )
+    for name in numeric_columns:
+        if name in df.columns:
+            df[name] = _normalize_numbers_pandas(df[name], dialect.decimal)
+    return df, None
+
+
+def read_csv(
+    source: Union[bytes, str],
+    dialect: Optional[CsvDialect] = None,
+    expected_columns: Iterable[str] = (),
+    numeric_columns: Sequence[str] = (),
+    string_columns: Sequence[str] = (),
+) -> Tuple[pd.DataFrame, Dict[str, Any]]:
+    """
+    CSV из байтов или пути к файлу → (DataFrame, отчёт).
+
+    numeric_columns — в float64 с нормализацией «1 234,56» / «1.234,56» / «"1,234.56"»;
+    string_columns — как есть строками (без вывода типов, например даты);
+    остальные колонки — вывод типов парсера.
+    """
+    started = time.perf_counter()
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        size = len(source)
+        head, tail = bytes(source[:SAMPLE_BYTES]), bytes(source[-SAMPLE_BYTES:]) if size > SAMPLE_BYTES else b""
+        arrow_source = pa.BufferReader(source) if pa is not None else None
+        pandas_source = io.BytesIO(source)
+    else:
+        with open(source, "rb") as f:
+            head = f.read(SAMPLE_BYTES)
+            f.seek(0, io.SEEK_END)
+            size = f.tell()
+            f.seek(max(size - SAMPLE_BYTES, len(head)))
+            tail = f.read()
+        arrow_source = pandas_source = source
+
+    if dialect is None:
+        dialect = sniff(head, tail, at_eof=size <= SAMPLE_BYTES, expected_columns=expected_columns)
+
+    if pa is not None:
+        engine = "pyarrow"
+        df, invalid_rows = _read_arrow(arrow_source, dialect, numeric_columns, string_columns)
+    else:
+        engine = "pandas"
+        df, invalid_rows = _read_pandas(pandas_source, dialect, numeric_columns, string_columns)
+
+    seconds = time.perf_counter() - started
+    report = {
+        "engine": engine,
+        **dialect.to_dict(),
+        "rows": len(df),
+        "invalid_rows": invalid_rows,
+        "bytes": size,
+        "seconds": round(seconds, 4),
+        "rows_per_sec": round(len(df) / seconds) if seconds > 0 else None,
+    }
+    return df, report
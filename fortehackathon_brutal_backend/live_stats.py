@@ -0,0 +1,186 @@
+"""
+Скользящие агрегаты живого трафика для /stats/live.
+
+Каждое окно (1m / 15m / 1h) — кольцо из SLOTS временных корзин.
+Запись результата обновляет по одной корзине в каждом окне: O(1).
+Корзина хранит:
+  • счётчики по risk_level и по алертам;
+  • гистограмму fraud_probability (PROB_BINS корзин на [0, 1]);
+  • логарифмический скетч задержки (относительная точность ~5%,
+    сливается сложением — квантили по окну без хранения значений).
+Чтение окна сливает SLOTS корзин — стоимость зависит только от
+размера скетчей, а не от числа запросов.
+"""
+
+import math
+import threading
+import time
+from collections import Counter
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+
+WINDOWS = {"1m": 60, "15m": 15 * 60, "1h": 60 * 60}
+SLOTS = 60
+PROB_BINS = 20
+
+# логарифмические корзины задержки: [LAT_MIN_MS, LAT_MIN_MS * GAMMA^LAT_BINS)
+_LAT_GAMMA = 1.1
+_LAT_MIN_MS = 0.05
+_LAT_BINS = 160  # до ~0.05 * 1.1^160 ≈ 200 c
+_LAT_LOG_GAMMA = math.log(_LAT_GAMMA)
+_QUANTILES = (0.5, 0.9, 0.95, 0.99)
+
+
+def _lat_bin(ms: float) -> int:
+    if ms <= _LAT_MIN_MS:
+        return 0
+    return min(int(math.log(ms / _LAT_MIN_MS) / _LAT_LOG_GAMMA) + 1, _LAT_BINS - 1)
+
+
+def _lat_value(bin_idx: int) -> float:
+    # середина корзины в геометрическом смысле
+    if bin_idx == 0:
+        return _LAT_MIN_MS
+    return _LAT_MIN_MS * _LAT_GAMMA ** (bin_idx - 0.5)
+
+
+class _Slot:
+    __slots__ = ("epoch", "count", "frauds", "sum_prob", "sum_latency", "risk", "alerts", "prob_hist", "lat_hist")
+
+    def __init__(self):
+        self.epoch = -1
+        self.reset(-1)
+
+    def reset(self, epoch: int):
+        self.epoch = epoch
+        self.count = 0
+        self.frauds = 0
+        self.sum_prob = 0.0
+        self.sum_latency = 0.0
+        self.risk: Counter = Counter()
+        self.alerts: Counter = Counter()
+        self.prob_hist = [0] * PROB_BINS
+        self.lat_hist = [0] * _LAT_BINS
+
+
+class _Window:
+    def __init__(self, seconds: int):
+        self.seconds = seconds
+        self.slot_seconds = seconds / SLOTS
+        self.slots = [_Slot() for _ in range(SLOTS)]
+
+    def slot_for(self, now: float) -> _Slot:
+        epoch = int(now // self.slot_seconds)
+        slot = self.slots[epoch % SLOTS]
+        if slot.epoch != epoch:
+            slot.reset(epoch)
+        return slot
+
+    def live_slots(self, now: float) -> List[_Slot]:
+        current = int(now // self.slot_seconds)
+        return [s for s in self.slots if current - SLOTS < s.epoch <= current]
+
+
+class LiveStats:
+    """
+    Потокобезопасные скользящие агрегаты по результатам скоринга.
+    """
+
+    def __init__(self, windows: Optional[Dict[str, int]] = None):
+        self._windows = {name: _Window(sec) for name, sec in (windows or WINDOWS).items()}
+        self._lock = threading.Lock()
+        self.started_at = time.time()
+        self.total = 0
+
+    def record(
+        self,
+        fraud_probability: float,
+        risk_level: str,
+        is_fraud: bool,
+        alerts: Iterable[str],
+        latency_ms: float,
+        now: Optional[float] = None,
+    ):
+        """Учитывает один результат скоринга: O(число окон)."""
+        now = time.time() if now is None else now
+        prob_bin = min(max(int(fraud_probability * PROB_BINS), 0), PROB_BINS - 1)
+        lat_bin = _lat_bin(latency_ms)
+        alerts = list(alerts)
+
+        with self._lock:
+            self.total += 1
+            for window in self._windows.values():
+                slot = window.slot_for(now)
+                slot.count += 1
+                slot.frauds += bool(is_fraud)
+                slot.sum_prob += fraud_probability
+                slot.sum_latency += latency_ms
+                slot.risk[risk_level] += 1
+                for alert in alerts:
+                    slot.alerts[alert] += 1
+                slot.prob_hist[prob_bin] += 1
+                slot.lat_hist[lat_bin] += 1
+
+    def record_output(self, output, latency_ms: Optional[float] = None):
+        """Удобная обёртка для TransactionOutput."""
+        self.record(
+            fraud_probability=output.fraud_probability,
+            risk_level=output.risk_level,
+            is_fraud=output.is_fraud,
+            alerts=output.alerts,
+            latency_ms=output.processing_time_ms if latency_ms is None else latency_ms,
+        )
+
+    def snapshot(self, now: Optional[float] = None) -> Dict[str, Dict]:
+        now = time.time() if now is None else now
+        result: Dict[str, Dict] = {}
+        with self._lock:
+            for name, window in self._windows.items():
+                slots = window.live_slots(now)
+                count = sum(s.count for s in slots)
+                risk: Counter = Counter()
+                alerts: Counter = Counter()
+                prob_hist = np.zeros(PROB_BINS, dtype=np.int64)
+                lat_hist = np.zeros(_LAT_BINS, dtype=np.int64)
+                frauds = 0
+                sum_prob = 0.0
+                sum_latency = 0.0
+                for s in slots:
+                    risk.update(s.risk)
+                    alerts.update(s.alerts)
+                    prob_hist += s.prob_hist
+                    lat_hist += s.lat_hist
+                    frauds += s.frauds
+                    sum_prob += s.sum_prob
+                    sum_latency += s.sum_latency
+
+                result[name] = {
+                    "window_seconds": window.seconds,
+                    "count": count,
+                    "rps": count / window.seconds,
+                    "fraud_count": frauds,
+                    "fraud_rate": frauds / count if count else 0.0,
+                    "mean_fraud_probability": sum_prob / count if count else 0.0,
+                    "risk_levels": dict(risk),
+                    "alerts": {a: {"count": c, "rate": c / count} for a, c in alerts.most_common()},
+                    "fraud_probability_histogram": {
+                        "bin_edges": [i / PROB_BINS for i in range(PROB_BINS + 1)],
+                        "counts": prob_hist.tolist(),
+                    },
+                    "latency_ms": {
+                        "mean": sum_latency / count if count else 0.0,
+                        **self._latency_quantiles(lat_hist, count),
+                    },
+                }
+        return result
+
+    @staticmethod
+    def _latency_quantiles(lat_hist: np.ndarray, count: int) -> Dict[str, float]:
+        if not count:
+            return {}
+        cum = np.cumsum(lat_hist)
+        return {
+            f"p{int(q * 100)}": round(_lat_value(int(np.searchsorted(cum, q * count))), 3)
+            for q in _QUANTILES
+        }
@@ -0,0 +1,336 @@
+"""
+Учёт памяти воркера: сколько RSS приходится на историю клиентов,
+модели, SHAP explainer, индексы и буферы запросов.
+
+MemoryAccountant.report() — оценка байт по компонентам:
+
+  • неизменяемое после загрузки (бустеры, IsolationForest, энкодеры,
+    SHAP explainer, модели shadow-кандидата) измеряется один раз на
+    экземпляр модели и кэшируется — бустеры по размеру сериализации
+    (их деревья живут в нативной памяти, sys.getsizeof их не видит),
+    остальное — обходом объектов с учётом numpy-буферов;
+  • растущее (история, граф direction, кэш идемпотентности, дрейф,
+    буферы bulk-запросов) — по счётчикам компонентов и размеру записи,
+    измеренному на выборке, без обхода всех клиентов.
+
+Поэтому отчёт дёшев для регулярного опроса. Остаток RSS, не покрытый
+оценками, — «unattributed» (интерпретатор, библиотеки, фрагментация).
+
+AllocationTracker — tracemalloc для поиска роста аллокаций на горячем
+пути: базовый снимок и дифф с ним (топ строк / трассировок по приросту).
+Пока tracemalloc включён, каждая аллокация Python дороже — включается
+только на время расследования.
+"""
+
+import itertools
+import os
+import pickle
+import sys
+import threading
+import time
+import tracemalloc
+import weakref
+from typing import Any, Dict, Iterable, List, Optional
+
+import numpy as np
+
+# типы, которые не считаются частью компонента (общий код и метаданные)
+_SHARED_TYPES = (type, type(sys), type(len), type(lambda: None), type(print.__call__))
+_DEEP_SIZEOF_LIMIT = 2_000_000
+
+
+def deep_sizeof(obj: Any, limit: int = _DEEP_SIZEOF_LIMIT) -> int:
+    """
+    Приблизительный размер графа объектов: sys.getsizeof по каждому
+    объекту один раз, numpy-массивы — заголовок + nbytes без обхода
+    элементов. Обход ограничен limit объектами.
+    """
+    seen = set()
+    stack = [obj]
+    total = 0
+    while stack and len(seen) < limit:
+        current = stack.pop()
+        if id(current) in seen or isinstance(current, _SHARED_TYPES):
+            continue
+        seen.add(id(current))
+        if isinstance(current, np.ndarray):
+            total += sys.getsizeof(current) + (current.nbytes if current.base is None else 0)
+            if current.dtype == object:
+                stack.extend(current.ravel())
+            continue
+        total += sys.getsizeof(current)
+        if isinstance(current, (str, bytes, bytearray, int, float, bool)) or current is None:
+            continue
+        if isinstance(current, dict):
+            stack.extend(current.keys())
+            stack.extend(current.values())
+        elif isinstance(current, (list, tuple, set, frozenset)):
+            stack.extend(current)
+        else:
+            state = getattr(current, "__dict__", None)
+            if state is not None:
+                stack.append(state)
+            for slot in getattr(type(current), "__slots__", ()):
+                if hasattr(current, slot):
+                    stack.append(getattr(current, slot))
+    return total
+
+
+class _CountingWriter:
+    def __init__(self):
+        self.size = 0
+
+    def write(self, data) -> int:
+        self.size += len(data)
+        return len(data)
+
+
+def pickled_size(obj: Any) -> int:
+    """Размер сериализации без материализации байтов (для нативных моделей)."""
+    writer = _CountingWriter()
+    pickle.Pickler(writer, protocol=pickle.HIGHEST_PROTOCOL).dump(obj)
+    return writer.size
+
+
+def sampled_bytes(items: Iterable[Any], count: int, sample: int = 32) -> int:
+    """Размер count однотипных элементов по среднему первых sample из items."""
+    taken = list(itertools.islice(items, sample))
+    if not taken:
+        return 0
+    return int(sum(deep_sizeof(item) for item in taken) / len(taken) * count)
+
+
+def process_rss_bytes() -> Optional[int]:
+    """Текущий RSS процесса (Linux — /proc/self/statm, иначе пик через resource)."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        pass
+    try:
+        import resource
+
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024
+    except Exception:
+        return None
+
+
+class RequestBuffers:
+    """
+    Байты тел bulk-запросов и их разобранных DataFrame, которые сейчас
+    в обработке (загруженный CSV держится в памяти до ответа).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.in_flight = 0
+        self.bytes = 0
+        self.peak_bytes = 0
+
+    def acquire(self, nbytes: int = 0) -> List[int]:
+        """Начало запроса; возвращает учётную запись для add / release."""
+        with self._lock:
+            self.in_flight += 1
+        held = [0]
+        self.add(held, nbytes)
+        return held
+
+    def add(self, held: List[int], nbytes: int):
+        with self._lock:
+            self.bytes += nbytes
+            self.peak_bytes = max(self.peak_bytes, self.bytes)
+        held[0] += nbytes
+
+    def release(self, held: List[int]):
+        with self._lock:
+            self.in_flight -= 1
+            self.bytes -= held[0]
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"in_flight": self.in_flight, "estimated_bytes": self.bytes, "peak_bytes": self.peak_bytes}
+
+
+class MemoryAccountant:
+    """
+    Оценка памяти по компонентам FraudDetectionAPI. Размеры моделей
+    кэшируются на экземпляр (горячая подмена — новый замер).
+    """
+
+    def __init__(self, request_buffers: Optional[RequestBuffers] = None):
+        self.request_buffers = request_buffers
+        self._static: "weakref.WeakKeyDictionary[Any, Dict[str, Any]]" = weakref.WeakKeyDictionary()
+        self._lock = threading.Lock()
+
+    # ------------------------------------------------------------------
+    #  Неизменяемое после загрузки
+    # ------------------------------------------------------------------
+    def _model_sizes(self, holder) -> Dict[str, Any]:
+        with self._lock:
+            cached = self._static.get(holder)
+        shap_state = getattr(holder, "shap_state", None)
+        if cached is not None and cached["shap_state"] == shap_state:
+            return cached
+
+        started = time.perf_counter()
+        models = {name: pickled_size(getattr(holder, name)) for name in ("catboost", "xgboost", "lightgbm")}
+        scorer = getattr(holder, "anomaly_scorer", None) or getattr(holder, "iso", None)
+        models["isolation_forest"] = deep_sizeof(scorer)
+
+        sizes: Dict[str, Any] = {"models": models, "shap_state": shap_state}
+        encoders = getattr(holder, "encoders", None)
+        if encoders is not None:
+            sizes["encoders"] = {
+                name: {"classes": len(getattr(enc, "classes_", ())), "bytes": deep_sizeof(enc)}
+                for name, enc in encoders.items()
+            }
+        explainer = getattr(holder, "_shap_explainer_cat", None)
+        if explainer is not None:
+            # explainer держит ссылку на модель CatBoost — её байты уже в models
+            sizes["shap_explainer"] = max(deep_sizeof(explainer) - deep_sizeof(holder.catboost), 0)
+        sizes["measure_seconds"] = round(time.perf_counter() - started, 3)
+        with self._lock:
+            self._static[holder] = sizes
+        return sizes
+
+    def report(self, detector) -> Dict[str, Any]:
+        started = time.perf_counter()
+        static = self._model_sizes(detector)
+        components: Dict[str, Any] = {}
+
+        history = detector.retention.stats()
+        components["history"] = {
+            "customers": history["customers"],
+            "entries": history["entries"],
+            "bytes_per_entry": history["bytes_per_entry"],
+            "estimated_bytes": history["estimated_bytes"],
+            "memory_budget_bytes": history["memory_budget_bytes"],
+        }
+        components["models"] = {
+            "estimated_bytes": sum(static["models"].values()),
+            "by_model": static["models"],
+        }
+        if "encoders" in static:
+            components["encoders"] = {
+                "estimated_bytes": sum(enc["bytes"] for enc in static["encoders"].values()),
+                "tables": static["encoders"],
+            }
+        components["shap_explainer"] = {
+            "state": detector.shap_state,
+            "estimated_bytes": static.get("shap_explainer", 0),
+        }
+        components["graph_index"] = detector.graph_index.memory_stats()
+        components["idempotency_cache"] = detector.idempotency.memory_stats()
+        components["drift"] = {"estimated_bytes": detector.drift.estimated_bytes()}
+        if self.request_buffers is not None:
+            components["request_buffers"] = self.request_buffers.stats()
+        if detector.shadow is not None:
+            shadow = self._model_sizes(detector.shadow)
+            components["shadow_models"] = {
+                "estimated_bytes": sum(shadow["models"].values()),
+                "by_model": shadow["models"],
+            }
+        if detector.feature_store is not None and detector.feature_store.loaded:
+            # файл отображён в память: страницы общие с page cache и другими воркерами
+            components["feature_store_mapped"] = {
+                "customers": len(detector.feature_store),
+                "mapped_bytes": os.path.getsize(detector.feature_store.path),
+            }
+
+        attributed = sum(c.get("estimated_bytes", 0) for c in components.values())
+        rss = process_rss_bytes()
+        return {
+            "rss_bytes": rss,
+            "attributed_bytes": attributed,
+            "unattributed_bytes": rss - attributed if rss is not None else None,
+            "components": components,
+            "tracemalloc": tracemalloc.is_tracing(),
+            "static_measure_seconds": static["measure_seconds"],
+            "report_seconds": round(time.perf_counter() - started, 4),
+        }
+
+
+class AllocationTracker:
+    """
+    tracemalloc: start() включает трассировку и снимает базовый снимок,
+    diff() сравнивает свежий снимок с базовым (rebase — свежий становится
+    базовым, так удобно смотреть рост между двумя точками нагрузки).
+    """
+
+    _FILTERS = (
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+        tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+        tracemalloc.Filter(False, "<unknown>"),
+    )
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._baseline: Optional[tracemalloc.Snapshot] = None
+        self.baseline_at: Optional[float] = None
+        self.frames = 1
+        self.started_by_us = False
+
+    def _snapshot(self) -> tracemalloc.Snapshot:
+        return tracemalloc.take_snapshot().filter_traces(self._FILTERS)
+
+    def start(self, frames: int = 1) -> Dict[str, Any]:
+        with self._lock:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start(frames)
+                self.started_by_us = True
+            self.frames = tracemalloc.get_traceback_limit()
+            self._baseline = self._snapshot()
+            self.baseline_at = time.time()
+        return self.stats()
+
+    def stop(self) -> Dict[str, Any]:
+        with self._lock:
+            if self.started_by_us and tracemalloc.is_tracing():
+                tracemalloc.stop()
+            self.started_by_us = False
+            self._baseline = None
+            self.baseline_at = None
+        return self.stats()
+
+    def diff(self, group_by: str = "lineno", top: int = 30, rebase: bool = False) -> Dict[str, Any]:
+        with self._lock:
+            if self._baseline is None or not tracemalloc.is_tracing():
+                raise RuntimeError("tracemalloc is not started")
+            snapshot = self._snapshot()
+            stats = snapshot.compare_to(self._baseline, group_by)
+            since = self.baseline_at
+            if rebase:
+                self._baseline = snapshot
+                self.baseline_at = time.time()
+
+        return {
+            "since": since,
+            "seconds": round(time.time() - since, 1),
+            "group_by": group_by,
+            "size_diff_total": sum(stat.size_diff for stat in stats),
+            "count_diff_total": sum(stat.count_diff for stat in stats),
+            "top": [
+                {
+                    "size_diff": stat.size_diff,
+                    "count_diff": stat.count_diff,
+                    "size": stat.size,
+                    "count": stat.count,
+                    "traceback": [f"{frame.filename}:{frame.lineno}" for frame in stat.traceback],
+                }
+                for stat in stats[:top]
+            ],
+        }
+
+    def stats(self) -> Dict[str, Any]:
+        tracing = tracemalloc.is_tracing()
+        current, peak = tracemalloc.get_traced_memory() if tracing else (0, 0)
+        return {
+            "tracing": tracing,
+            "frames": tracemalloc.get_traceback_limit() if tracing else None,
+            "traced_bytes": current,
+            "traced_peak_bytes": peak,
+            "overhead_bytes": tracemalloc.get_tracemalloc_memory() if tracing else 0,
+            "baseline_at": self.baseline_at,
+        }
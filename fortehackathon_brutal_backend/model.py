@@ -3,16 +3,70 @@ API для реал-тайм детекции мошеннических тра
 Использует обученную модель из fraud_model_production/
 """
 
+import threading
+
 import joblib
 import numpy as np
 import pandas as pd
-import shap
 
 from datetime import datetime, timedelta
-from typing import Dict, List, Any
+from time import perf_counter
+from typing import Dict, List, Any, Optional, Tuple
+
+from config import (
+    MODEL_DIR,
+    IDEMPOTENCY_CACHE_SIZE,
+    IDEMPOTENCY_TTL_SECONDS,
+    FEATURE_STORE_PATH,
+    FEATURE_STORE_CHECK_SECONDS,
+    DEGRADATION_ENABLED,
+    DEGRADATION_QUEUE_SLO_MS,
+    DEGRADATION_LATENCY_SLO_MS,
+    DEGRADATION_MAX_LEVEL,
+    HISTORY_RETENTION_DAYS,
+    HISTORY_MEMORY_BUDGET_MB,
+    HISTORY_SWEEP_BATCH,
+    HISTORY_SWEEP_INTERVAL_SECONDS,
+    DRIFT_ENABLED,
+    DRIFT_WINDOW_SECONDS,
+    DRIFT_BOOTSTRAP_ROWS,
+    SCORE_CHUNK_ROWS,
+)
+from degradation import DegradationController
+from drift import DriftMonitor
+from dtos import TransactionOutput, TransactionInput, Stats
+from fast_iforest import FlatIsolationForest, make_anomaly_scorer
+from feature_store import BehavioralFeatureStore
+from graph_index import DirectionGraphIndex
+from history_retention import HistoryRetention
+from idempotency import IdempotencyCache
+from records import ScoreBatch, ScoreRecord, TxRecord
+from startup_profile import profile
+from thread_budget import ThreadBudget
+
+
+def _as_float(value) -> float:
+    """Одно значение признака так же, как pd.to_numeric(errors="coerce").fillna(0)."""
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        return 0.0
+    return 0.0 if value != value else value
+
+
+class _DegradedResult:
+    """
+    Ответ, посчитанный под деградацией, в кэше идемпотентности. Ретрай после
+    спада нагрузки пересчитывается полным ансамблем по сохранённому вектору
+    признаков — без повторной записи в историю (см. _rescore_degraded).
+    """
+
+    __slots__ = ("output", "row", "feature_alerts")
 
-from config import MODEL_DIR
-from dtos import TransactionOutput, TransactionInput, Stats, Models, TopFeature
+    def __init__(self, output: TransactionOutput, row: np.ndarray, feature_alerts: List[str]):
+        self.output = output
+        self.row = row
+        self.feature_alerts = feature_alerts
 
 
 class FraudDetectionAPI:
@@ -20,23 +74,93 @@ class FraudDetectionAPI:
     API для детекции фрода
     """
 
-    def __init__(self, model_path: str = MODEL_DIR):
+    def __init__(
+        self,
+        model_path: str = MODEL_DIR,
+        state_from: Optional["FraudDetectionAPI"] = None,
+    ):
         """
         Загружает обученную модель
+
+        Args:
+            model_path: путь к model_package.pkl
+            state_from: работающий экземпляр, чьё онлайн-состояние
+                (история, граф, кэш идемпотентности) нужно перенять —
+                используется при горячей подмене модели
         """
         print(f"Loading model from {model_path}...")
-        self.model_pkg = joblib.load(model_path)
+        # библиотеки моделей импортируются при распаковке — замеряем по отдельности
+        with profile.phase("import_model_libs"):
+            for module_name in ("sklearn.ensemble", "catboost", "xgboost", "lightgbm"):
+                profile.timed_import(module_name)
+        with profile.phase("model_unpickle"):
+            self.model_pkg = joblib.load(model_path)
 
         self.iso = self.model_pkg["iso"]
+        # Сплющенный IsolationForest (fast_iforest.py); при несовпадении — сам sklearn
+        self.anomaly_scorer = make_anomaly_scorer(self.iso)
         self.catboost = self.model_pkg["catboost"]
         self.xgboost = self.model_pkg["xgboost"]
         self.lightgbm = self.model_pkg["lightgbm"]
         self.threshold = self.model_pkg["threshold"]
         self.feature_cols = self.model_pkg["feature_cols"]
+        # колонки вектора признаков бустеров (feature_cols + anomaly_score)
+        self.model_columns = self.feature_cols + ["anomaly_score"]
         self.ensemble_weights = self.model_pkg["ensemble_weights"]
         self.encoders = self.model_pkg["encoders"]
         self.weights = self.model_pkg["ensemble_weights"]
-        self.history = self.model_pkg.get("history", {})
+        if state_from is not None:
+            # Горячая подмена: те же объекты, а не копии — запросы,
+            # дорабатывающие на старой модели, пишут в ту же историю
+            self.history = state_from.history
+            self.retention = state_from.retention
+            self.graph_index = state_from.graph_index
+            self.idempotency = state_from.idempotency
+            self.shadow = state_from.shadow
+            self.thread_budget = state_from.thread_budget
+            self.degradation = state_from.degradation
+        else:
+            self._init_history(self.model_pkg.get("history", {}))
+
+            # Кэш результатов для идемпотентных ретраев (по id / Idempotency-Key)
+            self.idempotency = IdempotencyCache(
+                max_size=IDEMPOTENCY_CACHE_SIZE,
+                ttl_seconds=IDEMPOTENCY_TTL_SECONDS,
+            )
+
+            # Модель-кандидат для shadow-скоринга (см. shadow.py), по умолчанию нет
+            self.shadow = None
+
+            # Потоки executor-а и моделей по профилям latency / throughput
+            self.thread_budget = ThreadBudget.from_config()
+            self.thread_budget.limit_blas()
+
+            # Уровень деградации под нагрузкой (без SHAP / меньше бустеров)
+            self.degradation = DegradationController(
+                queue_slo_ms=DEGRADATION_QUEUE_SLO_MS,
+                latency_slo_ms=DEGRADATION_LATENCY_SLO_MS,
+                max_level=DEGRADATION_MAX_LEVEL,
+                enabled=DEGRADATION_ENABLED,
+            )
+
+        self.thread_budget.prepare(self.xgboost)
+
+        # Поведенческие признаки клиентов (офлайн-сборка, mmap; опционально)
+        self.feature_store = BehavioralFeatureStore.open_optional(
+            FEATURE_STORE_PATH,
+            check_seconds=FEATURE_STORE_CHECK_SECONDS,
+        )
+
+        # Дрейф признаков и скоров против референса из пакета (drift.py);
+        # привязан к модели, при горячей подмене не переносится
+        self.drift = DriftMonitor(
+            self.feature_cols + ["anomaly_score"],
+            reference=self.model_pkg.get("drift_reference"),
+            fraud_rate=self.model_pkg.get("fraud_rate"),
+            window_seconds=DRIFT_WINDOW_SECONDS,
+            bootstrap_rows=DRIFT_BOOTSTRAP_ROWS,
+            enabled=DRIFT_ENABLED,
+        )
 
         print("✓ Model loaded successfully")
         print(f"  Version: {self.model_pkg.get('version', 'unknown')}")
@@ -44,12 +168,77 @@ class FraudDetectionAPI:
         print(f"  Features: {len(self.feature_cols)}")
 
         # --- SHAP-эксплейнер для CatBoost ---
-        try:
-            self._shap_explainer_cat = shap.TreeExplainer(self.catboost)
-            print("[FraudDetectionAPI] SHAP TreeExplainer for CatBoost initialized.")
-        except Exception as e:
-            self._shap_explainer_cat = None
-            print(f"[FraudDetectionAPI] SHAP init failed: {e}")
+        # shap (+ numba/llvmlite) не нужен для первого скоринга: грузится
+        # load_background_components — сразу (ModelManager.load при
+        # LAZY_HEAVY_IMPORTS=0) или в фоне после готовности сервиса
+        # (start_background_init), до этого top_features пустой
+        self._shap_explainer_cat = None
+        self.shap_state = "pending"
+        self._background_lock = threading.Lock()
+
+    # ------------------------------------------------------------------
+    #  Фоновая инициализация тяжёлых компонентов
+    # ------------------------------------------------------------------
+    def load_background_components(self, warm: bool = True):
+        """
+        SHAP TreeExplainer (с прогревом) и ядро numba для IsolationForest.
+        Идемпотентно; вызывается в фоне после готовности или синхронно
+        (горячая подмена, LAZY_HEAVY_IMPORTS=0). warm=False — без
+        прогревочного вызова SHAP (мастер serve.py до форка: CatBoost
+        там не вызывается, первый SHAP будет в warm_up воркера).
+        """
+        with self._background_lock:
+            if self.shap_state in ("loaded", "failed"):
+                return
+            self.shap_state = "loading"
+            try:
+                with profile.phase("import_shap"):
+                    shap = profile.timed_import("shap")
+                with profile.phase("shap_explainer"):
+                    explainer = shap.TreeExplainer(self.catboost)
+                    # первый вызов SHAP тоже дорогой — делаем его здесь
+                    if warm:
+                        explainer.shap_values(pd.DataFrame([[0.0] * len(self.model_columns)], columns=self.model_columns))
+                self._shap_explainer_cat = explainer
+                self.shap_state = "loaded"
+                print("[FraudDetectionAPI] SHAP TreeExplainer for CatBoost initialized.")
+            except Exception as e:
+                self.shap_state = "failed"
+                print(f"[FraudDetectionAPI] SHAP init failed: {e}")
+
+            if isinstance(self.anomaly_scorer, FlatIsolationForest):
+                try:
+                    with profile.phase("numba_compile"):
+                        self.anomaly_scorer.enable_numba()
+                except Exception as e:
+                    # сломанный numba / llvmlite не должен ронять фоновую инициализацию
+                    print(f"[FraudDetectionAPI] numba init failed, staying on NumPy: {e}")
+
+    def start_background_init(self):
+        thread = threading.Thread(
+            target=self._background_init,
+            name="background-init",
+            daemon=True,
+        )
+        thread.start()
+
+    def _background_init(self):
+        self.load_background_components()
+        profile.mark("background_init_done")
+
+    def components(self) -> Dict[str, str]:
+        """Что загружено: для /health и /ready."""
+        if isinstance(self.anomaly_scorer, FlatIsolationForest):
+            anomaly = "numba" if self.anomaly_scorer.use_numba else "numpy"
+        else:
+            anomaly = "sklearn"
+        return {
+            "models": "loaded",
+            "anomaly_scorer": anomaly,
+            "shap": self.shap_state,
+            "feature_store": "loaded" if self.feature_store is not None and self.feature_store.loaded else "absent",
+            "shadow": "attached" if self.shadow is not None else "none",
+        }
 
     # ------------------------------------------------------------------
     #  SHAP: локальные топ-фичи для одной транзакции
@@ -58,17 +247,17 @@ class FraudDetectionAPI:
         self,
         X_single: pd.DataFrame,
         top_n: int = 8,
-    ) -> List[TopFeature]:
+    ) -> List[tuple]:
         """
         Считает локальный SHAP по CatBoost для одной строки признаков X_single (1 x n_features).
-        Возвращает список TopFeature, отсортированный по |shap_value|.
+        Возвращает список (признак, shap_value), отсортированный по |shap_value|.
         """
         if self._shap_explainer_cat is None:
             return []
 
         # гарантируем DataFrame с одной строкой
         if not isinstance(X_single, pd.DataFrame):
-            X_single = pd.DataFrame([X_single], columns=self.feature_cols + ["anomaly_score"])
+            X_single = pd.DataFrame([X_single], columns=self.model_columns)
         else:
             # на всякий случай берём только первую строку
             X_single = X_single.iloc[[0]]
@@ -84,19 +273,51 @@ class FraudDetectionAPI:
             print(f"[FraudDetectionAPI] SHAP computation failed: {e}")
             return []
 
-        feats: List[TopFeature] = []
-        for feat_name, val in zip(X_single.columns, shap_row):
-            feats.append(
-                TopFeature(
-                    feature=str(feat_name),
-                    shap_value=float(val),
-                )
-            )
+        feats = [(str(feat_name), float(val)) for feat_name, val in zip(X_single.columns, shap_row)]
 
         # сортируем по модулю вклада
-        feats.sort(key=lambda f: abs(f.shap_value), reverse=True)
+        feats.sort(key=lambda f: abs(f[1]), reverse=True)
         return feats[:top_n]
 
+    # ------------------------------------------------------------------
+    #  История клиентов: инициализация и снимок (stream_worker.py)
+    # ------------------------------------------------------------------
+    def _init_history(self, history: Dict[Any, list]):
+        self.history = history
+        # Фоновая чистка устаревших записей + бюджет памяти (LRU по активности).
+        # Поток sweeper-а запускает процесс, который скорит (retention.start()
+        # в lifespan воркера), — не мастер serve.py до форка: потоки в
+        # форк не переходят, а взятый в момент форка lock остался бы занят
+        self.retention = HistoryRetention(
+            self.history,
+            retention_days=HISTORY_RETENTION_DAYS,
+            memory_budget_mb=HISTORY_MEMORY_BUDGET_MB,
+            sweep_batch=HISTORY_SWEEP_BATCH,
+            sweep_interval=HISTORY_SWEEP_INTERVAL_SECONDS,
+            start=False,
+        )
+        # Глобальный граф клиент → direction (in-degree, pair_count за окна)
+        self.graph_index = DirectionGraphIndex.from_history(
+            self.history, retention_days=HISTORY_RETENTION_DAYS,
+        )
+
+    def history_snapshot(self) -> Dict[Any, list]:
+        """Копия истории клиентов, согласованная на один момент (под lock retention)."""
+        with self.retention.lock:
+            return {cst_id: list(entries) for cst_id, entries in self.history.items()}
+
+    def restore_history(self, history: Dict[Any, list]):
+        """
+        Заменяет историю снимком; retention и граф direction строятся по нему
+        заново. Только до начала скоринга и до retention.start().
+        """
+        self._init_history(history)
+
+    def apply_history(self, transactions: List[TxRecord]):
+        """Дописывает транзакции в историю без скоринга (доигрывание потока до чекпойнта)."""
+        for transaction in transactions:
+            self._update_history(transaction)
+
     # ------------------------------------------------------------------
     #  Основные методы
     # ------------------------------------------------------------------
@@ -104,6 +325,10 @@ class FraudDetectionAPI:
         self,
         transaction: TransactionInput,
         behavioral_patterns: Dict[str, Any] = None,
+        idempotency_key: Optional[str] = None,
+        thread_profile: str = "latency",
+        replayed_out: Optional[List[bool]] = None,
+        explain: bool = True,
     ) -> TransactionOutput:
         """
         Предсказывает вероятность фрода для одной транзакции
@@ -112,103 +337,385 @@ class FraudDetectionAPI:
             transaction: TransactionInput
                 Required: cst_dim_id, transdatetime, amount, direction
             behavioral_patterns: словарь с поведенческими паттернами клиента (опционально)
+            idempotency_key: ключ из заголовка Idempotency-Key (опционально)
+            thread_profile: профиль потоков моделей (см. thread_budget.py)
+            replayed_out: сюда добавляется True, если результат — повтор
+                из кэша идемпотентности (живая статистика его не учитывает)
+            explain: False — без построчного SHAP (top_features пустой)
+
+        Если есть ключ идемпотентности (заголовок или transaction.id),
+        повтор возвращает сохранённый результат: без пересчёта и без
+        повторной записи в историю. Исключение — ответ, посчитанный под
+        деградацией: повтор при уровне 0 пересчитывается полным ансамблем
+        по сохранённому вектору признаков (история по-прежнему не трогается).
 
         Returns:
             TransactionOutput
         """
-        start_time = datetime.now()
-        transaction_dict = transaction.model_dump()
+        if idempotency_key is not None:
+            key = ("key", idempotency_key)
+        elif transaction.id is not None:
+            key = ("id", transaction.id)
+        else:
+            if replayed_out is not None:
+                replayed_out.append(False)
+            return self._score_transaction(
+                transaction, behavioral_patterns, thread_profile=thread_profile, explain=explain,
+            )
 
-        # Валидация входных данных
-        required_fields = ["cst_dim_id", "transdatetime", "amount", "direction"]
-        for field in required_fields:
-            if field not in transaction_dict:
-                raise ValueError(f"Missing required field: {field}")
+        def compute():
+            degraded: List[tuple] = []
+            output = self._score_transaction(
+                transaction, behavioral_patterns, thread_profile=thread_profile, explain=explain,
+                degraded_out=degraded,
+            )
+            return _DegradedResult(output, *degraded[0]) if degraded else output
 
-        # Построение фичей
-        features = self._build_features(transaction, behavioral_patterns)
+        result = self.idempotency.get_or_compute(
+            key,
+            compute,
+            replayed_out,
+            refresh=lambda cached: self._rescore_degraded(cached, thread_profile, explain),
+        )
+        return result.output if isinstance(result, _DegradedResult) else result
 
-        # Anomaly score
-        X_single = pd.DataFrame([features])[self.feature_cols]
-        X_single = X_single.apply(pd.to_numeric, errors="coerce").fillna(0)
+    def _rescore_degraded(self, cached: Any, thread_profile: str, explain: bool) -> Optional[TransactionOutput]:
+        """
+        refresh для кэша идемпотентности: деградированный ответ, когда
+        деградация спала, — полный ансамбль по сохранённому ряду. None —
+        оставить сохранённое (обычный ответ или нагрузка всё ещё высокая).
+        """
+        if not isinstance(cached, _DegradedResult) or self.degradation.level > 0:
+            return None
+
+        started = perf_counter()
+        level, active_weights, use_shap = self.degradation.full_plan(self.weights)
+        row = cached.row.copy()
+        row_scores, probs = self._score_matrix(row[None, :], active_weights, thread_profile)
+        fraud_prob = float(probs[0])
+        return ScoreRecord(
+            fraud_probability=fraud_prob,
+            is_fraud=bool(fraud_prob >= self.threshold),
+            scores={name: None if score is None else float(score[0]) for name, score in row_scores.items()},
+            anomaly=float(row[-1]),
+            alerts=cached.feature_alerts + self._probability_alerts(fraud_prob),
+            top_features=self._compute_shap_top_features(row, top_n=8) if use_shap and explain else [],
+            processing_time_ms=(perf_counter() - started) * 1000,
+            degradation_level=level,
+            model_version=self.model_pkg.get("version", "unknown"),
+            threshold=self.threshold,
+        ).to_output()
 
-        anomaly_score = -self.iso.decision_function(X_single)[0]
-        X_single["anomaly_score"] = anomaly_score
+    def _score_transaction(
+        self,
+        transaction: TransactionInput,
+        behavioral_patterns: Dict[str, Any] = None,
+        thread_profile: str = "latency",
+        explain: bool = True,
+        degraded_out: Optional[List[tuple]] = None,
+    ) -> TransactionOutput:
+        """Скоринг DTO запроса с DTO ответа — граница API вокруг _score_record."""
+        record = self._score_record(
+            TxRecord.from_input(transaction), behavioral_patterns, thread_profile=thread_profile, explain=explain,
+            record_drift=True, degraded_out=degraded_out,
+        )
+        return record.to_output()
 
-        # Ансамбль предсказаний
-        p_cat = self.catboost.predict_proba(X_single)[0, 1]
-        p_xgb = self.xgboost.predict_proba(X_single)[0, 1]
-        p_lgb = self.lightgbm.predict_proba(X_single)[0, 1]
+    def _score_record(
+        self,
+        transaction: TxRecord,
+        behavioral_patterns: Dict[str, Any] = None,
+        update_history: bool = True,
+        thread_profile: str = "latency",
+        explain: bool = True,
+        alerts: bool = True,
+        degrade: bool = True,
+        record_drift: bool = False,
+        degraded_out: Optional[List[tuple]] = None,
+    ) -> ScoreRecord:
+        """
+        Полный скоринг одной транзакции (фичи → модели → алерты → история).
+        update_history=False — «сухой» прогон без изменения состояния (warm-up).
+        explain=False — без построчного SHAP; alerts=False — без текстов
+        алертов. degrade=False — полный
+        ансамбль независимо от уровня деградации (офлайн-полосы).
+        record_drift=True — строка идёт в мониторинг дрейфа (только живой
+        трафик: bulk, загрузки и стрим окна /stats/drift не смещают).
+        degraded_out — сюда добавляется (ряд признаков, алерты признаков),
+        если скоринг шёл под деградацией (для пересчёта ретрая).
+
+        Вектор признаков — один numpy-ряд, бустеры получают его напрямую;
+        DataFrame строится только для построчного SHAP (shadow-кандидат
+        собирает его сам, в своём потоке).
+        """
+        started = perf_counter()
 
-        fraud_prob = (
-            self.weights[0] * p_cat
-            + self.weights[1] * p_xgb
-            + self.weights[2] * p_lgb
-        )
+        # Построение фичей и вектор признаков (+ слот под anomaly_score)
+        features, row = self._feature_row(transaction, behavioral_patterns)
+
+        # Ансамбль предсказаний: набор бустеров и веса — по уровню деградации
+        if degrade:
+            level, active_weights, use_shap = self.degradation.plan(self.weights)
+        else:
+            level, active_weights, use_shap = self.degradation.full_plan(self.weights)
+        row_scores, probs = self._score_matrix(row[None, :], active_weights, thread_profile, observe=True)
+        anomaly_score = float(row[-1])
+        scores = {name: None if score is None else float(score[0]) for name, score in row_scores.items()}
+        fraud_prob = float(probs[0])
 
         is_fraud = fraud_prob >= self.threshold
 
-        # Определяем уровень риска (можно оставить в верхнем регистре)
-        if fraud_prob >= 0.8:
-            risk_level = "CRITICAL"
-        elif fraud_prob >= 0.6:
-            risk_level = "HIGH"
-        elif fraud_prob >= 0.4:
-            risk_level = "MEDIUM"
-        else:
-            risk_level = "LOW"
+        # Shadow-кандидат получает тот же вектор признаков вне пути запроса
+        shadow = self.shadow
+        if shadow is not None and update_history:
+            shadow.submit(row, self.model_columns, fraud_prob, is_fraud)
+
+        if record_drift and update_history:
+            self.drift.record(row, scores, fraud_prob, is_fraud)
 
         # Генерируем алерты
-        alerts = self._generate_alerts(transaction, features, fraud_prob)
+        alert_texts = self._generate_alerts(transaction, features, fraud_prob) if alerts else None
+        if degraded_out is not None and level > 0:
+            degraded_out.append((row.copy(), self._feature_alerts(features)))
 
         # --- SHAP локальное объяснение для фронта (React / Streamlit) ---
-        top_features = self._compute_shap_top_features(X_single, top_n=8)
+        top_features = self._compute_shap_top_features(row, top_n=8) if use_shap and explain else []
 
         # Обновляем историю (для следующих транзакций)
-        self._update_history(transaction)
-
-        processing_time = (datetime.now() - start_time).total_seconds() * 1000
+        if update_history:
+            self._update_history(transaction)
 
-        return TransactionOutput(
-            is_fraud=bool(is_fraud),
+        return ScoreRecord(
             fraud_probability=float(fraud_prob),
-            risk_level=risk_level,
-            alerts=alerts,
-            processing_time_ms=processing_time,
-            model_version=self.model_pkg.get("version", "unknown"),
-            threshold_used=self.threshold,
-            individual_scores=Models(
-                catboost=float(p_cat),
-                xgboost=float(p_xgb),
-                lightgbm=float(p_lgb),
-                anomaly=float(anomaly_score),
-            ),
+            is_fraud=bool(is_fraud),
+            scores=scores,
+            anomaly=anomaly_score,
+            alerts=alert_texts,
             top_features=top_features,
+            processing_time_ms=(perf_counter() - started) * 1000,
+            degradation_level=level,
+            model_version=self.model_pkg.get("version", "unknown"),
+            threshold=self.threshold,
         )
 
+    def _feature_row(self, transaction: TxRecord, behavioral_patterns: Dict[str, Any] = None) -> Tuple[Dict[str, float], np.ndarray]:
+        """Фичи транзакции и numpy-ряд model_columns (anomaly_score ещё не заполнен)."""
+        features = self._build_features(transaction, behavioral_patterns)
+        row = np.empty(len(self.model_columns))
+        for i, col in enumerate(self.feature_cols):
+            row[i] = _as_float(features[col])
+        return features, row
+
+    def _score_matrix(
+        self,
+        X: np.ndarray,
+        active_weights: Dict[str, float],
+        thread_profile: str,
+        observe: bool = False,
+    ) -> Tuple[Dict[str, Optional[np.ndarray]], np.ndarray]:
+        """
+        Матрица признаков (n x model_columns) → (скоры бустеров, вероятность
+        ансамбля); последняя колонка X заполняется anomaly_score. Каждая
+        модель вызывается один раз на всю матрицу — число потоков
+        thread_budget выбирает по числу строк. observe=True — время
+        бустеров идёт в DegradationController (только одиночный живой
+        скоринг: цена строки в большой матрице на порядки меньше).
+        """
+        X[:, -1] = self._anomaly_scores(X[:, :-1])
+        scores: Dict[str, Optional[np.ndarray]] = {name: None for name in ("catboost", "xgboost", "lightgbm")}
+        for name in active_weights:
+            t0 = perf_counter()
+            scores[name] = np.asarray(
+                self.thread_budget.predict_proba(name, getattr(self, name), X, thread_profile), dtype=np.float64,
+            )
+            if observe:
+                self.degradation.observe_model(name, (perf_counter() - t0) * 1000)
+        fraud_prob = sum(weight * scores[name] for name, weight in active_weights.items())
+        return scores, fraud_prob
+
+    def _anomaly_scores(self, X: np.ndarray) -> np.ndarray:
+        """-decision_function IsolationForest по матрице feature_cols."""
+        if isinstance(self.anomaly_scorer, FlatIsolationForest):
+            return -self.anomaly_scorer.decision_function(X)
+        # fallback на sklearn: модель обучена на DataFrame и ругается на ndarray без имён
+        return -self.anomaly_scorer.decision_function(pd.DataFrame(X, columns=self.feature_cols))
+
     def predict_batch(
         self,
         transactions: List[TransactionInput],
         behavioral_patterns: Dict[int, Dict[str, Any]] = None,
+        thread_profile: str = "throughput",
+        explain: bool = True,
+        replayed_out: Optional[List[bool]] = None,
     ) -> List[TransactionOutput]:
         """
-        Предсказание для нескольких транзакций
+        Предсказание для нескольких транзакций (DTO для /predict/batch)
+
+        explain=False — без построчного SHAP (top_features пустой).
+        replayed_out — по флагу на транзакцию, как у predict_single_transaction.
+        Транзакции с id идут через кэш идемпотентности и с explain=False:
+        повтор не пересчитывается и второй раз в историю не пишется
+        (и отдаёт сохранённый ответ, с SHAP или без — как был посчитан).
+        Внутренним пачкам (bulk, стрим) — score_records: без DTO.
         """
         results: List[TransactionOutput] = []
         for trans in transactions:
             cst_id = trans.cst_dim_id
             patterns = behavioral_patterns.get(cst_id) if behavioral_patterns else None
-            result = self.predict_single_transaction(trans, patterns)
-            results.append(result)
+            results.append(self.predict_single_transaction(
+                trans, patterns, thread_profile=thread_profile, replayed_out=replayed_out, explain=explain,
+            ))
 
         return results
 
+    def score_records(
+        self,
+        records: List[TxRecord],
+        behavioral_patterns: Dict[int, Dict[str, Any]] = None,
+        thread_profile: str = "throughput",
+        alerts: bool = False,
+        features_out: Optional[List[np.ndarray]] = None,
+        errors: Optional[Dict[int, str]] = None,
+    ) -> ScoreBatch:
+        """
+        Скоринг пачки внутренних записей без pydantic и без построчного
+        SHAP; результат — колонки numpy (ScoreBatch). Кэш идемпотентности
+        не используется: каждая запись скорится и пишется в историю.
+        Уровень деградации не применяется: офлайн-полосы (bulk, загрузки,
+        стрим) не делят SLO живого трафика и скорятся полным ансамблем.
+        alerts=True — тексты алертов по строкам в batch.alerts;
+        features_out — матрица признаков по строкам для explain_batch.
+        errors — построчная изоляция (стрим): исключение строки i пишется
+        в errors[i], строка batch остаётся незаполненной, пачка скорится
+        дальше; без errors исключение пробрасывается.
+
+        Кусками по SCORE_CHUNK_ROWS: признаки строятся построчно по порядку,
+        и история обновляется сразу после строки — следующая видит её, как
+        при построчном скоринге (признаки от скоров не зависят). Потом
+        IsolationForest и бустеры считают всю матрицу куска разом, с
+        профилем потоков thread_profile. processing_time_ms — доля строки
+        во времени куска. Сбой моделей на матрице (не на строке) при errors
+        помечает ошибкой весь кусок; история его строк уже записана.
+        """
+        batch = ScoreBatch(
+            len(records), self.model_pkg.get("version", "unknown"), self.threshold, with_alerts=alerts,
+        )
+        level, active_weights, _ = self.degradation.full_plan(self.weights)
+        for start in range(0, len(records), SCORE_CHUNK_ROWS):
+            started = perf_counter()
+            slots: List[int] = []
+            rows: List[np.ndarray] = []
+            built: List[Dict[str, float]] = []
+            for i in range(start, min(start + SCORE_CHUNK_ROWS, len(records))):
+                record = records[i]
+                patterns = behavioral_patterns.get(record.cst_dim_id) if behavioral_patterns else None
+                try:
+                    features, row = self._feature_row(record, patterns)
+                    self._update_history(record)
+                except Exception as e:
+                    if errors is None:
+                        raise
+                    errors[i] = f"{type(e).__name__}: {e}"
+                    continue
+                slots.append(i)
+                rows.append(row)
+                built.append(features)
+            if not rows:
+                continue
+
+            X = np.vstack(rows)
+            try:
+                scores, fraud_prob = self._score_matrix(X, active_weights, thread_profile)
+            except Exception as e:
+                if errors is None:
+                    raise
+                errors.update(dict.fromkeys(slots, f"{type(e).__name__}: {e}"))
+                continue
+
+            slots_arr = np.asarray(slots)
+            batch.set_rows(
+                slots_arr, fraud_prob, X[:, -1], scores, level, (perf_counter() - started) * 1000 / len(slots),
+            )
+            shadow = self.shadow
+            for j, i in enumerate(slots):
+                prob = float(fraud_prob[j])
+                if shadow is not None:
+                    shadow.submit(X[j], self.model_columns, prob, prob >= self.threshold)
+                if alerts:
+                    batch.alerts[i] = self._generate_alerts(records[i], built[j], prob)
+            if features_out is not None:
+                features_out.extend(X)
+        return batch
+
+    def explain_batch(
+        self,
+        X: np.ndarray,
+        top_k: int = 5,
+        thread_profile: str = "throughput",
+        batch_size: int = 50_000,
+    ):
+        """
+        SHAP CatBoost для матрицы признаков (n x (features + anomaly_score))
+        нативным ShapValues CatBoost — большими пачками, многопоточно, без
+        пакета shap. Возвращает (имена признаков, вклады), обе формы
+        (n, top_k), по убыванию |вклада|.
+        """
+        from catboost import Pool
+
+        columns = np.asarray(self.feature_cols + ["anomaly_score"], dtype=object)
+        top_k = min(top_k, len(columns))
+        names = np.empty((len(X), top_k), dtype=object)
+        values = np.empty((len(X), top_k), dtype=float)
+        for start in range(0, len(X), batch_size):
+            part = X[start:start + batch_size]
+            shap_values = self.catboost.get_feature_importance(
+                Pool(pd.DataFrame(part, columns=columns)),
+                type="ShapValues",
+                thread_count=self.thread_budget.threads_for(thread_profile, len(part)),
+            )[:, :-1]  # последняя колонка — expected value
+            order = np.argpartition(-np.abs(shap_values), top_k - 1, axis=1)[:, :top_k]
+            top = np.take_along_axis(shap_values, order, axis=1)
+            by_abs = np.argsort(-np.abs(top), axis=1)
+            order = np.take_along_axis(order, by_abs, axis=1)
+            names[start:start + len(part)] = columns[order]
+            values[start:start + len(part)] = np.take_along_axis(top, by_abs, axis=1)
+        return names, values
+
+    def warm_up(self, n: int = 32) -> float:
+        """
+        Прогоняет n синтетических транзакций через все модели и SHAP,
+        не трогая историю: нативная ленивая инициализация CatBoost /
+        XGBoost / LightGBM / SHAP случается здесь, а не на живых запросах.
+        Возвращает время прогрева в мс.
+        """
+        start_time = datetime.now()
+        directions = (
+            list(self.encoders["direction"].classes_[:4])
+            if "direction" in self.encoders
+            else ["card_transfer"]
+        )
+        history_ids = list(self.history.keys())[:n]
+        base_ts = datetime.now().replace(microsecond=0)
+
+        for i in range(n):
+            # чередуем известных (с историей) и новых клиентов
+            cst_id = history_ids[i] if i % 2 == 0 and i < len(history_ids) else -(i + 1)
+            transaction = TxRecord(
+                cst_dim_id=cst_id,
+                amount=float(10 ** (2 + i % 5)),
+                direction=str(directions[i % len(directions)]),
+                transdatetime=base_ts - timedelta(hours=7 * i),
+            )
+            self._score_record(transaction, update_history=False, degrade=False).to_output()
+
+        return (datetime.now() - start_time).total_seconds() * 1000
+
     # ------------------------------------------------------------------
     #  Фичи
     # ------------------------------------------------------------------
     def _build_features(
         self,
-        transaction: TransactionInput,
+        transaction: TxRecord,
         behavioral_patterns: Dict[str, Any] = None,
     ) -> Dict[str, float]:
         """
@@ -307,10 +814,9 @@ class FraudDetectionAPI:
             set(h[2] for h in hist if h[0] < ts)
         )
 
-        # Граф (упрощенно, без полной статистики)
-        features["sender_out_degree"] = features["unique_directions_count"]
-        features["receiver_in_degree"] = 1  # Не можем посчитать без других клиентов
-        features["pair_count"] = features["num_prev_trans_to_same"]
+        # Граф: sender_out_degree / receiver_in_degree / pair_count по всем клиентам
+        # (+ варианты за 7/30 дней) из глобального индекса, O(1) на запрос
+        features.update(self.graph_index.edge_features(cst_id, direction, ts))
 
         # Аномалии
         features["is_amount_spike"] = (
@@ -348,16 +854,26 @@ class FraudDetectionAPI:
         else:
             features["direction"] = 0
 
-        # Поведенческие паттерны (если есть)
+        # Поведенческие паттерны: сначала из feature store,
+        # поверх — то, что прислал клиент в запросе
+        patterns: Dict[str, Any] = {}
+        if self.feature_store is not None:
+            stored = self.feature_store.lookup(cst_id)
+            if stored:
+                patterns.update(stored)
+        if behavioral_patterns is None:
+            behavioral_patterns = transaction.behavioral_patterns
         if behavioral_patterns:
-            for key, value in behavioral_patterns.items():
-                if key not in ["cst_dim_id", "transdate"]:
-                    features[key] = value
-        else:
-            # Заполняем дефолтными значениями фичи, которых нет
-            for col in self.feature_cols:
-                if col not in features:
-                    features[col] = 0
+            patterns.update(behavioral_patterns)
+
+        for key, value in patterns.items():
+            if key not in ["cst_dim_id", "transdate"]:
+                features[key] = value
+
+        # Заполняем дефолтными значениями фичи, которых нет
+        for col in self.feature_cols:
+            if col not in features:
+                features[col] = 0
 
         return features
 
@@ -366,13 +882,18 @@ class FraudDetectionAPI:
     # ------------------------------------------------------------------
     def _generate_alerts(
         self,
-        transaction: TransactionInput,  # not actual
+        transaction: TxRecord,  # not actual
         features: Dict[str, float],
         fraud_prob: float,
     ) -> List[str]:
         """
         Генерирует человеко-читаемые алерты
         """
+        return self._feature_alerts(features) + self._probability_alerts(fraud_prob)
+
+    @staticmethod
+    def _feature_alerts(features: Dict[str, float]) -> List[str]:
+        """Алерты по признакам транзакции (не зависят от ансамбля)."""
         alerts: List[str] = []
 
         if features.get("is_amount_spike", 0) == 1:
@@ -390,12 +911,15 @@ class FraudDetectionAPI:
         if features.get("total_prev_trans", 0) < 5:
             alerts.append("⚠️ New customer with limited history")
 
-        if fraud_prob > 0.9:
-            alerts.append("🚨 CRITICAL: Very high fraud probability")
-
         return alerts
 
-    def _update_history(self, transaction: TransactionInput):
+    @staticmethod
+    def _probability_alerts(fraud_prob: float) -> List[str]:
+        if fraud_prob > 0.9:
+            return ["🚨 CRITICAL: Very high fraud probability"]
+        return []
+
+    def _update_history(self, transaction: TxRecord):
         """
         Обновляет историю транзакций клиента
         """
@@ -404,14 +928,17 @@ class FraudDetectionAPI:
         amount = float(transaction.amount)
         direction = str(transaction.direction)
 
-        if cst_id not in self.history:
-            self.history[cst_id] = []
-
-        self.history[cst_id].append((ts, amount, direction))
-
-        # Храним только последние 60 дней
-        cutoff = ts - timedelta(days=60)
-        self.history[cst_id] = [h for h in self.history[cst_id] if h[0] >= cutoff]
+        # Храним только последние HISTORY_RETENTION_DAYS дней; под общим
+        # lock с фоновым sweeper-ом, который может выселить клиента целиком
+        cutoff = ts - self.retention.retention
+        with self.retention.lock:
+            entries = self.history.get(cst_id, [])
+            before = len(entries)
+            entries.append((ts, amount, direction))
+            entries = [h for h in entries if h[0] >= cutoff]
+            self.history[cst_id] = entries
+            self.retention.touch(cst_id, ts, len(entries) - before)
+        self.graph_index.add(cst_id, direction, ts)
 
     def get_stats(self) -> Stats:
         """
@@ -422,4 +949,9 @@ class FraudDetectionAPI:
             model_version=self.model_pkg.get("version", "unknown"),
             threshold=self.threshold,
             num_features=len(self.feature_cols),
+            idempotency_cache=self.idempotency.stats(),
+            graph_index=self.graph_index.stats(),
+            history_retention=self.retention.stats(),
+            thread_budget=self.thread_budget.stats(),
+            degradation=self.degradation.stats(),
         )
@@ -0,0 +1,278 @@
+"""
+Держатель активной модели с горячей подменой без даунтайма.
+
+Новый model_package.pkl грузится в фоне, прогревается синтетическими
+транзакциями (все модели + SHAP) и только потом атомарно становится
+активным. Запросы, уже взявшие старый экземпляр, дорабатывают на нём;
+история клиентов, граф и кэш идемпотентности переходят в новый
+экземпляр теми же объектами.
+
+При prefork (serve.py) перезагрузка и shadow-кандидат публикуются всем
+воркерам через fleet.py: воркер, получивший admin-запрос, применяет
+изменение у себя и пишет в control.json, остальные применяют его на
+ближайшем опросе.
+
+Жизненный цикл процесса: load() — распаковка пакета (при serve.py —
+в мастере до форка, чтобы страницы модели были общими), warm_up() —
+прогрев в процессе, который скорит (из lifespan, в фоне); /ready
+отвечает 200 только после прогрева. В мастере serve.py модели не
+вызываются: пулы потоков CatBoost / OpenMP, созданные до fork,
+в дочерних процессах могут зависнуть.
+"""
+
+import os
+import threading
+import time
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+from config import LAZY_HEAVY_IMPORTS, MODEL_DIR, WARMUP_TRANSACTIONS
+from fleet import FleetControl, FleetSync
+from model import FraudDetectionAPI
+from shadow import ShadowScorer, merge_stats
+from startup_profile import profile
+
+
+class ModelManager:
+    """
+    Эндпоинты берут модель через `manager.current` один раз на запрос.
+    """
+
+    def __init__(self, model_path: str = MODEL_DIR, warmup: int = WARMUP_TRANSACTIONS):
+        self.warmup = warmup
+        self.model_path = model_path
+        # загружается load() — не при импорте модуля
+        self.current: Optional[FraudDetectionAPI] = None
+        self.loaded_at: Optional[datetime] = None
+        # готовность к скорингу: модель загружена и прогрета
+        self.ready = False
+
+        self._load_lock = threading.Lock()
+        self._reload_lock = threading.Lock()
+        self._reload_thread: Optional[threading.Thread] = None
+        self.swaps = 0
+        self.last_reload: Dict[str, Any] = {"state": "idle"}
+        # синхронизация воркеров serve.py; None — один процесс
+        self.fleet: Optional[FleetSync] = None
+
+    def load(self) -> FraudDetectionAPI:
+        """
+        Распаковывает пакет модели (идемпотентно), без вызовов моделей.
+        LAZY_HEAVY_IMPORTS=0 — сразу и SHAP explainer с numba (без
+        прогревочного вызова SHAP: он будет в warm_up).
+        """
+        with self._load_lock:
+            if self.current is None:
+                with profile.phase("model_load"):
+                    detector = FraudDetectionAPI(self.model_path)
+                if not LAZY_HEAVY_IMPORTS:
+                    detector.load_background_components(warm=False)
+                self.current = detector
+                self.loaded_at = datetime.now()
+        return self.current
+
+    def warm_up(self):
+        """Прогрев моделей в этом процессе; после него ready = True."""
+        if self.warmup > 0:
+            with profile.phase("warm_up"):
+                warmup_ms = self.current.warm_up(self.warmup)
+            print(f"[ModelManager] warm-up: {self.warmup} transactions in {warmup_ms:.0f} ms")
+        self.ready = True
+        profile.mark("models_ready")
+
+    def follow_fleet(self, control: FleetControl, poll_seconds: float):
+        """Этот воркер применяет общее состояние из control (вызывается из lifespan)."""
+        self.fleet = FleetSync(
+            control,
+            appliers={
+                "model": lambda values: self.reload(values["model_path"]),
+                "shadow": self._apply_shadow,
+            },
+            status=lambda: {"model": self._local_status(), "shadow": self._local_shadow_stats()},
+            poll_seconds=poll_seconds,
+        )
+        self.fleet.start()
+
+    def request_reload(self, model_path: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Перезагрузка по admin-запросу: в одном процессе — reload(), при
+        prefork — здесь и во всех воркерах (путь фиксируется при публикации).
+        """
+        path = model_path or self.model_path
+        if self.fleet is None:
+            return self.reload(path)
+        change = self.fleet.change("model", {"model_path": path})
+        return {**change["result"], "fleet_seq": change["seq"]}
+
+    # ------------------------------------------------------------------
+    #  Shadow-кандидат (shadow.py)
+    # ------------------------------------------------------------------
+    def request_shadow(self, model_path: str, queue_size: int) -> Dict[str, Any]:
+        """
+        Подключает кандидата (в одном процессе — здесь, при prefork — во
+        всех воркерах). ValueError — кандидат не загрузился или ему нужны
+        признаки, которых живой путь не строит; тогда он не публикуется.
+        """
+        values = {"model_path": model_path, "queue_size": queue_size}
+        if self.fleet is None:
+            return self._apply_shadow(values)
+        change = self.fleet.change("shadow", values)
+        return {**change["result"], "fleet_seq": change["seq"]}
+
+    def request_shadow_stop(self) -> Optional[Dict[str, Any]]:
+        """Снимает кандидата везде; итоговая статистика этого процесса или None, если его не было."""
+        stats = self.shadow_stats()
+        if self.fleet is None:
+            self._apply_shadow({"model_path": None})
+        else:
+            self.fleet.change("shadow", {"model_path": None})
+        return stats
+
+    def shadow_stats(self) -> Optional[Dict[str, Any]]:
+        """
+        Статистика кандидата; при prefork — сводка по всем воркерам
+        (статусы из FLEET_DIR, запаздывают до FLEET_POLL_SECONDS) и по
+        каждому. None — кандидат нигде не подключён.
+        """
+        local = self._local_shadow_stats()
+        if self.fleet is None:
+            return local
+        workers = [
+            {"pid": w["pid"], **w["shadow"]}
+            for w in self.fleet.control.workers()
+            if w["pid"] != os.getpid() and w.get("shadow") is not None
+        ]
+        if local is not None:
+            workers.insert(0, {"pid": os.getpid(), **local})
+        if not workers:
+            return None
+        return {"total": merge_stats(workers), "workers": workers, "errors": self._fleet_errors("shadow")}
+
+    def _fleet_errors(self, section: str) -> Dict[int, str]:
+        return {w["pid"]: w["errors"][section] for w in self.fleet.control.workers() if section in w.get("errors", {})}
+
+    def _local_shadow_stats(self) -> Optional[Dict[str, Any]]:
+        shadow = self.current.shadow if self.current is not None else None
+        return shadow.stats() if shadow is not None else None
+
+    def _apply_shadow(self, values: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Кандидат в этом процессе: model_path=None — снять."""
+        detector = self.current
+        if values.get("model_path") is None:
+            scorer, detector.shadow = detector.shadow, None
+            if scorer is None:
+                return None
+            scorer.stop()
+            return scorer.stats()
+
+        try:
+            scorer = ShadowScorer(
+                values["model_path"],
+                queue_size=values["queue_size"],
+                thread_budget=detector.thread_budget,
+            )
+        except Exception as e:
+            raise ValueError(f"Cannot load candidate: {e}")
+
+        missing = set(scorer.feature_cols) - set(detector.feature_cols)
+        if missing:
+            scorer.stop()
+            raise ValueError(f"Candidate needs features the live path does not build: {sorted(missing)}")
+
+        previous, detector.shadow = detector.shadow, scorer
+        if previous is not None:
+            previous.stop()
+        return scorer.stats()
+
+    # ------------------------------------------------------------------
+    #  Перезагрузка модели
+    # ------------------------------------------------------------------
+    def reload(self, model_path: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Запускает фоновую загрузку + прогрев + подмену.
+        Бросает RuntimeError, если предыдущая перезагрузка ещё идёт.
+        """
+        path = model_path or self.model_path
+        if not self._reload_lock.acquire(blocking=False):
+            raise RuntimeError("Model reload is already in progress")
+
+        self.last_reload = {
+            "state": "loading",
+            "model_path": path,
+            "started_at": datetime.now().isoformat(timespec="seconds"),
+        }
+        self._reload_thread = threading.Thread(
+            target=self._reload_worker,
+            args=(path,),
+            name="model-reload",
+            daemon=True,
+        )
+        self._reload_thread.start()
+        return dict(self.last_reload)
+
+    def _reload_worker(self, path: str):
+        try:
+            t0 = time.perf_counter()
+            old = self.current
+            new = FraudDetectionAPI(path, state_from=old)
+            # на подмене SHAP и numba нужны сразу — грузим до прогрева
+            new.load_background_components()
+            load_ms = (time.perf_counter() - t0) * 1000
+
+            self.last_reload["state"] = "warming_up"
+            warmup_ms = new.warm_up(self.warmup) if self.warmup > 0 else 0.0
+
+            # атомарная подмена ссылки: новые запросы идут в new,
+            # старые дорабатывают на old
+            self.current = new
+            self.model_path = path
+            self.loaded_at = datetime.now()
+            self.swaps += 1
+
+            self.last_reload.update(
+                state="done",
+                finished_at=self.loaded_at.isoformat(timespec="seconds"),
+                previous_version=old.model_pkg.get("version", "unknown"),
+                model_version=new.model_pkg.get("version", "unknown"),
+                load_ms=round(load_ms, 1),
+                warmup_ms=round(warmup_ms, 1),
+            )
+            print(
+                f"[ModelManager] swapped to {path} "
+                f"(load {load_ms:.0f} ms, warm-up {warmup_ms:.0f} ms)"
+            )
+        except Exception as e:
+            self.last_reload.update(state="failed", error=str(e))
+            print(f"[ModelManager] reload of {path} failed, keeping current model: {e}")
+        finally:
+            self._reload_lock.release()
+
+    def status(self) -> Dict[str, Any]:
+        """Модель этого процесса; при prefork — плюс статусы всех воркеров."""
+        status = self._local_status()
+        if self.fleet is not None:
+            status["fleet"] = self.fleet_status()
+        return status
+
+    def fleet_status(self) -> Dict[str, Any]:
+        workers = self.fleet.control.workers()
+        desired = self.fleet.desired_seq().get("model", 0)
+        consistent = (
+            len({w["model"]["model_version"] for w in workers}) <= 1
+            and all(
+                w["applied"].get("model", 0) == desired
+                and w["model"]["last_reload"]["state"] in ("idle", "done", "failed")
+                for w in workers
+            )
+        )
+        return {"desired_seq": desired, "consistent": consistent, "workers": workers}
+
+    def _local_status(self) -> Dict[str, Any]:
+        return {
+            "pid": os.getpid(),
+            "model_path": self.model_path,
+            "model_version": self.current.model_pkg.get("version", "unknown"),
+            "loaded_at": self.loaded_at.isoformat(timespec="seconds") if self.loaded_at else None,
+            "swaps": self.swaps,
+            "last_reload": dict(self.last_reload),
+        }
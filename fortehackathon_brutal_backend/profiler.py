@@ -0,0 +1,216 @@
+"""
+Профилирование работающего воркера без передеплоя (admin API).
+
+SamplingProfiler — сэмплирующий профайлер: отдельный поток раз в
+interval снимает стеки всех потоков (sys._current_frames) и копит их
+в «свёрнутом» виде (collapsed stacks: `a;b;c N`). Накладные расходы —
+один обход стеков на сэмпл, сам скоринг не инструментируется.
+Результат открывается в flamegraph.pl, speedscope, inferno.
+
+RequestProfiler — полный cProfile для доли запросов (sample_rate):
+статистика выбранных запросов сливается в общий pstats.Stats.
+cProfile (в 3.12+ через sys.monitoring) может быть активен только один
+на процесс, поэтому одновременно профилируется не больше одного запроса
+(неблокирующий lock, остальные идут без профиля).
+
+Охват зависит от версии Python: до 3.12 cProfile ставит хук
+(setprofile) только вызывающему потоку — в статистику попадает ровно
+выбранный запрос. В 3.12+ sys.monitoring действует на весь процесс:
+пока запрос профилируется, в статистику попадают и другие потоки —
+соседние запросы threadpool, чистка истории, shadow, fleet-sync.
+Отчёт тогда — «процесс в окне запроса», а не один запрос; поле scope
+в stats() показывает, какой режим у воркера.
+"""
+
+import cProfile
+import io
+import os
+import pstats
+import random
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from typing import Any, Callable, Dict, List, Optional
+
+# см. docstring модуля: "thread" — только вызывающий поток, "process" — все потоки
+REQUEST_PROFILE_SCOPE = "process" if sys.version_info >= (3, 12) else "thread"
+
+# листовые кадры «простаивающих» потоков: ожидание очереди / события / сокета
+_IDLE_LEAVES = {
+    ("threading.py", "wait"),
+    ("threading.py", "_wait_for_tstate_lock"),
+    ("queue.py", "get"),
+    ("selectors.py", "select"),
+}
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class SamplingProfiler:
+    """
+    Сэмплы стеков всех потоков процесса за заданное время.
+    """
+
+    def __init__(self, interval: float = 0.005, include_idle: bool = False):
+        self.interval = interval
+        self.include_idle = include_idle
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self._stopped = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        self.started_at = time.time()
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.finished_at = time.time()
+
+    def _run(self):
+        own_id = threading.get_ident()
+        names = {}
+        while not self._stopped.wait(self.interval):
+            frames = sys._current_frames()
+            if len(names) != len(frames):
+                names = {t.ident: t.name for t in threading.enumerate()}
+            for thread_id, frame in frames.items():
+                if thread_id == own_id:
+                    continue
+                code = frame.f_code
+                if not self.include_idle and (os.path.basename(code.co_filename), code.co_name) in _IDLE_LEAVES:
+                    continue
+                stack: List[str] = []
+                while frame is not None:
+                    stack.append(_frame_label(frame))
+                    frame = frame.f_back
+                stack.append(names.get(thread_id, str(thread_id)))
+                stack.reverse()
+                self.stacks[";".join(stack)] += 1
+            self.samples += 1
+
+    # ------------------------------------------------------------------
+    def collapsed(self) -> str:
+        """Формат flamegraph.pl: `поток;кадр;...;лист <число сэмплов>` построчно."""
+        return "\n".join(f"{stack} {count}" for stack, count in self.stacks.most_common()) + "\n"
+
+    def summary(self, top_n: int = 30) -> Dict[str, Any]:
+        self_counts: Counter = Counter()
+        total_counts: Counter = Counter()
+        busy = sum(self.stacks.values())
+        for stack, count in self.stacks.items():
+            frames = stack.split(";")[1:]
+            if not frames:
+                continue
+            self_counts[frames[-1]] += count
+            for label in set(frames):
+                total_counts[label] += count
+
+        def top(counter: Counter):
+            return [
+                {"frame": label, "samples": count, "share": round(count / busy, 4)}
+                for label, count in counter.most_common(top_n)
+            ]
+
+        return {
+            "duration_s": round((self.finished_at or time.time()) - (self.started_at or time.time()), 3),
+            "interval_ms": self.interval * 1000,
+            "samples": self.samples,
+            "thread_stacks": busy,
+            "top_self": top(self_counts) if busy else [],
+            "top_total": top(total_counts) if busy else [],
+        }
+
+
+class RequestProfiler:
+    """
+    cProfile для случайной доли запросов; статистика копится до reset().
+    """
+
+    def __init__(self):
+        self.sample_rate = 0.0
+        self.max_requests = 0
+        self.profiled = 0
+        self.skipped_busy = 0
+        self._stats: Optional[pstats.Stats] = None
+        self._active = threading.Lock()
+        self._stats_lock = threading.Lock()
+
+    def configure(self, sample_rate: float, max_requests: int = 1000, reset: bool = True):
+        with self._stats_lock:
+            self.sample_rate = sample_rate
+            self.max_requests = max_requests
+            if reset:
+                self._stats = None
+                self.profiled = 0
+                self.skipped_busy = 0
+
+    def call(self, func: Callable, *args) -> Any:
+        """Выполняет func(*args); для выбранной доли — под cProfile."""
+        if (
+            self.sample_rate <= 0
+            or self.profiled >= self.max_requests
+            or random.random() >= self.sample_rate
+        ):
+            return func(*args)
+        if not self._active.acquire(blocking=False):
+            self.skipped_busy += 1
+            return func(*args)
+        try:
+            profile = cProfile.Profile()
+            try:
+                profile.enable()
+            except ValueError:
+                # профайлер уже активен (например, внешний) — без профиля
+                self.skipped_busy += 1
+                return func(*args)
+            try:
+                return func(*args)
+            finally:
+                profile.disable()
+                with self._stats_lock:
+                    if self._stats is None:
+                        self._stats = pstats.Stats(profile)
+                    else:
+                        self._stats.add(profile)
+                    self.profiled += 1
+        finally:
+            self._active.release()
+
+    def report(self, sort: str = "cumulative", top_n: int = 40) -> str:
+        with self._stats_lock:
+            if self._stats is None:
+                return "no profiled requests yet\n"
+            out = io.StringIO()
+            self._stats.stream = out
+            self._stats.sort_stats(sort).print_stats(top_n)
+            return out.getvalue()
+
+    def dump(self) -> Optional[bytes]:
+        """Сырые pstats (для snakeviz / python -m pstats)."""
+        with self._stats_lock:
+            if self._stats is None:
+                return None
+            with tempfile.NamedTemporaryFile(suffix=".pstats") as f:
+                self._stats.dump_stats(f.name)
+                with open(f.name, "rb") as dumped:
+                    return dumped.read()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "sample_rate": self.sample_rate,
+            "max_requests": self.max_requests,
+            "profiled": self.profiled,
+            "skipped_busy": self.skipped_busy,
+            "scope": REQUEST_PROFILE_SCOPE,
+        }
@@ -0,0 +1,227 @@
+"""
+Внутренние записи скоринга без pydantic.
+
+Pydantic-модели из dtos.py — контракт HTTP: валидация входа и
+сериализация ответа. Внутри скоринга они не нужны, а стоят заметно:
+TransactionInput на каждую строку bulk-файла, model_dump() на каждый
+вызов, TransactionOutput / Models / TopFeature на каждый результат.
+Поэтому внутри:
+
+  • TxRecord — транзакция (__slots__, те же имена полей, что у
+    TransactionInput: _build_features / _update_history работают с обоими);
+  • ScoreRecord — результат одной транзакции (__slots__); в DTO
+    превращается только на границе API — to_output();
+  • ScoreBatch — результаты пачки столбцами numpy (struct-of-arrays):
+    bulk, стрим и сборка референса дрейфа пишут колонки сразу из массивов.
+"""
+
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional
+
+import numpy as np
+from pydantic import TypeAdapter
+
+from dtos import Models, TopFeature, TransactionInput, TransactionOutput
+
+# тот же разбор, что у поля transdatetime в TransactionInput
+_DATETIME = TypeAdapter(datetime)
+
+RISK_LEVELS = np.array(["LOW", "MEDIUM", "HIGH", "CRITICAL"], dtype=object)
+# нижние границы fraud_probability для MEDIUM / HIGH / CRITICAL
+RISK_BOUNDS = (0.4, 0.6, 0.8)
+
+
+def risk_level(fraud_prob: float) -> str:
+    if fraud_prob >= RISK_BOUNDS[2]:
+        return "CRITICAL"
+    if fraud_prob >= RISK_BOUNDS[1]:
+        return "HIGH"
+    if fraud_prob >= RISK_BOUNDS[0]:
+        return "MEDIUM"
+    return "LOW"
+
+
+def parse_datetimes(values: Iterable[Any]) -> List[datetime]:
+    """Строки / datetime → datetime так же, как это делает TransactionInput."""
+    validate = _DATETIME.validate_python
+    return [validate(value) for value in values]
+
+
+class TxRecord:
+    """Транзакция для скоринга: поля TransactionInput без валидации pydantic."""
+
+    __slots__ = ("cst_dim_id", "amount", "direction", "transdatetime", "id", "behavioral_patterns")
+
+    def __init__(
+        self,
+        cst_dim_id: int,
+        amount: float,
+        direction: str,
+        transdatetime: datetime,
+        id: Optional[int] = None,
+        behavioral_patterns: Optional[Dict[str, Any]] = None,
+    ):
+        self.cst_dim_id = cst_dim_id
+        self.amount = amount
+        self.direction = direction
+        self.transdatetime = transdatetime
+        self.id = id
+        self.behavioral_patterns = behavioral_patterns
+
+    @classmethod
+    def from_input(cls, transaction: TransactionInput) -> "TxRecord":
+        return cls(
+            transaction.cst_dim_id,
+            transaction.amount,
+            transaction.direction,
+            transaction.transdatetime,
+            transaction.id,
+            transaction.behavioral_patterns,
+        )
+
+    @classmethod
+    def from_columns(
+        cls,
+        cst_dim_id: Iterable[Any],
+        amount: Iterable[Any],
+        direction: Iterable[Any],
+        transdatetime: Iterable[Any],
+    ) -> List["TxRecord"]:
+        """Записи из колонок очищенного bulk-файла (те же приведения, что у TransactionInput)."""
+        return [
+            cls(int(cst_id), float(value), str(dest), ts)
+            for cst_id, value, dest, ts in zip(cst_dim_id, amount, direction, parse_datetimes(transdatetime))
+        ]
+
+
+class ScoreRecord:
+    """Результат скоринга одной транзакции; DTO — только через to_output()."""
+
+    __slots__ = (
+        "fraud_probability",
+        "is_fraud",
+        "scores",
+        "anomaly",
+        "alerts",
+        "top_features",
+        "processing_time_ms",
+        "degradation_level",
+        "model_version",
+        "threshold",
+    )
+
+    def __init__(
+        self,
+        fraud_probability: float,
+        is_fraud: bool,
+        scores: Dict[str, Optional[float]],
+        anomaly: float,
+        alerts: Optional[List[str]],
+        top_features: List[tuple],
+        processing_time_ms: float,
+        degradation_level: int,
+        model_version: str,
+        threshold: float,
+    ):
+        self.fraud_probability = fraud_probability
+        self.is_fraud = is_fraud
+        self.scores = scores
+        self.anomaly = anomaly
+        self.alerts = alerts
+        self.top_features = top_features  # [(имя признака, shap), ...]
+        self.processing_time_ms = processing_time_ms
+        self.degradation_level = degradation_level
+        self.model_version = model_version
+        self.threshold = threshold
+
+    @property
+    def risk_level(self) -> str:
+        return risk_level(self.fraud_probability)
+
+    def to_output(self) -> TransactionOutput:
+        """DTO ответа /predict."""
+        scores = self.scores
+        return TransactionOutput(
+            is_fraud=self.is_fraud,
+            fraud_probability=self.fraud_probability,
+            risk_level=self.risk_level,
+            alerts=self.alerts or [],
+            processing_time_ms=self.processing_time_ms,
+            model_version=self.model_version,
+            threshold_used=self.threshold,
+            individual_scores=Models(
+                catboost=scores["catboost"],
+                xgboost=scores["xgboost"],
+                lightgbm=scores["lightgbm"],
+                anomaly=self.anomaly,
+            ),
+            top_features=[TopFeature(feature=name, shap_value=value) for name, value in self.top_features],
+            degradation_level=self.degradation_level,
+        )
+
+
+class ScoreBatch:
+    """
+    Результаты пачки столбцами: scores[name] — NaN там, где бустер
+    отключён деградацией. alerts — списки по строкам или None, если
+    алерты не запрашивались.
+    """
+
+    MODELS = ("catboost", "xgboost", "lightgbm")
+
+    def __init__(self, n: int, model_version: str, threshold: float, with_alerts: bool = False):
+        self.n = n
+        self.model_version = model_version
+        self.threshold = threshold
+        self.fraud_probability = np.empty(n, dtype=np.float64)
+        self.is_fraud = np.empty(n, dtype=bool)
+        self.anomaly = np.empty(n, dtype=np.float64)
+        self.scores = {name: np.empty(n, dtype=np.float64) for name in self.MODELS}
+        self.degradation_level = np.empty(n, dtype=np.int8)
+        self.processing_time_ms = np.empty(n, dtype=np.float64)
+        self.alerts: Optional[List[Optional[List[str]]]] = [None] * n if with_alerts else None
+
+    def __len__(self) -> int:
+        return self.n
+
+    def set_rows(
+        self,
+        rows: np.ndarray,
+        fraud_probability: np.ndarray,
+        anomaly: np.ndarray,
+        scores: Dict[str, Optional[np.ndarray]],
+        degradation_level: int,
+        processing_time_ms: float,
+    ):
+        """Строки rows одной матрицей (score_records): колонки вместо ScoreRecord."""
+        self.fraud_probability[rows] = fraud_probability
+        self.is_fraud[rows] = fraud_probability >= self.threshold
+        self.anomaly[rows] = anomaly
+        for name, column in self.scores.items():
+            score = scores[name]
+            column[rows] = np.nan if score is None else score
+        self.degradation_level[rows] = degradation_level
+        self.processing_time_ms[rows] = processing_time_ms
+
+    def risk_levels(self) -> np.ndarray:
+        """risk_level по строкам — те же границы, что у risk_level()."""
+        return RISK_LEVELS[np.searchsorted(RISK_BOUNDS, self.fraud_probability, side="right")]
+
+    def row(self, i: int) -> Dict[str, Any]:
+        """Одна строка как JSON-совместимый словарь (поля TransactionOutput без SHAP)."""
+        scores = {
+            name: None if np.isnan(column[i]) else float(column[i])
+            for name, column in self.scores.items()
+        }
+        fraud_prob = float(self.fraud_probability[i])
+        return {
+            "is_fraud": bool(self.is_fraud[i]),
+            "fraud_probability": fraud_prob,
+            "risk_level": risk_level(fraud_prob),
+            "alerts": self.alerts[i] if self.alerts is not None else [],
+            "processing_time_ms": float(self.processing_time_ms[i]),
+            "model_version": self.model_version,
+            "threshold_used": self.threshold,
+            "individual_scores": {**scores, "anomaly": float(self.anomaly[i])},
+            "degradation_level": int(self.degradation_level[i]),
+        }
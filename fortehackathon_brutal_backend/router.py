@@ -1,52 +1,287 @@
-from typing import List
+import asyncio
+import functools
+import json
+import time
+from typing import List, Optional, Set
 
-from fastapi import APIRouter, HTTPException, UploadFile, File, Response
+from fastapi import (
+    APIRouter,
+    HTTPException,
+    UploadFile,
+    File,
+    Header,
+    Query,
+    Request,
+    Response,
+    WebSocket,
+    WebSocketDisconnect,
+)
+from fastapi.responses import FileResponse
 from starlette.concurrency import run_in_threadpool
 
-import pandas as pd
-from io import StringIO, BytesIO
+import anyio
+from io import StringIO
 
-from config import MODEL_DIR
-from dtos import TransactionInput, TransactionOutput, Stats
-from model import FraudDetectionAPI
+from admission import AdmissionController, DeadlineExceeded, Overloaded, deadline_from_timeout_ms
+from bulk_scoring import clean_bulk_frame, missing_columns, read_bulk_csv, score_bulk_frame
+from config import (
+    MODEL_DIR,
+    WS_MAX_IN_FLIGHT,
+    ADMISSION_MAX_IN_FLIGHT,
+    ADMISSION_MAX_QUEUE,
+    ADMISSION_RETRY_AFTER_SECONDS,
+    UPLOAD_DIR,
+    UPLOAD_MAX_CHUNK_MB,
+    UPLOAD_TTL_HOURS,
+)
+from dtos import TransactionInput, TransactionOutput, Stats, UploadComplete, UploadCreate
+from live_stats import LiveStats
+from model_manager import ModelManager
+from memory_report import MemoryAccountant, RequestBuffers
+from profiler import RequestProfiler
+from startup_profile import profile
+from uploads import UploadError, UploadStore
 
 router = APIRouter()
 
-# Загружаем прод-модель
-fraud_detector = FraudDetectionAPI(MODEL_DIR)
+# Прод-модель: загрузка и прогрев — из lifespan (app.py) / мастера serve.py,
+# не при импорте; подменяется на лету через /admin/model/reload
+model_manager = ModelManager(MODEL_DIR)
+
+# Скользящие агрегаты живого трафика (/stats/live); bulk-выгрузки сюда не пишутся
+live_stats = LiveStats()
+
+
+def _observe_latency(queue_ms: float, service_ms: float):
+    # время в очереди и скоринга — сигналы уровня деградации (degradation.py)
+    model_manager.current.degradation.record(queue_ms, service_ms)
+
+
+# Admission control перед threadpool: ограниченные in-flight и очередь, дедлайны;
+# при ADMISSION_MAX_IN_FLIGHT=0 лимит берётся из бюджета потоков в lifespan
+admission = AdmissionController(
+    max_in_flight=ADMISSION_MAX_IN_FLIGHT,
+    max_queue=ADMISSION_MAX_QUEUE,
+    min_retry_after=ADMISSION_RETRY_AFTER_SECONDS,
+    observer=_observe_latency,
+)
+
+# cProfile для доли /predict-запросов (включается через /admin/profile/requests)
+request_profiler = RequestProfiler()
+
+# Буферы bulk-запросов в обработке и оценка памяти по компонентам (/stats/memory)
+request_buffers = RequestBuffers()
+memory_accountant = MemoryAccountant(request_buffers)
+
+# Сессии resumable-загрузок на диске (общие для всех воркеров serve.py)
+upload_store = UploadStore(
+    UPLOAD_DIR,
+    max_chunk_bytes=int(UPLOAD_MAX_CHUNK_MB * 1024 * 1024),
+    ttl_seconds=UPLOAD_TTL_HOURS * 3600,
+)
+
+
+async def _run_scoring(
+    func,
+    *args,
+    limiter: Optional[anyio.CapacityLimiter] = None,
+    deadline: Optional[float] = None,
+    profiled: bool = False,
+    rows: int = 1,
+):
+    """
+    Единая точка запуска скоринга: REST- и WebSocket-эндпоинты
+    исполняются в одном и том же threadpool (размер — thread_budget.py)
+    и проходят admission control (Overloaded / DeadlineExceeded).
+    limiter — отдельная полоса (bulk), не занимающая слоты общего пула.
+    profiled — запрос может попасть в выборку cProfile (request_profiler).
+    rows — число транзакций в запросе: сигнал деградации — время на одну.
+    """
+    if limiter is not None:
+        return await anyio.to_thread.run_sync(functools.partial(func, *args), limiter=limiter)
+
+    def guarded(check_deadline):
+        # дедлайн мог истечь, пока задача ждала свободный поток
+        check_deadline()
+        if profiled:
+            return request_profiler.call(func, *args)
+        return func(*args)
+
+    return await admission.run(
+        lambda check_deadline: run_in_threadpool(guarded, check_deadline),
+        deadline,
+        rows,
+    )
+
+
+def _admission_http_error(e: Exception) -> HTTPException:
+    if isinstance(e, Overloaded):
+        return HTTPException(
+            status_code=503,
+            detail=str(e),
+            headers={"Retry-After": str(e.retry_after)},
+        )
+    return HTTPException(status_code=504, detail=str(e))
 
 
 @router.post("/predict", response_model=TransactionOutput)
-async def predict_fraud(transaction: TransactionInput):
-    """Предсказывает фрод по одной транзакции (online-режим)."""
+async def predict_fraud(
+    transaction: TransactionInput,
+    idempotency_key: Optional[str] = Header(default=None, alias="Idempotency-Key"),
+    timeout_ms: Optional[float] = Header(default=None, alias="X-Request-Timeout-Ms"),
+):
+    """
+    Предсказывает фрод по одной транзакции (online-режим).
+    Повтор с тем же id транзакции или Idempotency-Key отдаёт сохранённый результат.
+    X-Request-Timeout-Ms — бюджет запроса: не успели начать скоринг — 504.
+    Очередь переполнена — 503 с Retry-After.
+    """
     try:
-        result = await run_in_threadpool(
-            fraud_detector.predict_single_transaction,
+        started = time.perf_counter()
+        replayed: List[bool] = []
+        result = await _run_scoring(
+            functools.partial(model_manager.current.predict_single_transaction, replayed_out=replayed),
             transaction,
+            None,
+            idempotency_key,
+            deadline=deadline_from_timeout_ms(timeout_ms),
+            profiled=True,
         )
+        # повтор из кэша идемпотентности уже учтён при первом скоринге
+        if not replayed[0]:
+            live_stats.record_output(result, (time.perf_counter() - started) * 1000)
         return result
+    except (Overloaded, DeadlineExceeded) as e:
+        raise _admission_http_error(e)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
 @router.post("/predict/batch", response_model=List[TransactionOutput])
-async def predict_batch(transactions: List[TransactionInput]):
+async def predict_batch(
+    transactions: List[TransactionInput],
+    timeout_ms: Optional[float] = Header(default=None, alias="X-Request-Timeout-Ms"),
+):
     """Предсказывает фрод по списку транзакций (JSON batch)."""
     try:
-        result = await run_in_threadpool(
-            fraud_detector.predict_batch,
+        replayed: List[bool] = []
+        result = await _run_scoring(
+            functools.partial(model_manager.current.predict_batch, replayed_out=replayed),
             transactions,
+            deadline=deadline_from_timeout_ms(timeout_ms),
+            rows=len(transactions),
         )
+        for output, is_replay in zip(result, replayed):
+            if not is_replay:
+                live_stats.record_output(output)
         return result
+    except (Overloaded, DeadlineExceeded) as e:
+        raise _admission_http_error(e)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@router.websocket("/ws/predict")
+async def predict_ws(websocket: WebSocket):
+    """
+    Постоянный канал скоринга для клиентов с низкой задержкой.
+
+    Клиент держит одно соединение и шлёт сообщения вида
+      {"id": "<correlation id>", "transaction": {...TransactionInput...}, "timeout_ms": 50}
+    (timeout_ms опционален — как заголовок X-Request-Timeout-Ms у /predict;
+    сообщение можно слать и бинарным кадром — тот же JSON в utf-8)
+
+    Ответ приходит, как только готов скоринг (порядок не гарантирован):
+      {"id": "<correlation id>", "ok": true,  "result": {...TransactionOutput...}}
+      {"id": "<correlation id>", "ok": false, "error": "..."}
+      {"id": "<correlation id>", "ok": false, "error": "...", "retry_after": 1}  — перегрузка
+    """
+    await websocket.accept()
+
+    send_lock = asyncio.Lock()
+    in_flight = asyncio.Semaphore(WS_MAX_IN_FLIGHT)
+    pending: Set[asyncio.Task] = set()
+
+    async def send_reply(reply: dict):
+        async with send_lock:
+            try:
+                await websocket.send_json(reply)
+            except (WebSocketDisconnect, RuntimeError):
+                # клиент уже отключился — ответ некуда отправлять
+                pass
+
+    async def handle(corr_id, payload, deadline):
+        try:
+            transaction = TransactionInput.model_validate(payload)
+            started = time.perf_counter()
+            replayed: List[bool] = []
+            result = await _run_scoring(
+                functools.partial(model_manager.current.predict_single_transaction, replayed_out=replayed),
+                transaction,
+                deadline=deadline,
+            )
+            if not replayed[0]:
+                live_stats.record_output(result, (time.perf_counter() - started) * 1000)
+            reply = {
+                "id": corr_id,
+                "ok": True,
+                "result": result.model_dump(mode="json"),
+            }
+        except Overloaded as e:
+            reply = {"id": corr_id, "ok": False, "error": str(e), "retry_after": e.retry_after}
+        except Exception as e:
+            reply = {"id": corr_id, "ok": False, "error": str(e)}
+        finally:
+            in_flight.release()
+
+        await send_reply(reply)
+
+    try:
+        while True:
+            frame = await websocket.receive()
+            if frame["type"] == "websocket.disconnect":
+                raise WebSocketDisconnect(frame.get("code", 1000))
+            # текстовый или бинарный кадр (JSON в utf-8) — разбираются одинаково
+            raw = frame.get("text")
+            if raw is None:
+                raw = frame.get("bytes")
+            try:
+                message = json.loads(raw)
+                corr_id = message.get("id")
+                payload = message["transaction"]
+                deadline = deadline_from_timeout_ms(message.get("timeout_ms"))
+            except (ValueError, AttributeError, KeyError, TypeError):
+                await send_reply({
+                    "id": None,
+                    "ok": False,
+                    "error": "Ожидается JSON вида {\"id\": ..., \"transaction\": {...}}",
+                })
+                continue
+
+            # backpressure: не читаем новые сообщения, пока соединение
+            # держит WS_MAX_IN_FLIGHT незавершённых скорингов
+            await in_flight.acquire()
+            task = asyncio.create_task(handle(corr_id, payload, deadline))
+            pending.add(task)
+            task.add_done_callback(pending.discard)
+    except WebSocketDisconnect:
+        pass
+    finally:
+        for task in pending:
+            task.cancel()
+
+
 @router.post("/bulk_predict", response_class=Response)
-async def bulk_predict(file: UploadFile = File(...)):
+async def bulk_predict(
+    file: UploadFile = File(...),
+    explain: bool = False,
+    explain_top_k: int = Query(default=5, ge=1, le=20),
+    explain_min_score: Optional[float] = Query(default=None, ge=0.0, le=1.0),
+):
     """
     Batch-режим для data scientist'ов:
-    принимает CSV, прогоняет через модель и возвращает CSV с колонками:
+    принимает CSV, прогоняет через модель и возвращает CSV с колонками
+    (большие файлы — кусками через /uploads, см. uploads.py):
       - fraud_score      (вероятность фрода)
       - prediction       (0/1)
       - risk_level       (низкий/средний/высокий)
@@ -57,109 +292,59 @@ async def bulk_predict(file: UploadFile = File(...)):
       - score_lightgbm
       - anomaly_score
 
+    explain=true — ещё top{i}_feature / top{i}_shap (i = 1..explain_top_k):
+    SHAP CatBoost всей матрицей, а не построчно; explain_min_score — только
+    для строк с fraud_score не ниже порога. Время скоринга и объяснений —
+    в заголовках X-Scoring-Seconds / X-Explain-Seconds.
+
     Ожидаемые колонки во входном файле:
       cst_dim_id, amount, direction, transdatetime
 
     Поддерживаются:
       • обычные utf-8 csv (разделитель по умолчанию)
-      • исходный банковский csv в cp1251 с разделителем ';' и skiprows=1.
+      • исходный банковский csv в cp1251 с разделителем ';' и skiprows=1
+      (диалект определяется по образцу, файл разбирается один раз — ingest.py).
     """
+    buffer = None
     try:
         contents = await file.read()
+        # тело и DataFrame живут до ответа — учитываются в /stats/memory
+        buffer = request_buffers.acquire(len(contents))
+        # один проход pyarrow (многопоточный) — вне event loop
+        df, ingest_report = await run_in_threadpool(read_bulk_csv, contents)
+        print(f"[Ingest] /bulk_predict: {ingest_report}")
+        request_buffers.add(buffer, int(df.memory_usage(index=False).sum()))
 
-        # 1) сначала пробуем как utf-8
-        try:
-            s = contents.decode("utf-8")
-            df = pd.read_csv(StringIO(s))
-        except UnicodeDecodeError:
-            # 2) fallback — банковский формат cp1251 + ';' + skiprows=1
-            df = pd.read_csv(
-                BytesIO(contents),
-                encoding="cp1251",
-                sep=";",
-                skiprows=1,
-                low_memory=False,
-            )
-
-        required_cols = {"cst_dim_id", "amount", "direction", "transdatetime"}
-        missing = required_cols - set(df.columns)
+        missing = missing_columns(df)
         if missing:
             raise HTTPException(
                 status_code=400,
                 detail=(
                     "Отсутствуют обязательные колонки: "
-                    f"{', '.join(sorted(missing))}"
+                    f"{', '.join(missing)}"
                 ),
             )
 
-        # ---- Приведение типов и очистка ----
-        # cst_dim_id -> число
-        df["cst_dim_id"] = pd.to_numeric(df["cst_dim_id"], errors="coerce")
-
-        # amount как в твоём пайплайне (убрать кавычки, пробелы, запятые)
-        df["amount"] = (
-            df["amount"]
-            .astype(str)
-            .str.replace('"', "", regex=False)
-            .str.replace(",", ".", regex=False)
-            .str.replace(" ", "", regex=False)
-        )
-        df["amount"] = pd.to_numeric(df["amount"], errors="coerce")
-
-        # direction и transdatetime как строки
-        df["direction"] = df["direction"].astype(str)
-        df["transdatetime"] = df["transdatetime"].astype(str)
-
-        # выкидываем строки, где что-то критично пропало
-        df_before = len(df)
-        df = df.dropna(
-            subset=["cst_dim_id", "amount", "direction", "transdatetime"]
-        ).reset_index(drop=True)
-        df_after = len(df)
-
-        if df_after == 0:
+        df = clean_bulk_frame(df)
+        if len(df) == 0:
             raise HTTPException(
                 status_code=400,
                 detail="После очистки данных не осталось ни одной валидной строки (все с NaN / пустыми полями).",
             )
 
-        # ---- Собираем TransactionInput ----
-        transactions: List[TransactionInput] = []
-        for row in df.itertuples(index=False):
-            trans = TransactionInput(
-                cst_dim_id=int(getattr(row, "cst_dim_id")),
-                amount=float(getattr(row, "amount")),
-                direction=str(getattr(row, "direction")),
-                # важно: строка, чтобы Pydantic не ругался
-                transdatetime=str(getattr(row, "transdatetime")),
-                # если TransactionInput описывает id/target/behavioral_patterns — можно дополнительно мапнуть
-            )
-            transactions.append(trans)
-
-        # ---- Предсказание пачкой ----
-        outputs: List[TransactionOutput] = await run_in_threadpool(
-            fraud_detector.predict_batch,
-            transactions,
+        # ---- Предсказание пачкой (сборка записей — тоже в bulk-полосе) ----
+        detector = model_manager.current
+        df = await _run_scoring(
+            score_bulk_frame,
+            detector,
+            df,
+            explain,
+            explain_top_k,
+            explain_min_score,
+            limiter=detector.thread_budget.bulk_limiter,
         )
-
-        # ---- Добавляем результаты в DataFrame ----
-        df["fraud_score"] = [o.fraud_probability for o in outputs]
-        df["prediction"] = [1 if o.is_fraud else 0 for o in outputs]
-        df["risk_level"] = [o.risk_level for o in outputs]
-        df["model_version"] = [o.model_version for o in outputs]
-        df["threshold_used"] = [o.threshold_used for o in outputs]
-        df["score_catboost"] = [
-            o.individual_scores.catboost for o in outputs
-        ]
-        df["score_xgboost"] = [
-            o.individual_scores.xgboost for o in outputs
-        ]
-        df["score_lightgbm"] = [
-            o.individual_scores.lightgbm for o in outputs
-        ]
-        df["anomaly_score"] = [
-            o.individual_scores.anomaly for o in outputs
-        ]
+        timings = df.attrs["timings"]
+        print(f"[Bulk] {timings}")
 
         # ---- Конвертация обратно в CSV ----
         csv_buffer = StringIO()
@@ -170,7 +355,10 @@ async def bulk_predict(file: UploadFile = File(...)):
             content=csv_result,
             media_type="text/csv",
             headers={
-                "Content-Disposition": "attachment; filename=result_with_scores.csv"
+                "Content-Disposition": "attachment; filename=result_with_scores.csv",
+                "X-Ingest-Rows-Per-Sec": str(ingest_report["rows_per_sec"]),
+                "X-Scoring-Seconds": str(timings["scoring_seconds"]),
+                "X-Explain-Seconds": str(timings["explain_seconds"]),
             },
         )
 
@@ -178,23 +366,233 @@ async def bulk_predict(file: UploadFile = File(...)):
         raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        if buffer is not None:
+            request_buffers.release(buffer)
+
+
+# ----------------------------------------------------------------------
+#  Resumable загрузки для batch-скоринга (uploads.py)
+# ----------------------------------------------------------------------
+_upload_tasks: Set[asyncio.Task] = set()
+
+
+async def _drain_upload(upload_id: str):
+    """
+    Скорит готовые куски сессии, пока они есть. Кусок за куском через
+    bulk-полосу — параллельные загрузки и /bulk_predict чередуются.
+    flock и чтение курсора — файловые операции, тоже в потоках.
+    """
+    while True:
+        try:
+            lock = await run_in_threadpool(upload_store.try_lock, upload_id)
+        except FileNotFoundError:
+            return  # сессию удалили
+        if lock is None:
+            return  # скорит другая задача / другой воркер
+        try:
+            while await _run_scoring(
+                upload_store.score_next,
+                upload_id,
+                model_manager.current,
+                limiter=model_manager.current.thread_budget.bulk_limiter,
+            ):
+                pass
+        finally:
+            await run_in_threadpool(upload_store.unlock, lock)
+        # кусок мог прийти, пока lock был занят этой задачей
+        if not await run_in_threadpool(upload_store.has_pending, upload_id):
+            return
+
+
+def _schedule_upload_scoring(upload_id: str):
+    task = asyncio.create_task(_drain_upload(upload_id))
+    _upload_tasks.add(task)
+    task.add_done_callback(_upload_tasks.discard)
+
+
+def resume_upload_scoring():
+    """Продолжает скоринг сессий, прерванный рестартом (вызывается из lifespan)."""
+    for upload_id in upload_store.pending_uploads():
+        print(f"[Uploads] resuming scoring of {upload_id}")
+        _schedule_upload_scoring(upload_id)
+
+
+@router.post("/uploads", status_code=201)
+async def create_upload(body: UploadCreate):
+    """
+    Создаёт сессию resumable-загрузки CSV (формат — как у /bulk_predict).
+    Дальше: PUT /uploads/{id}/chunks/{index} → POST /uploads/{id}/complete.
+    """
+    try:
+        return await run_in_threadpool(
+            upload_store.create,
+            body.filename,
+            body.total_chunks,
+            {
+                "explain": body.explain,
+                "explain_top_k": body.explain_top_k,
+                "explain_min_score": body.explain_min_score,
+            },
+        )
+    except UploadError as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
+
+
+@router.put("/uploads/{upload_id}/chunks/{index}")
+async def upload_chunk(
+    upload_id: str,
+    index: int,
+    request: Request,
+    chunk_sha256: Optional[str] = Header(default=None, alias="X-Chunk-SHA256"),
+):
+    """
+    Кусок файла с номером index (с 0) — сырые байты в теле запроса.
+    Куски можно слать параллельно и повторять; X-Chunk-SHA256 — проверка
+    целостности. Готовый префикс кусков сразу уходит в скоринг.
+    """
+    try:
+        result = await upload_store.write_chunk(upload_id, index, request.stream(), chunk_sha256)
+    except UploadError as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
+    _schedule_upload_scoring(upload_id)
+    return result
+
+
+@router.get("/uploads/{upload_id}")
+async def get_upload(upload_id: str):
+    """Принятые куски (с sha256), недостающие, прогресс скоринга."""
+    try:
+        return await run_in_threadpool(upload_store.status, upload_id)
+    except UploadError as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
+
+
+@router.post("/uploads/{upload_id}/complete", status_code=202)
+async def complete_upload(upload_id: str, body: Optional[UploadComplete] = None):
+    """
+    Закрывает загрузку (все куски 0..total_chunks-1 приняты) — скоринг
+    дорабатывает хвост; готовность — scoring.status == "done" в GET /uploads/{id}.
+    """
+    try:
+        result = await run_in_threadpool(
+            upload_store.complete,
+            upload_id,
+            body.total_chunks if body else None,
+        )
+    except UploadError as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
+    _schedule_upload_scoring(upload_id)
+    return result
+
+
+@router.get("/uploads/{upload_id}/result")
+async def get_upload_result(upload_id: str):
+    """CSV с колонками скоринга, как у /bulk_predict."""
+    try:
+        path = await run_in_threadpool(upload_store.result_path, upload_id)
+    except UploadError as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
+    return FileResponse(path, media_type="text/csv", filename="result_with_scores.csv")
+
+
+@router.delete("/uploads/{upload_id}")
+async def delete_upload(upload_id: str):
+    try:
+        await run_in_threadpool(upload_store.delete, upload_id)
+    except UploadError as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
+    return {"deleted": upload_id}
 
 
 @router.get("/stats", response_model=Stats)
 async def get_stats():
     """Get model statistics (features, threshold, history size)."""
     try:
-        result = await run_in_threadpool(fraud_detector.get_stats)
+        result = await run_in_threadpool(model_manager.current.get_stats)
         return result
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@router.get("/stats/admission")
+async def get_admission_stats():
+    """
+    Admission control: in-flight / очередь, сброшенные запросы
+    (очередь полна, дедлайн истёк в очереди / перед стартом), время в очереди.
+    """
+    return {
+        **admission.stats(),
+        "degradation_level": model_manager.current.degradation.level,
+    }
+
+
+@router.get("/stats/drift")
+def get_drift_stats(
+    window: str = Query(default="current", pattern="^(current|previous|total)$"),
+    top: int = Query(default=20, ge=1, le=200),
+):
+    """
+    Дрейф признаков и скоров против референса модели: PSI / KS по колонкам
+    (по убыванию PSI; > 0.1 — moderate, > 0.25 — significant) и доля
+    алертов против fraud_rate обучения. window: current / previous / total.
+    """
+    return model_manager.current.drift.report(window, top)
+
+
+@router.get("/stats/memory")
+def get_memory_stats():
+    """
+    Оценка памяти воркера по компонентам: история (клиенты, записи,
+    байт на запись), модели, энкодеры, SHAP explainer, граф direction,
+    кэш идемпотентности, дрейф, буферы bulk-запросов; RSS и неучтённый
+    остаток. Размеры моделей замеряются один раз на модель — дёшево
+    для регулярного опроса.
+    """
+    return memory_accountant.report(model_manager.current)
+
+
+@router.get("/stats/live")
+def get_live_stats():
+    """
+    Скользящие агрегаты живого трафика за 1m / 15m / 1h:
+    risk_level, гистограмма вероятностей, частоты алертов, квантили задержки.
+    Дёшево для частого опроса дашбордами.
+    """
+    return {
+        "model_version": model_manager.current.model_pkg.get("version", "unknown"),
+        "total_scored": live_stats.total,
+        "windows": live_stats.snapshot(),
+    }
+
+
 @router.get("/health")
 def health_check():
-    """Health check для модели."""
+    """Health check для модели: живость процесса и загруженные компоненты."""
     return {
         "status": "ok",
-        "stats": fraud_detector.get_stats().model_dump(),
+        "ready": model_manager.ready,
+        "components": model_manager.current.components() if model_manager.current else {"models": "pending"},
+        "stats": model_manager.current.get_stats().model_dump() if model_manager.current else None,
+    }
+
+
+@router.get("/ready")
+async def readiness_check(response: Response):
+    """
+    Readiness-проба: 200, когда модель загружена и прогрета, иначе 503.
+    SHAP для готовности не нужен — он догружается в фоне.
+    """
+    if not model_manager.ready:
+        response.status_code = 503
+    return {
+        "ready": model_manager.ready,
+        "components": model_manager.current.components() if model_manager.current else {"models": "pending"},
     }
+
+
+@router.get("/stats/startup")
+async def get_startup_profile():
+    """Профиль холодного старта: импорты тяжёлых библиотек, фазы, вехи."""
+    return profile.report()
     
\ No newline at end of file
@@ -0,0 +1,280 @@
+"""
+Прод-запуск с prefork и copy-on-write разделением модели.
+
+    python serve.py --port 8000                 # один воркер (по умолчанию)
+    python serve.py --workers 16 --port 8000    # несколько — opt-in, см. ниже
+
+Мастер-процесс один раз импортирует приложение и распаковывает
+model_package.pkl, SHAP-эксплейнер, историю (ModelManager.load), делает gc.collect() +
+gc.freeze(), чтобы сборщик мусора не трогал заголовки этих объектов
+и не «пачкал» разделяемые страницы, затем открывает сокет и форкает
+N воркеров. Каждый воркер — обычный uvicorn.Server на общем сокете.
+
+Мастер следит за воркерами и перезапускает упавших: воркер, упавший
+быстрее QUICK_EXIT_SECONDS после старта, перезапускается с
+экспоненциальной паузой (0.5 с, 1 с, 2 с … до 30 с), после
+--max-quick-restarts таких падений подряд мастер останавливает всех и
+выходит с ошибкой (traceback воркера — в его stderr). Раз в
+--report-interval секунд печатает память по каждому из них:
+уникальную (Private_*), разделяемую (Shared_*) и PSS из
+/proc/<pid>/smaps_rollup.
+
+Под serve.py по умолчанию LAZY_HEAVY_IMPORTS=0: shap и ядро numba
+грузятся в мастере до форка и общие для всех воркеров (с
+LAZY_HEAVY_IMPORTS=1 каждый воркер грузил бы свою копию). Модели в
+мастере не вызываются — прогрев (и первый SHAP) делает каждый воркер
+в lifespan: пулы потоков CatBoost / OpenMP, созданные до fork, в
+дочерних процессах могут зависнуть. /ready воркера — 503 до прогрева.
+
+По умолчанию воркер один (--workers / WEB_CONCURRENCY, иначе 1). Всё
+живое состояние — в памяти процесса, после форка у каждого воркера своя
+копия, а балансировщик ядра раскидывает запросы без учёта cst_dim_id.
+При нескольких воркерах деградирует:
+  • история клиента и фичи по ней (velocity, окна 1/7/30 дней,
+    поведенческие) — воркер видит только свою долю транзакций клиента;
+  • граф direction (in/out-degree, pair_count) — тоже доля рёбер;
+  • идемпотентность: повтор, попавший в другой воркер, скорится заново
+    и второй раз пишется в историю;
+  • /stats/live, /stats/drift, /stats/admission, деградация — срез
+    одного случайного воркера.
+Несколько воркеров имеют смысл, только если запросы одного клиента
+приходят в один процесс (маршрутизация по cst_dim_id перед сервисом)
+или важна пропускная способность, а не точность этих фичей. Фоновые
+потоки (чистка истории) мастер не запускает — каждый воркер стартует
+свои в lifespan.
+/admin/model/reload и /admin/shadow действуют во всех воркерах: изменение публикуется
+в FLEET_DIR (по умолчанию — временный каталог мастера; очищается при
+старте и выходе мастера), остальные воркеры применяют его в течение
+FLEET_POLL_SECONDS (fleet.py).
+app.py с reload=True остаётся режимом разработки.
+"""
+
+import argparse
+import gc
+import os
+import signal
+import shutil
+import socket
+import sys
+import tempfile
+import time
+import traceback
+from typing import Dict, Optional
+
+# воркер, проживший меньше, считается упавшим при старте
+QUICK_EXIT_SECONDS = 10.0
+_BACKOFF_BASE_SECONDS = 0.5
+_BACKOFF_MAX_SECONDS = 30.0
+
+
+# ----------------------------------------------------------------------
+#  Память процессов
+# ----------------------------------------------------------------------
+def read_memory(pid: int) -> Optional[Dict[str, int]]:
+    """
+    Память процесса в байтах: rss, pss, unique (Private_*) и shared (Shared_*).
+    None, если /proc недоступен (не Linux) или процесс завершился.
+    """
+    fields = {}
+    try:
+        with open(f"/proc/{pid}/smaps_rollup") as f:
+            for line in f:
+                parts = line.split()
+                if len(parts) >= 3 and parts[-1] == "kB":
+                    fields[parts[0].rstrip(":")] = int(parts[1]) * 1024
+    except OSError:
+        return None
+
+    return {
+        "rss": fields.get("Rss", 0),
+        "pss": fields.get("Pss", 0),
+        "unique": fields.get("Private_Clean", 0) + fields.get("Private_Dirty", 0),
+        "shared": fields.get("Shared_Clean", 0) + fields.get("Shared_Dirty", 0),
+    }
+
+
+def memory_report(master_pid: int, workers: Dict[int, int]) -> str:
+    mb = 1024 * 1024
+    lines = [f"{'process':<12}{'pid':>8}{'rss MB':>10}{'pss MB':>10}{'unique MB':>11}{'shared MB':>11}"]
+    total_pss = 0
+    total_unique = 0
+
+    rows = [("master", master_pid)] + [(f"worker-{i}", pid) for pid, i in sorted(workers.items(), key=lambda x: x[1])]
+    for name, pid in rows:
+        mem = read_memory(pid)
+        if mem is None:
+            continue
+        total_pss += mem["pss"]
+        total_unique += mem["unique"]
+        lines.append(
+            f"{name:<12}{pid:>8}{mem['rss'] / mb:>10.1f}{mem['pss'] / mb:>10.1f}"
+            f"{mem['unique'] / mb:>11.1f}{mem['shared'] / mb:>11.1f}"
+        )
+    lines.append(f"total PSS: {total_pss / mb:.1f} MB, total unique: {total_unique / mb:.1f} MB")
+    return "\n".join(lines)
+
+
+# ----------------------------------------------------------------------
+#  Prefork
+# ----------------------------------------------------------------------
+def _bind_socket(host: str, port: int, backlog: int) -> socket.socket:
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(backlog)
+    sock.set_inheritable(True)
+    return sock
+
+
+def _run_worker(app, sock: socket.socket, index: int, args):
+    import uvicorn
+
+    # сигналы мастера воркеру не нужны — uvicorn ставит свои
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+
+    config = uvicorn.Config(
+        app,
+        log_level=args.log_level,
+        timeout_keep_alive=args.keep_alive,
+        lifespan="on",
+    )
+    server = uvicorn.Server(config)
+    print(f"[serve] worker-{index} pid={os.getpid()} started")
+    server.run(sockets=[sock])
+    os._exit(0)
+
+
+def _spawn(app, sock, index: int, args) -> int:
+    pid = os.fork()
+    if pid == 0:
+        try:
+            _run_worker(app, sock, index, args)
+        except BaseException:
+            print(f"[serve] worker-{index} pid={os.getpid()} crashed:", file=sys.stderr)
+            traceback.print_exc()
+        finally:
+            # os._exit не сбрасывает буферы — иначе traceback и логи теряются
+            sys.stdout.flush()
+            sys.stderr.flush()
+            os._exit(1)
+    return pid
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Brutal Fraud Shield — prefork production server")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    # несколько воркеров — opt-in: состояние не общее (см. docstring)
+    parser.add_argument("--workers", type=int, default=int(os.getenv("WEB_CONCURRENCY", "1")))
+    parser.add_argument("--backlog", type=int, default=2048)
+    parser.add_argument("--keep-alive", type=int, default=5, help="uvicorn timeout_keep_alive, сек")
+    parser.add_argument("--log-level", default="info")
+    parser.add_argument("--report-interval", type=float, default=60.0, help="период отчёта о памяти, сек (0 — выкл.)")
+    parser.add_argument(
+        "--max-quick-restarts", type=int, default=5,
+        help=f"сколько падений воркера подряд быстрее {QUICK_EXIT_SECONDS:.0f} с до остановки сервера",
+    )
+    args = parser.parse_args()
+
+    if not hasattr(os, "fork"):
+        sys.exit("serve.py requires os.fork (Linux/macOS); use `uvicorn app:app` elsewhere")
+
+    # 1) Загружаем модель один раз в мастере (без вызовов моделей);
+    #    shap — тоже здесь, общими страницами, если не задано иначе
+    os.environ.setdefault("LAZY_HEAVY_IMPORTS", "0")
+    # общее состояние воркеров: /admin/model/reload и /admin/shadow действуют во всех
+    fleet_dir = os.environ.setdefault("FLEET_DIR", os.path.join(tempfile.gettempdir(), f"brutal-fleet-{os.getpid()}"))
+    t0 = time.perf_counter()
+    from app import app
+    from router import model_manager
+
+    from fleet import FleetControl
+
+    FleetControl(fleet_dir).reset()
+    model_manager.load()
+    print(f"[serve] app loaded in master in {time.perf_counter() - t0:.1f}s")
+
+    # 2) Замораживаем всё, что уже создано: GC воркеров не будет обходить
+    #    эти объекты и переписывать их страницы (copy-on-write остаётся общим)
+    gc.collect()
+    gc.freeze()
+    print(f"[serve] gc.freeze(): {gc.get_freeze_count()} objects moved to permanent generation")
+
+    sock = _bind_socket(args.host, args.port, args.backlog)
+    print(f"[serve] listening on {args.host}:{args.port}, workers={args.workers}")
+
+    workers: Dict[int, int] = {}  # pid → index
+    started: Dict[int, float] = {}  # index → время старта
+    quick_failures: Dict[int, int] = {}  # index → быстрых падений подряд
+    respawn_at: Dict[int, float] = {}  # index → когда перезапустить
+
+    def _start(index: int):
+        workers[_spawn(app, sock, index, args)] = index
+        started[index] = time.monotonic()
+
+    for i in range(args.workers):
+        _start(i)
+
+    stopping = False
+    failed = False
+
+    def _stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in list(workers):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, _stop)
+    signal.signal(signal.SIGINT, _stop)
+
+    next_report = time.monotonic() + args.report_interval if args.report_interval > 0 else None
+    while workers or (respawn_at and not stopping):
+        now = time.monotonic()
+        for index, due in list(respawn_at.items()):
+            if stopping:
+                respawn_at.clear()
+            elif now >= due:
+                del respawn_at[index]
+                _start(index)
+
+        try:
+            pid, status = os.waitpid(-1, os.WNOHANG) if workers else (0, 0)
+        except ChildProcessError:
+            break
+
+        if pid:
+            index = workers.pop(pid, None)
+            if index is not None and not stopping:
+                if now - started[index] < QUICK_EXIT_SECONDS:
+                    quick_failures[index] = quick_failures.get(index, 0) + 1
+                else:
+                    quick_failures[index] = 0
+                failures = quick_failures[index]
+                if failures > args.max_quick_restarts:
+                    print(f"[serve] worker-{index} pid={pid} exited ({status}) {failures} times in a row "
+                          f"within {QUICK_EXIT_SECONDS:.0f}s of start, giving up", flush=True)
+                    failed = True
+                    _stop(signal.SIGTERM, None)
+                    continue
+                delay = min(_BACKOFF_BASE_SECONDS * 2 ** (failures - 1), _BACKOFF_MAX_SECONDS) if failures else 0.0
+                print(f"[serve] worker-{index} pid={pid} exited ({status}), restarting in {delay:.1f}s", flush=True)
+                respawn_at[index] = now + delay
+            continue
+
+        if next_report is not None and time.monotonic() >= next_report:
+            print(memory_report(os.getpid(), workers), flush=True)
+            next_report = time.monotonic() + args.report_interval
+        time.sleep(0.5)
+
+    sock.close()
+    shutil.rmtree(fleet_dir, ignore_errors=True)
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,222 @@
+"""
+Shadow-скоринг модели-кандидата на живом трафике.
+
+Живой путь кладёт уже посчитанный вектор признаков в ограниченную
+очередь (put_nowait) и сразу отвечает клиенту. Фоновый поток
+скорит кандидата пачками и копит статистику расхождений и задержек.
+Очередь полна — элемент выбрасывается и считается в dropped:
+shadow-нагрузка никогда не тормозит основной путь.
+"""
+
+import queue
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+import joblib
+import numpy as np
+import pandas as pd
+
+from fast_iforest import make_anomaly_scorer
+from thread_budget import ThreadBudget
+
+
+def _quantiles(values, qs=(0.5, 0.95, 0.99)) -> Dict[str, float]:
+    if not values:
+        return {}
+    arr = np.fromiter(values, dtype=float)
+    return {f"p{int(q * 100)}": float(np.quantile(arr, q)) for q in qs}
+
+
+class ShadowScorer:
+    """
+    Кандидат из model_package.pkl, который считается вне пути запроса.
+    """
+
+    def __init__(
+        self,
+        model_path: str,
+        queue_size: int = 1000,
+        max_batch: int = 64,
+        thread_budget: Optional[ThreadBudget] = None,
+    ):
+        pkg = joblib.load(model_path)
+        self.model_path = model_path
+        self.version = pkg.get("version", "unknown")
+        self.iso = make_anomaly_scorer(pkg["iso"])
+        self.catboost = pkg["catboost"]
+        self.xgboost = pkg["xgboost"]
+        self.lightgbm = pkg["lightgbm"]
+        self.weights = pkg["ensemble_weights"]
+        self.threshold = pkg["threshold"]
+        self.feature_cols = pkg["feature_cols"]
+        self.max_batch = max_batch
+        # фоновый скоринг не должен отбирать ядра у живого пути — профиль latency
+        self.thread_budget = thread_budget
+        if thread_budget is not None:
+            thread_budget.prepare(self.xgboost)
+
+        self._queue: "queue.Queue" = queue.Queue(maxsize=queue_size)
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+
+        self.started_at = datetime.now()
+        self.submitted = 0
+        self.dropped = 0
+        self.scored = 0
+        self.errors = 0
+        self.last_error = None
+        self.disagreements = 0
+        self.flips_to_fraud = 0    # live: не фрод, кандидат: фрод
+        self.flips_to_legit = 0    # live: фрод, кандидат: не фрод
+        self.sum_abs_diff = 0.0
+        self.max_abs_diff = 0.0
+        self.live_fraud = 0
+        self.shadow_fraud = 0
+        # последние значения для квантилей (память ограничена)
+        self._score_ms = deque(maxlen=4096)
+        self._lag_ms = deque(maxlen=4096)
+
+        self._thread = threading.Thread(target=self._worker, name="shadow-scorer", daemon=True)
+        self._thread.start()
+
+    # ------------------------------------------------------------------
+    #  Горячий путь: только put_nowait
+    # ------------------------------------------------------------------
+    def submit(self, row: np.ndarray, columns: List[str], live_prob: float, live_is_fraud: bool):
+        """
+        Ставит вектор признаков живого запроса (columns — model_columns
+        живой модели) в очередь кандидату. DataFrame собирает фоновый
+        поток; row после вызова не должен изменяться вызывающей стороной.
+        """
+        try:
+            self._queue.put_nowait((row, columns, float(live_prob), bool(live_is_fraud), time.perf_counter()))
+            with self._lock:
+                self.submitted += 1
+        except queue.Full:
+            with self._lock:
+                self.dropped += 1
+
+    # ------------------------------------------------------------------
+    #  Фоновый поток
+    # ------------------------------------------------------------------
+    def _worker(self):
+        while not self._stopped.is_set():
+            try:
+                items = [self._queue.get(timeout=0.5)]
+            except queue.Empty:
+                continue
+            while len(items) < self.max_batch:
+                try:
+                    items.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            try:
+                self._score(items)
+            except Exception as e:
+                with self._lock:
+                    self.errors += len(items)
+                    self.last_error = str(e)
+
+    def _score(self, items):
+        t0 = time.perf_counter()
+
+        columns = items[0][1]
+        if all(item[1] is columns for item in items):
+            X = pd.DataFrame(np.vstack([item[0] for item in items]), columns=columns)
+        else:
+            # живую модель перезагрузили посреди пачки — наборы колонок разные
+            X = pd.concat(
+                [pd.DataFrame(item[0][None, :], columns=item[1]) for item in items], ignore_index=True,
+            )
+        X = X[self.feature_cols].copy()
+        X["anomaly_score"] = -self.iso.decision_function(X)
+
+        budget = self.thread_budget
+        if budget is not None:
+            p_cat = budget.predict_proba("catboost", self.catboost, X, "latency")
+            p_xgb = budget.predict_proba("xgboost", self.xgboost, X, "latency")
+            p_lgb = budget.predict_proba("lightgbm", self.lightgbm, X, "latency")
+        else:
+            p_cat = self.catboost.predict_proba(X)[:, 1]
+            p_xgb = self.xgboost.predict_proba(X)[:, 1]
+            p_lgb = self.lightgbm.predict_proba(X)[:, 1]
+        probs = self.weights[0] * p_cat + self.weights[1] * p_xgb + self.weights[2] * p_lgb
+
+        done = time.perf_counter()
+        per_item_ms = (done - t0) * 1000 / len(items)
+
+        with self._lock:
+            for (_, _, live_prob, live_is_fraud, enqueued_at), prob in zip(items, probs):
+                shadow_is_fraud = bool(prob >= self.threshold)
+                diff = abs(float(prob) - live_prob)
+
+                self.scored += 1
+                self.sum_abs_diff += diff
+                self.max_abs_diff = max(self.max_abs_diff, diff)
+                self.live_fraud += live_is_fraud
+                self.shadow_fraud += shadow_is_fraud
+                if shadow_is_fraud != live_is_fraud:
+                    self.disagreements += 1
+                    if shadow_is_fraud:
+                        self.flips_to_fraud += 1
+                    else:
+                        self.flips_to_legit += 1
+
+                self._score_ms.append(per_item_ms)
+                self._lag_ms.append((done - enqueued_at) * 1000)
+
+    # ------------------------------------------------------------------
+    def stop(self):
+        self._stopped.set()
+        self._thread.join(timeout=5)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            scored = self.scored
+            return {
+                "model_path": self.model_path,
+                "model_version": self.version,
+                "threshold": self.threshold,
+                "started_at": self.started_at.isoformat(timespec="seconds"),
+                "queue_size": self._queue.qsize(),
+                "queue_capacity": self._queue.maxsize,
+                "submitted": self.submitted,
+                "dropped": self.dropped,
+                "scored": scored,
+                "errors": self.errors,
+                "last_error": self.last_error,
+                "disagreements": self.disagreements,
+                "disagreement_rate": self.disagreements / scored if scored else 0.0,
+                "flips_to_fraud": self.flips_to_fraud,
+                "flips_to_legit": self.flips_to_legit,
+                "mean_abs_prob_diff": self.sum_abs_diff / scored if scored else 0.0,
+                "max_abs_prob_diff": self.max_abs_diff,
+                "live_fraud_rate": self.live_fraud / scored if scored else 0.0,
+                "shadow_fraud_rate": self.shadow_fraud / scored if scored else 0.0,
+                "score_ms": _quantiles(list(self._score_ms)),
+                "lag_ms": _quantiles(list(self._lag_ms)),
+            }
+
+
+_SUMMED = ("submitted", "dropped", "scored", "errors", "disagreements", "flips_to_fraud", "flips_to_legit")
+_WEIGHTED = ("mean_abs_prob_diff", "live_fraud_rate", "shadow_fraud_rate")
+
+
+def merge_stats(stats: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Сводка по кандидатам нескольких воркеров serve.py: счётчики
+    суммируются, доли и средние — взвешенно по scored. Квантили
+    задержек не сливаются — они остаются в статистике каждого воркера.
+    """
+    total: Dict[str, Any] = {key: sum(s[key] for s in stats) for key in _SUMMED}
+    scored = total["scored"]
+    total["disagreement_rate"] = total["disagreements"] / scored if scored else 0.0
+    for key in _WEIGHTED:
+        total[key] = sum(s[key] * s["scored"] for s in stats) / scored if scored else 0.0
+    total["max_abs_prob_diff"] = max((s["max_abs_prob_diff"] for s in stats), default=0.0)
+    total["model_versions"] = sorted({s["model_version"] for s in stats})
+    return total
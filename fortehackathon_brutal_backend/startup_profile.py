@@ -0,0 +1,96 @@
+"""
+Профиль холодного старта: время импорта тяжёлых библиотек и фаз запуска.
+
+Процесс импортирует этот модуль первым (app.py), дальше фазы отмечаются
+через profile.phase("...") / profile.timed_import("...") / profile.mark("...").
+Отчёт — GET /stats/startup; по нему видно, какая фаза съела время,
+и регрессии холодного старта между версиями.
+
+Отсчёт идёт от запуска процесса (/proc/self/stat), чтобы учесть и
+время интерпретатора до первого импорта; вне Linux — от импорта модуля.
+"""
+
+import importlib
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional
+
+
+def _process_age_seconds() -> Optional[float]:
+    """Сколько секунд назад стартовал процесс (Linux), иначе None."""
+    try:
+        with open("/proc/self/stat") as f:
+            # поле 22 — starttime в тиках с загрузки; comm может содержать пробелы
+            fields = f.read().rsplit(")", 1)[1].split()
+        start_ticks = int(fields[19])
+        with open("/proc/uptime") as f:
+            uptime = float(f.read().split()[0])
+        return max(uptime - start_ticks / os.sysconf("SC_CLK_TCK"), 0.0)
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+class StartupProfile:
+    """
+    Фазы, импорты и вехи старта с временем от запуска процесса, мс.
+    """
+
+    def __init__(self):
+        age = _process_age_seconds()
+        self._t0 = time.perf_counter() - (age or 0.0)
+        self.module_loaded_ms = self._now_ms()
+        self.modules_at_load = len(sys.modules)
+        self.phases: List[Dict[str, Any]] = []
+        self.imports: Dict[str, float] = {}
+        self.marks: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def _now_ms(self) -> float:
+        return (time.perf_counter() - self._t0) * 1000
+
+    @contextmanager
+    def phase(self, name: str):
+        start = self._now_ms()
+        try:
+            yield
+        finally:
+            end = self._now_ms()
+            with self._lock:
+                self.phases.append({
+                    "phase": name,
+                    "start_ms": round(start, 1),
+                    "duration_ms": round(end - start, 1),
+                    "thread": threading.current_thread().name,
+                })
+
+    def timed_import(self, module_name: str):
+        """Импорт с замером; уже импортированный модуль стоит ~0 мс."""
+        already = module_name in sys.modules
+        start = time.perf_counter()
+        module = importlib.import_module(module_name)
+        if not already:
+            with self._lock:
+                self.imports[module_name] = round((time.perf_counter() - start) * 1000, 1)
+        return module
+
+    def mark(self, name: str):
+        with self._lock:
+            self.marks.setdefault(name, round(self._now_ms(), 1))
+
+    def report(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "process_age_ms": round(self._now_ms(), 1),
+                "profile_module_loaded_ms": round(self.module_loaded_ms, 1),
+                "modules_loaded": len(sys.modules),
+                "modules_at_profile_start": self.modules_at_load,
+                "marks": dict(self.marks),
+                "imports_ms": dict(sorted(self.imports.items(), key=lambda kv: -kv[1])),
+                "phases": list(self.phases),
+            }
+
+
+profile = StartupProfile()
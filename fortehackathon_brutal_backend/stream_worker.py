@@ -0,0 +1,789 @@
+"""
+Потоковый скоринг без HTTP: воркер читает транзакции из потока событий,
+скорит их микро-батчами тем же FraudDetectionAPI и пишет результаты
+вместе с позицией в потоке.
+
+    python stream_worker.py run --source file:events.jsonl --sink results.jsonl
+    python stream_worker.py run --source redis://localhost:6379/0 --stream transactions --sink-stream fraud_scores
+    python stream_worker.py run --source local:./stream_data --stream transactions --sink-stream fraud_scores
+    python stream_worker.py produce --source local:./stream_data --stream transactions --csv transactions.csv
+
+Источники:
+  • file:PATH — append-only JSONL-файл (читается как tail -f) или FIFO;
+    позиция — байтовое смещение после строки;
+  • redis://… — Redis Stream (XREAD, пакет redis), позиция — id записи;
+  • local:DIR — локальная замена Redis (LocalStreamClient): потоки —
+    JSONL-файлы в каталоге, тот же набор команд XADD / XREAD / GET / SET.
+
+Событие — JSON-объект с полями TransactionInput (cst_dim_id, amount,
+direction, transdatetime, опционально id); в потоке — те же поля
+записи или одно поле "data" с JSON.
+
+Микро-батчи адаптивные: воркер берёт всё, что накопилось, но не больше
+batch_size; размер подстраивается так, чтобы батч скорился за
+target_batch_ms (под нагрузкой — крупнее, в тишине событие не ждёт
+соседей). Без новых событий источник ждёт idle_poll_ms.
+
+Результаты и позиция фиксируются вместе:
+  • --sink PATH — JSONL результатов + PATH.checkpoint.json; результаты
+    пишутся и fsync-аются до чекпойнта, а после рестарта строки за
+    чекпойнтом дочитываются — позиция берётся из последней целой строки,
+    недописанный хвост обрезается;
+  • --sink-stream NAME — XADD результатов и SET чекпойнта одной
+    транзакцией MULTI.
+Поэтому после рестарта воркер продолжает с позиции и ничего не скорит
+повторно.
+
+История клиентов — в памяти процесса; раз в STREAM_HISTORY_SNAPSHOT_SECONDS
+и при остановке её снимок сохраняется рядом с чекпойнтом (--history-snapshot,
+по умолчанию PATH.history.pkl). После рестарта история берётся из снимка,
+а события между снимком и чекпойнтом доигрываются из источника — только
+в историю, без скоринга, — так что результаты совпадают с прогоном без
+рестарта. Без снимка история снова берётся из model_package.pkl.
+"""
+
+import argparse
+import fcntl
+import json
+import os
+import signal
+import stat
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from config import (
+    MODEL_DIR,
+    STREAM_HISTORY_SNAPSHOT_SECONDS,
+    STREAM_IDLE_POLL_MS,
+    STREAM_MAX_BATCH,
+    STREAM_TARGET_BATCH_MS,
+)
+from dtos import TransactionInput
+from records import TxRecord
+
+try:
+    import redis
+except ImportError:  # redis опционален — есть локальная замена
+    redis = None
+
+# (позиция в источнике, сырое событие: bytes / str с JSON или dict полей)
+Record = Tuple[Any, Any]
+
+
+# ----------------------------------------------------------------------
+#  Локальная замена Redis Streams
+# ----------------------------------------------------------------------
+def _parse_id(entry_id: str) -> Tuple[int, int]:
+    ms, _, seq = entry_id.partition("-")
+    return int(ms), int(seq or 0)
+
+
+def _position_key(position: Any):
+    """Позиции сравнимы: байтовое смещение файла или id записи потока."""
+    return _parse_id(position) if isinstance(position, str) else position
+
+
+class _Pipeline:
+    def __init__(self, client: "LocalStreamClient"):
+        self._client = client
+        self._commands: List[Tuple[str, tuple]] = []
+
+    def xadd(self, name: str, fields: Dict[str, str]):
+        self._commands.append(("xadd", (name, fields)))
+        return self
+
+    def set(self, name: str, value: str):
+        self._commands.append(("set", (name, value)))
+        return self
+
+    def execute(self) -> list:
+        """
+        Сначала все XADD, затем SET: чекпойнт не опережает результаты
+        (при падении между ними батч допишется повторно, но не потеряется).
+        """
+        with self._client._locked("pipeline"):
+            added: Dict[str, List[Dict[str, str]]] = {}
+            for command, args in self._commands:
+                if command == "xadd":
+                    added.setdefault(args[0], []).append({k: str(v) for k, v in args[1].items()})
+            ids = {name: iter(self._client._append(name, entries)) for name, entries in added.items()}
+            results = [
+                next(ids[args[0]]) if command == "xadd" else self._client.set(*args)
+                for command, args in self._commands
+            ]
+        self._commands = []
+        return results
+
+
+class LocalStreamClient:
+    """
+    Подмножество redis-py (decode_responses=True) поверх каталога:
+    поток — <root>/<name>.jsonl ({"id", "fields"} построчно), ключи —
+    <root>/keys.json. Для локального запуска и отладки без Redis;
+    несколько процессов могут писать и читать одновременно (flock).
+    В отличие от MULTI в Redis, pipeline не атомарен при падении
+    посреди execute (см. _Pipeline.execute).
+    """
+
+    def __init__(self, root: str):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+        # поток → (id последней прочитанной записи, смещение после неё)
+        self._read_cursor: Dict[str, Tuple[str, int]] = {}
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.root, f"{name}.jsonl")
+
+    def _locked(self, name: str):
+        return _FileLock(os.path.join(self.root, f".{name}.lock"))
+
+    # ---- запись ----
+    def _last_id(self, name: str) -> Tuple[int, int]:
+        try:
+            with open(self._path(name), "rb") as f:
+                f.seek(0, os.SEEK_END)
+                f.seek(max(f.tell() - 64 * 1024, 0))
+                lines = f.read().splitlines()
+        except FileNotFoundError:
+            return 0, 0
+        for line in reversed(lines):
+            try:
+                return _parse_id(json.loads(line)["id"])
+            except ValueError:
+                continue
+        return 0, 0
+
+    def _append(self, name: str, entries: List[Dict[str, str]]) -> List[str]:
+        with self._locked(name):
+            last_ms, last_seq = self._last_id(name)
+            ids, lines = [], []
+            for fields in entries:
+                ms = int(time.time() * 1000)
+                if ms <= last_ms:
+                    ms, seq = last_ms, last_seq + 1
+                else:
+                    seq = 0
+                last_ms, last_seq = ms, seq
+                ids.append(f"{ms}-{seq}")
+                lines.append(json.dumps({"id": ids[-1], "fields": fields}, ensure_ascii=False) + "\n")
+            with open(self._path(name), "a", encoding="utf-8") as f:
+                f.write("".join(lines))
+        return ids
+
+    def xadd(self, name: str, fields: Dict[str, Any]) -> str:
+        return self._append(name, [{k: str(v) for k, v in fields.items()}])[0]
+
+    def pipeline(self, transaction: bool = True) -> _Pipeline:
+        return _Pipeline(self)
+
+    # ---- чтение ----
+    def _entries_after(self, name: str, last_id: str, count: Optional[int]) -> List[Tuple[str, Dict[str, str]]]:
+        cached = self._read_cursor.get(name)
+        offset = cached[1] if cached is not None and cached[0] == last_id else 0
+        after = _parse_id(last_id)
+        entries = []
+        try:
+            with open(self._path(name), "rb") as f:
+                f.seek(offset)
+                for line in f:
+                    if not line.endswith(b"\n"):
+                        break  # запись ещё дописывается
+                    offset += len(line)
+                    entry = json.loads(line)
+                    if _parse_id(entry["id"]) <= after:
+                        continue
+                    entries.append((entry["id"], entry["fields"]))
+                    if count is not None and len(entries) >= count:
+                        break
+        except FileNotFoundError:
+            return []
+        if entries:
+            self._read_cursor[name] = (entries[-1][0], offset)
+        return entries
+
+    def xread(self, streams: Dict[str, str], count: Optional[int] = None, block: Optional[int] = None):
+        deadline = time.monotonic() + (block or 0) / 1000
+        while True:
+            reply = []
+            for name, last_id in streams.items():
+                entries = self._entries_after(name, last_id, count)
+                if entries:
+                    reply.append([name, entries])
+            if reply or block is None or time.monotonic() >= deadline:
+                return reply
+            time.sleep(min(0.02, max(deadline - time.monotonic(), 0)))
+
+    # ---- ключи ----
+    def _keys(self) -> Dict[str, str]:
+        try:
+            with open(os.path.join(self.root, "keys.json"), encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+
+    def get(self, name: str) -> Optional[str]:
+        return self._keys().get(name)
+
+    def set(self, name: str, value: str) -> bool:
+        with self._locked("keys"):
+            keys = self._keys()
+            keys[name] = value
+            path = os.path.join(self.root, "keys.json")
+            with open(path + ".tmp", "w", encoding="utf-8") as f:
+                json.dump(keys, f)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(path + ".tmp", path)
+        return True
+
+
+class _FileLock:
+    def __init__(self, path: str):
+        self.path = path
+
+    def __enter__(self):
+        self._fd = os.open(self.path, os.O_CREAT | os.O_RDWR, 0o644)
+        fcntl.flock(self._fd, fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, *exc):
+        fcntl.flock(self._fd, fcntl.LOCK_UN)
+        os.close(self._fd)
+
+
+def make_stream_client(url: str):
+    """redis://… (пакет redis) или local:DIR (LocalStreamClient)."""
+    if url.startswith("local:"):
+        return LocalStreamClient(url[len("local:"):])
+    if redis is None:
+        raise RuntimeError("redis package is not installed (pip install redis) — or use local:DIR")
+    return redis.Redis.from_url(url, decode_responses=True)
+
+
+# ----------------------------------------------------------------------
+#  Источники
+# ----------------------------------------------------------------------
+class FileSource:
+    """
+    Append-only JSONL-файл или FIFO. Читает без блокировки и ждёт
+    дозаписи опросом; неполная последняя строка ждёт перевода строки.
+    """
+
+    def __init__(self, path: str, poll_interval: float = 0.05):
+        self.path = path
+        self.poll_interval = poll_interval
+        if not os.path.exists(path):
+            open(path, "ab").close()  # продюсер начнёт писать позже
+        self.fifo = stat.S_ISFIFO(os.stat(path).st_mode)
+        # из FIFO события не перечитать — доигрывание истории невозможно
+        self.replayable = not self.fifo
+        self._fd = os.open(path, os.O_RDONLY | os.O_NONBLOCK)
+        self._buffer = b""
+        self._start = 0
+        self.position = 0
+
+    def seek(self, position: Optional[int]):
+        if not position:
+            return
+        if self.fifo:
+            print(f"[Stream] {self.path} is a FIFO: checkpoint {position} cannot be replayed, reading new events")
+            return
+        os.lseek(self._fd, position, os.SEEK_SET)
+        self._buffer, self._start, self.position = b"", 0, position
+
+    def lag(self) -> Optional[int]:
+        """Непрочитанные байты (для FIFO неизвестно)."""
+        if self.fifo:
+            return None
+        return max(os.fstat(self._fd).st_size - self.position, 0)
+
+    def read(self, max_records: int, timeout: float) -> List[Record]:
+        deadline = time.monotonic() + timeout
+        records: List[Record] = []
+        while True:
+            while len(records) < max_records:
+                end = self._buffer.find(b"\n", self._start)
+                if end < 0:
+                    break
+                line = self._buffer[self._start:end]
+                self.position += end + 1 - self._start
+                self._start = end + 1
+                if line.strip():
+                    records.append((self.position, line))
+            if len(records) >= max_records:
+                return records
+
+            try:
+                chunk = os.read(self._fd, 1 << 20)
+            except BlockingIOError:
+                chunk = b""
+            if chunk:
+                self._buffer = self._buffer[self._start:] + chunk
+                self._start = 0
+                continue
+            remaining = deadline - time.monotonic()
+            if records or remaining <= 0:
+                return records
+            time.sleep(min(self.poll_interval, remaining))
+
+    def close(self):
+        os.close(self._fd)
+
+
+class StreamSource:
+    """Redis Stream (или LocalStreamClient) через XREAD с позиции последнего id."""
+
+    def __init__(self, client, stream: str):
+        self.client = client
+        self.stream = stream
+        self.position = "0-0"
+        self.replayable = True
+
+    def seek(self, position: Optional[str]):
+        if position:
+            self.position = position
+
+    def lag(self) -> Optional[int]:
+        return None
+
+    def read(self, max_records: int, timeout: float) -> List[Record]:
+        reply = self.client.xread(
+            {self.stream: self.position}, count=max_records, block=max(int(timeout * 1000), 1),
+        )
+        if isinstance(reply, dict):  # RESP3: {поток: записи}
+            reply = reply.items()
+        records: List[Record] = []
+        for _, entries in reply or []:
+            for entry_id, fields in entries:
+                records.append((entry_id, fields))
+        if records:
+            self.position = records[-1][0]
+        return records
+
+    def close(self):
+        pass
+
+
+# ----------------------------------------------------------------------
+#  Приёмники результатов (результаты + позиция атомарно)
+# ----------------------------------------------------------------------
+class JsonlSink:
+    """Результаты в JSONL, чекпойнт — рядом (PATH.checkpoint.json)."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.checkpoint_path = path + ".checkpoint.json"
+        self._file = None
+
+    def load(self) -> Dict[str, Any]:
+        """
+        Чекпойнт + восстановление: результаты, записанные после него
+        (падение между fsync результатов и чекпойнтом), не теряются —
+        позиция берётся из последней целой строки.
+        """
+        try:
+            with open(self.checkpoint_path, encoding="utf-8") as f:
+                checkpoint = json.load(f)
+        except FileNotFoundError:
+            checkpoint = {"position": None, "sink_bytes": 0, "scored": 0}
+
+        self._file = open(self.path, "ab+")
+        self._file.seek(checkpoint["sink_bytes"])
+        tail = self._file.read()
+        complete = tail[: tail.rfind(b"\n") + 1]
+        for line in complete.splitlines():
+            checkpoint["position"] = json.loads(line)["position"]
+            checkpoint["scored"] += 1
+        checkpoint["sink_bytes"] += len(complete)
+        # недописанная строка — её событие ещё не зафиксировано
+        self._file.truncate(checkpoint["sink_bytes"])
+        self._file.seek(0, os.SEEK_END)
+        return checkpoint
+
+    def commit(self, results: List[Dict[str, Any]], position: Any, scored: int):
+        data = "".join(json.dumps(r, ensure_ascii=False, default=str) + "\n" for r in results).encode("utf-8")
+        self._file.write(data)
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        checkpoint = {"position": position, "sink_bytes": self._file.tell(), "scored": scored}
+        with open(self.checkpoint_path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(checkpoint, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(self.checkpoint_path + ".tmp", self.checkpoint_path)
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+
+
+class StreamSink:
+    """Результаты — XADD в выходной поток, чекпойнт — ключ; одной транзакцией."""
+
+    def __init__(self, client, stream: str, checkpoint_key: str):
+        self.client = client
+        self.stream = stream
+        self.checkpoint_key = checkpoint_key
+
+    def load(self) -> Dict[str, Any]:
+        raw = self.client.get(self.checkpoint_key)
+        return json.loads(raw) if raw else {"position": None, "scored": 0}
+
+    def commit(self, results: List[Dict[str, Any]], position: Any, scored: int):
+        pipe = self.client.pipeline(transaction=True)
+        for result in results:
+            pipe.xadd(self.stream, {"result": json.dumps(result, ensure_ascii=False, default=str)})
+        pipe.set(self.checkpoint_key, json.dumps({"position": position, "scored": scored}))
+        pipe.execute()
+
+    def close(self):
+        pass
+
+
+class HistorySnapshot:
+    """
+    Снимок истории клиентов (joblib) и позиция последнего учтённого в нём
+    события. Пишется после commit батча, поэтому никогда не опережает
+    чекпойнт; файл заменяется атомарно.
+    """
+
+    def __init__(self, path: str, interval_seconds: float = STREAM_HISTORY_SNAPSHOT_SECONDS):
+        self.path = path
+        self.interval_seconds = interval_seconds
+        self.position = None
+        self._saved_at = time.monotonic()
+
+    def load(self) -> Optional[Tuple[Any, Dict[Any, list]]]:
+        """(позиция, история) или None, если снимка ещё нет."""
+        import joblib
+
+        try:
+            saved = joblib.load(self.path)
+        except FileNotFoundError:
+            return None
+        self.position = saved["position"]
+        return saved["position"], saved["history"]
+
+    def due(self) -> bool:
+        return time.monotonic() - self._saved_at >= self.interval_seconds
+
+    def save(self, detector, position: Any):
+        import joblib
+
+        started = time.perf_counter()
+        history = detector.history_snapshot()
+        with open(self.path + ".tmp", "wb") as f:
+            joblib.dump({"position": position, "history": history}, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(self.path + ".tmp", self.path)
+        self.position = position
+        self._saved_at = time.monotonic()
+        print(
+            f"[Stream] history snapshot at position {position!r}: {len(history)} customers "
+            f"in {time.perf_counter() - started:.2f}s"
+        )
+
+
+# ----------------------------------------------------------------------
+#  Воркер
+# ----------------------------------------------------------------------
+def _parse_event(payload: Any) -> Dict[str, Any]:
+    if isinstance(payload, dict):
+        return json.loads(payload["data"]) if "data" in payload else payload
+    return json.loads(payload)
+
+
+class StreamWorker:
+    """
+    Цикл «прочитать → скорить батч → зафиксировать результаты и позицию».
+    """
+
+    def __init__(
+        self,
+        detector,
+        source,
+        sink,
+        max_batch: int = STREAM_MAX_BATCH,
+        target_batch_ms: float = STREAM_TARGET_BATCH_MS,
+        idle_poll_ms: float = STREAM_IDLE_POLL_MS,
+        report_interval: float = 10.0,
+        snapshot: Optional[HistorySnapshot] = None,
+    ):
+        self.detector = detector
+        self.source = source
+        self.sink = sink
+        self.snapshot = snapshot
+        self.max_batch = max_batch
+        self.target_batch = target_batch_ms / 1000
+        self.idle_poll = idle_poll_ms / 1000
+        self.report_interval = report_interval
+        self.batch_size = min(16, max_batch)
+        self.scored = 0
+        self.errors = 0
+        self.batches = 0
+
+    def _adapt(self, rows: int, seconds: float):
+        """
+        Размер батча — к такому, что скорится за target_batch: растёт, только
+        если батч набрался полностью (есть очередь), уменьшается при перелёте.
+        """
+        if rows < self.batch_size and seconds <= self.target_batch:
+            return
+        ideal = self.target_batch / (seconds / rows) if seconds > 0 else self.max_batch
+        self.batch_size = int(min(max((self.batch_size + ideal) / 2, 1), self.max_batch))
+
+    def score(self, records: List[Record]) -> List[Dict[str, Any]]:
+        results: List[Optional[Dict[str, Any]]] = [None] * len(records)
+        transactions, slots = [], []
+        for i, (position, payload) in enumerate(records):
+            try:
+                # событие приходит извне — валидация DTO, дальше внутренняя запись
+                transactions.append(TxRecord.from_input(TransactionInput(**_parse_event(payload))))
+                slots.append(i)
+            except (ValueError, TypeError, KeyError) as e:
+                # битое событие не останавливает поток: фиксируется с ошибкой
+                results[i] = {"position": position, "error": str(e)}
+                self.errors += 1
+
+        if not transactions:
+            return results
+
+        # признаки строк строятся по одной внутри score_records: исключение
+        # одной («ядовитое» событие) уходит в errors и фиксируется вместе с
+        # остальными — иначе воркер падал бы до commit и перечитывал его
+        # снова. Повторный прогон всей пачки не нужен (и дважды записал бы
+        # историю строк до упавшей).
+        errors: Dict[int, str] = {}
+        try:
+            batch = self.detector.score_records(transactions, alerts=True, errors=errors)
+        except Exception as e:
+            # сбой вне строк (сборка пачки): батч фиксируется с ошибкой целиком
+            print(f"[Stream] batch of {len(transactions)} failed: {e}")
+            batch, errors = None, dict.fromkeys(range(len(transactions)), f"{type(e).__name__}: {e}")
+
+        for j, (i, trans) in enumerate(zip(slots, transactions)):
+            if j in errors:
+                results[i] = {"position": records[i][0], "error": errors[j]}
+                self.errors += 1
+                continue
+            results[i] = {
+                "position": records[i][0],
+                "id": trans.id,
+                "cst_dim_id": trans.cst_dim_id,
+                **batch.row(j),
+            }
+        return results
+
+    def restore_history(self, position: Any):
+        """
+        История на момент чекпойнта: снимок + события после него, дочитанные
+        из источника и записанные в историю без скоринга.
+        """
+        saved = self.snapshot.load() if self.snapshot is not None else None
+        if saved is None:
+            if position is not None:
+                print("[Stream] no history snapshot: customer history starts from the model package")
+            return
+        snapshot_position, history = saved
+        if position is None or _position_key(snapshot_position) > _position_key(position):
+            # снимок от другого прогона (результаты удалены) — не применяем
+            print(f"[Stream] history snapshot at {snapshot_position!r} is ahead of checkpoint {position!r}, ignored")
+            return
+
+        self.detector.restore_history(history)
+        if snapshot_position == position:
+            print(f"[Stream] history restored from snapshot at {position!r}")
+            return
+        if not self.source.replayable:
+            print(f"[Stream] history restored from snapshot at {snapshot_position!r}, events up to {position!r} cannot be replayed")
+            return
+
+        target = _position_key(position)
+        self.source.seek(snapshot_position)
+        replayed = 0
+        while True:
+            records = self.source.read(self.max_batch, self.idle_poll)
+            transactions = []
+            for record_position, payload in records:
+                if _position_key(record_position) > target:
+                    break
+                try:
+                    transactions.append(TxRecord.from_input(TransactionInput(**_parse_event(payload))))
+                except (ValueError, TypeError, KeyError):
+                    pass  # битое событие и при скоринге не попало в историю
+            self.detector.apply_history(transactions)
+            replayed += len(transactions)
+            if not records or _position_key(records[-1][0]) >= target:
+                break
+        print(f"[Stream] history restored from snapshot at {snapshot_position!r} + {replayed} replayed events")
+
+    def run(self, stop: threading.Event):
+        checkpoint = self.sink.load()
+        self.restore_history(checkpoint["position"])
+        # sweeper — после восстановления: restore_history заменяет retention
+        self.detector.retention.start()
+        self.source.seek(checkpoint["position"])
+        self.scored = checkpoint.get("scored", 0)
+        print(f"[Stream] resuming at position {checkpoint['position']!r} ({self.scored} events already scored)")
+
+        position = checkpoint["position"]
+        window_started, window_rows = time.monotonic(), 0
+        while not stop.is_set():
+            records = self.source.read(self.batch_size, self.idle_poll)
+            if records:
+                started = time.perf_counter()
+                results = self.score(records)
+                seconds = time.perf_counter() - started
+                self.scored += len(records)
+                self.batches += 1
+                position = records[-1][0]
+                self.sink.commit(results, position, self.scored)
+                if self.snapshot is not None and self.snapshot.due():
+                    self.snapshot.save(self.detector, position)
+                self._adapt(len(records), seconds)
+                window_rows += len(records)
+
+            elapsed = time.monotonic() - window_started
+            if self.report_interval > 0 and elapsed >= self.report_interval:
+                print(f"[Stream] {self.stats(window_rows / elapsed)}")
+                window_started, window_rows = time.monotonic(), 0
+
+        if self.snapshot is not None and position is not None and position != self.snapshot.position:
+            self.snapshot.save(self.detector, position)
+        print(f"[Stream] stopped: {self.stats()}")
+
+    def stats(self, rows_per_sec: Optional[float] = None) -> Dict[str, Any]:
+        return {
+            "scored": self.scored,
+            "errors": self.errors,
+            "batches": self.batches,
+            "batch_size": self.batch_size,
+            "rows_per_sec": round(rows_per_sec, 1) if rows_per_sec is not None else None,
+            "lag_bytes": self.source.lag(),
+        }
+
+
+# ----------------------------------------------------------------------
+#  CLI
+# ----------------------------------------------------------------------
+def _open_source(args):
+    if args.source.startswith("file:"):
+        return FileSource(args.source[len("file:"):]), None
+    if not args.stream:
+        raise SystemExit("--stream is required for redis:// and local: sources")
+    client = make_stream_client(args.source)
+    return StreamSource(client, args.stream), client
+
+
+def _run_command(args):
+    from model import FraudDetectionAPI
+
+    source, client = _open_source(args)
+    if args.sink_stream:
+        if client is None:
+            raise SystemExit("--sink-stream needs a redis:// or local: source")
+        checkpoint_key = f"{args.sink_stream}:checkpoint:{args.stream}"
+        sink = StreamSink(client, args.sink_stream, checkpoint_key)
+        snapshot_path = args.history_snapshot or f"{args.sink_stream}.{args.stream}.history.pkl"
+    elif args.sink:
+        sink = JsonlSink(args.sink)
+        snapshot_path = args.history_snapshot or args.sink + ".history.pkl"
+    else:
+        raise SystemExit("either --sink or --sink-stream is required")
+
+    # retention.start() — в worker.run, после восстановления истории из снимка
+    detector = FraudDetectionAPI(args.model)
+    worker = StreamWorker(
+        detector,
+        source,
+        sink,
+        max_batch=args.max_batch,
+        target_batch_ms=args.target_batch_ms,
+        idle_poll_ms=args.idle_poll_ms,
+        report_interval=args.report_interval,
+        snapshot=HistorySnapshot(snapshot_path, args.snapshot_interval),
+    )
+
+    stop = threading.Event()
+
+    def _stop(signum, frame):
+        # текущий батч дописывается и фиксируется, затем выход
+        stop.set()
+
+    signal.signal(signal.SIGTERM, _stop)
+    signal.signal(signal.SIGINT, _stop)
+    try:
+        worker.run(stop)
+    finally:
+        sink.close()
+        source.close()
+
+
+def _produce_command(args):
+    """Выгружает CSV транзакций в источник — для локального прогона."""
+    from bulk_scoring import clean_bulk_frame, read_bulk_csv
+
+    df, _ = read_bulk_csv(args.csv)
+    df = clean_bulk_frame(df)
+    events = [
+        {
+            "id": i,
+            "cst_dim_id": int(row.cst_dim_id),
+            "amount": float(row.amount),
+            "direction": str(row.direction),
+            "transdatetime": str(row.transdatetime),
+        }
+        for i, row in enumerate(df.itertuples(index=False))
+    ]
+    if args.source.startswith("file:"):
+        with open(args.source[len("file:"):], "a", encoding="utf-8") as f:
+            f.writelines(json.dumps(event, ensure_ascii=False) + "\n" for event in events)
+    else:
+        client = make_stream_client(args.source)
+        for start in range(0, len(events), 1000):
+            pipe = client.pipeline(transaction=False)
+            for event in events[start:start + 1000]:
+                pipe.xadd(args.stream, {"data": json.dumps(event, ensure_ascii=False)})
+            pipe.execute()
+    print(f"[Stream] {len(events)} events written to {args.source} {args.stream or ''}".rstrip())
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Потоковый скоринг транзакций без HTTP")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    run = sub.add_parser("run", help="скорить события из источника")
+    run.add_argument("--source", required=True, help="file:PATH | redis://HOST:PORT/DB | local:DIR")
+    run.add_argument("--stream", help="имя входного потока (redis:// и local:)")
+    run.add_argument("--sink", help="JSONL результатов (чекпойнт — рядом)")
+    run.add_argument("--sink-stream", help="выходной поток результатов (redis:// и local:)")
+    run.add_argument("--model", default=MODEL_DIR)
+    run.add_argument("--max-batch", type=int, default=STREAM_MAX_BATCH)
+    run.add_argument("--target-batch-ms", type=float, default=STREAM_TARGET_BATCH_MS)
+    run.add_argument("--idle-poll-ms", type=float, default=STREAM_IDLE_POLL_MS)
+    run.add_argument("--report-interval", type=float, default=10.0, help="секунд между строками [Stream] в логе")
+    run.add_argument(
+        "--history-snapshot",
+        help="снимок истории клиентов (по умолчанию SINK.history.pkl или SINK_STREAM.STREAM.history.pkl)",
+    )
+    run.add_argument(
+        "--snapshot-interval", type=float, default=STREAM_HISTORY_SNAPSHOT_SECONDS,
+        help="секунд между снимками истории (0 — после каждого батча)",
+    )
+
+    produce = sub.add_parser("produce", help="записать транзакции из CSV в источник")
+    produce.add_argument("--source", required=True, help="file:PATH | redis://HOST:PORT/DB | local:DIR")
+    produce.add_argument("--stream", help="имя потока (redis:// и local:)")
+    produce.add_argument("--csv", required=True, help="CSV транзакций (формат /bulk_predict)")
+
+    args = parser.parse_args()
+    if args.command == "run":
+        _run_command(args)
+    elif args.command == "produce":
+        _produce_command(args)
+
+
+if __name__ == "__main__":
+    main()
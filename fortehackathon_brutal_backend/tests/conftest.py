@@ -0,0 +1,88 @@
+import json
+import os
+import sys
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+import pytest
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# модули бэкенда импортируются плоско (from config import ...), как в app.py
+sys.path.insert(0, BACKEND_DIR)
+
+# config.py читает окружение при импорте: без фонового SHAP, дрейфа и деградации
+os.environ.setdefault("LAZY_HEAVY_IMPORTS", "1")
+os.environ.setdefault("DRIFT_ENABLED", "0")
+os.environ.setdefault("DEGRADATION_ENABLED", "0")
+
+DIRECTIONS = ["card_transfer", "card_payment", "cash_withdrawal", "p2p"]
+HISTORY_START = datetime(2025, 1, 1)
+
+
+@pytest.fixture(scope="session")
+def model_path(tmp_path_factory):
+    """Маленький model_package.pkl той же структуры, что у обученного пакета."""
+    import joblib
+    from catboost import CatBoostClassifier
+    from lightgbm import LGBMClassifier
+    from sklearn.ensemble import IsolationForest
+    from sklearn.preprocessing import LabelEncoder
+    from xgboost import XGBClassifier
+
+    with open(os.path.join(BACKEND_DIR, "metadata.json")) as f:
+        meta = json.load(f)
+    cols = meta["feature_cols"]
+    rng = np.random.default_rng(0)
+    n = 1000
+    X = pd.DataFrame(rng.normal(size=(n, len(cols))), columns=cols)
+    X["amount"] = rng.lognormal(8, 1, n)
+    X["direction"] = rng.integers(0, len(DIRECTIONS), n)
+    y = (X["amount"] > np.quantile(X["amount"], 0.9)).astype(int)
+    iso = IsolationForest(n_estimators=30, random_state=0).fit(X)
+    X["anomaly_score"] = -iso.decision_function(X)
+    history = {
+        cst: [(pd.Timestamp(HISTORY_START + timedelta(days=d)), 1000.0 + d, "p2p") for d in range(5)]
+        for cst in range(20)
+    }
+    package = {
+        "iso": iso,
+        "catboost": CatBoostClassifier(iterations=20, verbose=0, thread_count=1, allow_writing_files=False).fit(X, y),
+        "xgboost": XGBClassifier(n_estimators=20, n_jobs=1).fit(X, y),
+        "lightgbm": LGBMClassifier(n_estimators=20, verbose=-1, n_jobs=1).fit(X, y),
+        "threshold": meta["threshold"],
+        "feature_cols": cols,
+        "ensemble_weights": [0.4, 0.3, 0.3],
+        "encoders": {"direction": LabelEncoder().fit(DIRECTIONS)},
+        "history": history,
+        "version": "test",
+    }
+    path = tmp_path_factory.mktemp("model") / "model_package.pkl"
+    joblib.dump(package, path)
+    return str(path)
+
+
+@pytest.fixture
+def detector(model_path):
+    from model import FraudDetectionAPI
+
+    return FraudDetectionAPI(model_path)
+
+
+@pytest.fixture(scope="session")
+def transactions_csv(tmp_path_factory):
+    """CSV формата /bulk_predict: клиенты с историей и новые, по минуте на строку."""
+    rng = np.random.default_rng(1)
+    n = 400
+    df = pd.DataFrame({
+        "cst_dim_id": rng.integers(0, 60, n),
+        "amount": np.round(rng.lognormal(7, 1.5, n), 2),
+        "direction": rng.choice(DIRECTIONS, n),
+        "transdatetime": [
+            (HISTORY_START + timedelta(days=6, minutes=7 * i)).strftime("%Y-%m-%d %H:%M:%S") for i in range(n)
+        ],
+    })
+    path = tmp_path_factory.mktemp("data") / "transactions.csv"
+    df.to_csv(path, index=False)
+    return str(path)
@@ -0,0 +1,42 @@
+import argparse
+
+import pytest
+
+import batch_score
+from bulk_scoring import clean_bulk_frame, read_bulk_csv, score_bulk_frame
+
+
+def _bulk_csv(detector, path) -> bytes:
+    df, _ = read_bulk_csv(path)
+    return score_bulk_frame(detector, clean_bulk_frame(df)).to_csv(index=False).encode()
+
+
+def test_numba_does_not_change_bulk_output(model_path, transactions_csv):
+    from model import FraudDetectionAPI
+
+    pytest.importorskip("numba")
+    numpy_out = _bulk_csv(FraudDetectionAPI(model_path), transactions_csv)
+    detector = FraudDetectionAPI(model_path)
+    assert detector.anomaly_scorer.enable_numba()
+    assert _bulk_csv(detector, transactions_csv) == numpy_out
+
+
+def test_batch_score_matches_bulk_bytes(detector, model_path, transactions_csv, tmp_path, monkeypatch):
+    # run() выставляет окружение для процессов пула — вернём его после теста
+    for name in ("THROUGHPUT_MODEL_THREADS", "OMP_NUM_THREADS"):
+        monkeypatch.setenv(name, "1")
+    expected = _bulk_csv(detector, transactions_csv)
+    output = tmp_path / "scored.csv"
+    batch_score.run(argparse.Namespace(
+        input=transactions_csv,
+        output=str(output),
+        model=model_path,
+        workers=2,
+        model_threads=1,
+        parts_per_worker=2,
+        chunk_rows=50,
+        sort_by_time=False,
+        report_interval=5.0,
+        keep_parts=False,
+    ))
+    assert output.read_bytes() == expected
@@ -0,0 +1,40 @@
+import asyncio
+
+import pytest
+
+from client import FraudAPIError, _AsyncBatcher, _ThreadBatcher
+
+
+class _ShortBatchClient:
+    """/predict/batch, который теряет последний результат пачки."""
+
+    def predict_batch(self, transactions):
+        return [{"i": p["i"]} for p in transactions[:-1]]
+
+
+class _AsyncShortBatchClient:
+    async def predict_batch(self, transactions):
+        return [{"i": p["i"]} for p in transactions[:-1]]
+
+
+def test_thread_batcher_fails_every_future_on_short_response():
+    batcher = _ThreadBatcher(_ShortBatchClient(), batch_size=3, delay_s=0.01)
+    try:
+        futures = [batcher.submit({"i": i}) for i in range(3)]
+        for future in futures:
+            with pytest.raises(FraudAPIError):
+                future.result(timeout=5)
+    finally:
+        batcher.close()
+
+
+def test_async_batcher_fails_every_future_on_short_response():
+    async def run():
+        batcher = _AsyncBatcher(_AsyncShortBatchClient(), batch_size=3, delay_s=0.01)
+        results = await asyncio.wait_for(
+            asyncio.gather(*(batcher.submit({"i": i}) for i in range(3)), return_exceptions=True), timeout=5,
+        )
+        await batcher.aclose()
+        return results
+
+    assert all(isinstance(result, FraudAPIError) for result in asyncio.run(run()))
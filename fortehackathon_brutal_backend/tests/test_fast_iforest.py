@@ -0,0 +1,35 @@
+import numpy as np
+import pytest
+from sklearn.ensemble import IsolationForest
+
+from fast_iforest import FlatIsolationForest, make_anomaly_scorer
+
+
+@pytest.fixture(scope="module")
+def iso():
+    X = np.random.default_rng(0).normal(size=(2000, 12))
+    return IsolationForest(n_estimators=60, random_state=0).fit(X)
+
+
+def test_flat_matches_sklearn(iso):
+    X = np.random.default_rng(1).normal(size=(500, 12))
+    flat = make_anomaly_scorer(iso)
+    assert isinstance(flat, FlatIsolationForest)
+    np.testing.assert_allclose(flat.decision_function(X), iso.decision_function(X), rtol=1e-6, atol=1e-9)
+
+
+def test_numba_matches_numpy_bitwise(iso):
+    pytest.importorskip("numba")
+    X = np.random.default_rng(2).normal(size=(3000, 12))
+    flat = FlatIsolationForest(iso)
+    expected = flat.decision_function(X)
+    assert flat.enable_numba()
+    assert np.array_equal(flat.decision_function(X), expected)
+
+
+def test_single_row_matches_matrix(iso):
+    X = np.random.default_rng(3).normal(size=(100, 12))
+    flat = FlatIsolationForest(iso)
+    matrix = flat.decision_function(X)
+    rows = np.array([flat.decision_function(X[i:i + 1])[0] for i in range(len(X))])
+    assert np.array_equal(rows, matrix)
@@ -0,0 +1,28 @@
+import pandas as pd
+
+from feature_store import BehavioralFeatureStore, build_feature_store
+
+
+def test_store_created_after_start_is_picked_up(tmp_path):
+    path = str(tmp_path / "behavioral_store.bin")
+    store = BehavioralFeatureStore.open_optional(path, check_seconds=0)
+    assert not store.loaded
+    assert store.lookup(1) is None
+
+    build_feature_store(pd.DataFrame({"cst_dim_id": [1, 2], "logins_last_7d": [3.0, 4.0]}), path)
+    assert store.lookup(1) == {"logins_last_7d": 3.0}
+    assert store.loaded and len(store) == 2
+    assert store.reloads == 0
+
+
+def test_replaced_store_is_reloaded(tmp_path):
+    path = str(tmp_path / "behavioral_store.bin")
+    build_feature_store(pd.DataFrame({"cst_dim_id": [1], "logins_last_7d": [3.0]}), path)
+    store = BehavioralFeatureStore.open_optional(path, check_seconds=0)
+    build_feature_store(pd.DataFrame({"cst_dim_id": [1, 5], "logins_last_7d": [7.0, 1.0]}), path)
+    assert store.lookup(5) == {"logins_last_7d": 1.0}
+    assert store.reloads == 1
+
+
+def test_no_path_means_no_store():
+    assert BehavioralFeatureStore.open_optional("") is None
@@ -0,0 +1,54 @@
+import random
+from datetime import datetime, timedelta
+
+import pandas as pd
+
+from graph_index import WINDOWS, DirectionGraphIndex
+
+BASE = datetime(2025, 3, 1)
+
+
+def _brute(seen, cst_id, direction, ts):
+    """pair_count / sender_out_degree как у истории клиента: только ts строго раньше."""
+    day = int(pd.Timestamp(ts).timestamp() // 86_400)
+    result = {}
+    for window in WINDOWS:
+        start = pd.Timestamp((day - window + 1) * 86_400, unit="s")
+        prior = [(c, d) for c, d, t in seen if c == cst_id and start <= pd.Timestamp(t) < pd.Timestamp(ts)]
+        suffix = "" if window == WINDOWS[-1] else f"_{window}d"
+        result["pair_count" + suffix] = sum(1 for _, d in prior if d == direction)
+        result["sender_out_degree" + suffix] = len({d for _, d in prior})
+    return result
+
+
+def test_customer_counts_are_strictly_prior():
+    rng = random.Random(0)
+    index = DirectionGraphIndex(retention_days=60)
+    seen = []
+    for _ in range(600):
+        # минутная сетка за 20 дней вразнобой: равные ts и «из прошлого»
+        event = (rng.randrange(15), rng.choice("abcde"), BASE + timedelta(minutes=rng.randrange(20 * 24 * 6) * 10))
+        features = index.edge_features(*event)
+        expected = _brute(seen, *event)
+        assert {name: features[name] for name in expected} == expected
+        index.add(*event)
+        seen.append(event)
+
+
+def test_same_day_later_transaction_is_not_prior():
+    index = DirectionGraphIndex()
+    index.add(1, "a", BASE + timedelta(hours=18))
+    features = index.edge_features(1, "a", BASE + timedelta(hours=9))
+    assert features["pair_count"] == 0
+    assert features["sender_out_degree"] == 0
+    assert index.edge_features(1, "a", BASE + timedelta(hours=18))["pair_count"] == 0
+    assert index.edge_features(1, "a", BASE + timedelta(hours=19))["pair_count"] == 1
+
+
+def test_future_transaction_does_not_expire_edges():
+    history = {cst: [(pd.Timestamp(BASE + timedelta(days=d)), 100.0, "a") for d in range(5)] for cst in range(10)}
+    index = DirectionGraphIndex.from_history(history)
+    edges = index.stats()["edges"]
+    index.add(99, "a", datetime(2099, 1, 1))
+    assert index.stats()["edges"] == edges + 1
+    assert index.edge_features(0, "a", BASE + timedelta(days=6))["pair_count"] == 5
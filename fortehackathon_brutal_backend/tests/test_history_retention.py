@@ -0,0 +1,39 @@
+from datetime import datetime, timedelta
+
+import pandas as pd
+
+from history_retention import HistoryRetention
+
+BASE = datetime(2025, 3, 1)
+
+
+def _history():
+    return {cst: [(pd.Timestamp(BASE + timedelta(days=d)), 100.0, "a") for d in range(5)] for cst in range(10)}
+
+
+def test_future_transaction_does_not_move_watermark():
+    history = _history()
+    retention = HistoryRetention(history, retention_days=60, start=False)
+    watermark = retention.watermark
+    with retention.lock:
+        history[0].append((pd.Timestamp("2099-01-01"), 1.0, "a"))
+        retention.touch(0, history[0][-1][0], 1)
+    assert retention.watermark == watermark
+    assert retention.stats()["future_entries"] == 1
+    assert retention.sweep_step() == 0
+    assert len(history) == 10
+
+
+def test_future_entries_in_package_history_are_ignored():
+    history = _history()
+    history[3].append((pd.Timestamp("2099-01-01"), 1.0, "a"))
+    retention = HistoryRetention(history, retention_days=60, start=False)
+    assert retention.watermark == pd.Timestamp(BASE + timedelta(days=4))
+
+
+def test_sweep_expires_relative_to_watermark():
+    history = _history()
+    history[0] = [(pd.Timestamp(BASE + timedelta(days=90)), 1.0, "a")]
+    retention = HistoryRetention(history, retention_days=60, start=False)
+    assert retention.sweep_step() == 45
+    assert list(history) == [0]
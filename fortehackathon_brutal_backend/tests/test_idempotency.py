@@ -0,0 +1,89 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+import pytest
+
+from degradation import DegradationController
+from dtos import TransactionInput
+
+BASE = datetime(2025, 1, 7, 12, 0)
+
+
+def _transactions(n=5, with_id=True):
+    return [
+        TransactionInput(
+            id=100 + i if with_id else None,
+            cst_dim_id=i % 3,
+            amount=1000.0 * (i + 1),
+            direction="p2p",
+            transdatetime=BASE + timedelta(minutes=i),
+        )
+        for i in range(n)
+    ]
+
+
+def _history_size(detector):
+    return sum(len(entries) for entries in detector.history.values())
+
+
+@pytest.mark.parametrize("explain", [True, False])
+def test_batch_replay_is_not_rescored(detector, explain):
+    first_flags, replay_flags = [], []
+    first = detector.predict_batch(_transactions(), explain=explain, replayed_out=first_flags)
+    size = _history_size(detector)
+    replay = detector.predict_batch(_transactions(), explain=explain, replayed_out=replay_flags)
+
+    assert first_flags == [False] * 5
+    assert replay_flags == [True] * 5
+    assert replay == first
+    assert _history_size(detector) == size
+
+
+def test_single_replay_by_idempotency_key(detector):
+    transaction = _transactions(1, with_id=False)[0]
+    flags = []
+    first = detector.predict_single_transaction(transaction, idempotency_key="k-1", replayed_out=flags)
+    size = _history_size(detector)
+    replay = detector.predict_single_transaction(transaction, idempotency_key="k-1", replayed_out=flags)
+    assert flags == [False, True]
+    assert replay == first
+    assert _history_size(detector) == size
+
+
+def test_without_key_every_call_is_scored(detector):
+    size = _history_size(detector)
+    flags = []
+    detector.predict_batch(_transactions(with_id=False), explain=False, replayed_out=flags)
+    detector.predict_batch(_transactions(with_id=False), explain=False, replayed_out=flags)
+    assert flags == [False] * 10
+    assert _history_size(detector) == size + 10
+
+
+def test_degraded_answer_is_rescored_on_retry(detector):
+    transaction = _transactions(1)[0]
+    detector.degradation.level = 3
+    degraded = detector.predict_single_transaction(transaction)
+    size = _history_size(detector)
+    assert degraded.degradation_level == 3
+    assert None in degraded.individual_scores.model_dump().values()
+
+    # нагрузка не спала — повтор отдаёт тот же деградированный ответ
+    assert detector.predict_single_transaction(transaction) == degraded
+
+    detector.degradation.level = 0
+    flags = []
+    retry = detector.predict_single_transaction(transaction, replayed_out=flags)
+    assert flags == [True]
+    assert retry.degradation_level == 0
+    assert None not in retry.individual_scores.model_dump().values()
+    assert _history_size(detector) == size
+    # пересчитанный ответ заменяет сохранённый
+    assert detector.predict_single_transaction(transaction) == retry
+
+
+def test_requests_by_level_counts_every_plan():
+    controller = DegradationController(queue_slo_ms=50, latency_slo_ms=50, enabled=False)
+    weights = [0.4, 0.3, 0.3]
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        list(pool.map(lambda _: controller.plan(weights), range(4000)))
+    assert controller.stats()["requests_by_level"][0] == 4000
@@ -0,0 +1,59 @@
+import pytest
+
+import ingest
+
+
+@pytest.fixture(params=["pyarrow", "pandas"])
+def engine(request, monkeypatch):
+    if request.param == "pyarrow" and ingest.pa is None:
+        pytest.skip("pyarrow не установлен")
+    if request.param == "pandas":
+        monkeypatch.setattr(ingest, "pa", None)
+    return request.param
+
+
+def _amounts(text: str, encoding: str = "utf-8"):
+    df, report = ingest.read_csv(text.encode(encoding), numeric_columns=["amount"], string_columns=["id"])
+    return df["amount"].tolist(), report
+
+
+def test_decimal_comma_after_whole_head(engine):
+    # в первых 200+ строках только целые суммы — десятичная запятая ниже образца sniff
+    rows = [f"{i};1500" for i in range(300)]
+    _, report = _amounts("id;amount\n" + "\n".join(rows) + "\n")
+    amounts, _ = _amounts("id;amount\n" + "\n".join(rows) + "\nx;1500,50\ny;1 234,5\n")
+    assert report["decimal"] == "."
+    assert amounts[-2:] == [1500.5, 1234.5]
+
+
+def test_quoted_decimal_comma_in_comma_file(engine):
+    amounts, report = _amounts('id,amount\na,"1500,50"\nb,"1,234.56"\nc,12.5\n')
+    assert report["delimiter"] == ","
+    assert amounts == [1500.5, 1234.56, 12.5]
+
+
+@pytest.mark.parametrize("value, expected", [
+    ("1,234.56", 1234.56),
+    ("12,345,678.9", 12345678.9),
+    ("1.234,56", 1234.56),
+    ("12.345.678,9", 12345678.9),
+    ("7,5", 7.5),
+    ("1,500", 1500.0),
+    ("1 234,56", 1234.56),
+    ("-0,5", -0.5),
+    ("abc", None),
+])
+def test_number_formats_dot_dialect(engine, value, expected):
+    amounts, _ = _amounts(f'id;amount\na;1.5\nb;"{value}"\n')
+    assert amounts[0] == 1.5
+    if expected is None:
+        assert amounts[1] != amounts[1]  # NaN
+    else:
+        assert amounts[1] == pytest.approx(expected)
+
+
+def test_single_dot_group_in_comma_dialect(engine):
+    # в диалекте с десятичной запятой одиночная «1.500» — тысячи
+    amounts, report = _amounts("id;amount\na;1 234,56\nb;1.500\nc;1.5\n", encoding="cp1251")
+    assert report["decimal"] == ","
+    assert amounts == [1234.56, 1500.0, 1.5]
@@ -0,0 +1,95 @@
+import json
+import shutil
+import threading
+import time
+
+import pandas as pd
+import pytest
+
+from stream_worker import FileSource, HistorySnapshot, JsonlSink, StreamWorker
+
+COMPARED = ("fraud_probability", "individual_scores", "alerts", "is_fraud")
+
+
+def _events(transactions_csv):
+    df = pd.read_csv(transactions_csv)
+    return [
+        json.dumps({"id": i, **{k: (v.item() if hasattr(v, "item") else v) for k, v in row.items()}}) + "\n"
+        for i, row in enumerate(df.to_dict("records"))
+    ]
+
+
+def _run(model_path, events_path, sink_path, until, snapshot_interval=3600.0):
+    """Один запуск воркера с новым процессным состоянием: скорит, пока в sink не станет until строк."""
+    from model import FraudDetectionAPI
+
+    worker = StreamWorker(
+        FraudDetectionAPI(model_path),
+        FileSource(events_path),
+        JsonlSink(sink_path),
+        max_batch=32,
+        idle_poll_ms=10,
+        report_interval=0,
+        snapshot=HistorySnapshot(sink_path + ".history.pkl", snapshot_interval),
+    )
+    stop = threading.Event()
+    thread = threading.Thread(target=worker.run, args=(stop,))
+    thread.start()
+    deadline = time.monotonic() + 60
+    try:
+        while _lines(sink_path) < until:
+            assert thread.is_alive() and time.monotonic() < deadline
+            time.sleep(0.02)
+    finally:
+        stop.set()
+        thread.join()
+        worker.detector.retention.stop()
+        worker.sink.close()
+        worker.source.close()
+
+
+def _lines(path):
+    try:
+        with open(path, encoding="utf-8") as f:
+            return sum(1 for _ in f)
+    except FileNotFoundError:
+        return 0
+
+
+def _results(path):
+    with open(path, encoding="utf-8") as f:
+        return [{k: r[k] for k in COMPARED} for r in map(json.loads, f)]
+
+
+@pytest.fixture
+def reference(model_path, transactions_csv, tmp_path):
+    events_path = tmp_path / "reference.jsonl"
+    events_path.write_text("".join(_events(transactions_csv)))
+    sink_path = str(tmp_path / "reference_results.jsonl")
+    _run(model_path, str(events_path), sink_path, until=400)
+    return _results(sink_path)
+
+
+def test_restart_keeps_history(model_path, transactions_csv, tmp_path, reference):
+    events = _events(transactions_csv)
+    events_path = tmp_path / "events.jsonl"
+    sink_path = str(tmp_path / "results.jsonl")
+    snapshot_path = sink_path + ".history.pkl"
+
+    # 1: остановка — снимок истории на позиции чекпойнта
+    events_path.write_text("".join(events[:200]))
+    _run(model_path, str(events_path), sink_path, until=200)
+    shutil.copy(snapshot_path, str(tmp_path / "old_snapshot.pkl"))
+
+    # 2: падение после commit, но до снимка — снимок отстаёт от чекпойнта
+    with open(events_path, "a") as f:
+        f.writelines(events[200:300])
+    _run(model_path, str(events_path), sink_path, until=300)
+    shutil.copy(str(tmp_path / "old_snapshot.pkl"), snapshot_path)
+
+    # 3: снимок + доигрывание событий 200..299 в историю
+    with open(events_path, "a") as f:
+        f.writelines(events[300:])
+    _run(model_path, str(events_path), sink_path, until=400)
+
+    assert _results(sink_path) == reference
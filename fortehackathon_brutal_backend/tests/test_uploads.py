@@ -0,0 +1,59 @@
+import asyncio
+
+from bulk_scoring import clean_bulk_frame, read_bulk_csv, score_bulk_frame
+from uploads import UploadStore
+
+CHUNK_BYTES = 3000
+
+
+async def _stream(data: bytes):
+    yield data
+
+
+def _put(store, upload_id, index, data):
+    return asyncio.run(store.write_chunk(upload_id, index, _stream(data)))
+
+
+def _chunks(path):
+    with open(path, "rb") as f:
+        data = f.read()
+    return [data[i:i + CHUNK_BYTES] for i in range(0, len(data), CHUNK_BYTES)]
+
+
+def test_scoring_resumes_after_restart(model_path, transactions_csv, tmp_path):
+    from model import FraudDetectionAPI
+
+    df, _ = read_bulk_csv(transactions_csv)
+    expected = score_bulk_frame(FraudDetectionAPI(model_path), clean_bulk_frame(df)).to_csv(index=False).encode()
+
+    chunks = _chunks(transactions_csv)
+    root = str(tmp_path / "uploads")
+    store = UploadStore(root, max_chunk_bytes=1 << 20, ttl_seconds=3600)
+    upload_id = store.create("transactions.csv", total_chunks=len(chunks))["upload_id"]
+    detector = FraudDetectionAPI(model_path)
+    for index in range(3):
+        _put(store, upload_id, index, chunks[index])
+        assert store.score_next(upload_id, detector)
+    # рестарт посреди записи результата: строки после сохранённого курсора
+    with open(tmp_path / "uploads" / upload_id / "result.csv", "ab") as f:
+        f.write(b"partial,row,from,a,crashed,run\n")
+
+    store = UploadStore(root, max_chunk_bytes=1 << 20, ttl_seconds=3600)
+    assert store.status(upload_id)["scoring"]["chunks_scored"] == 3
+    for index in range(3, len(chunks)):
+        _put(store, upload_id, index, chunks[index])
+    store.complete(upload_id)
+    assert store.pending_uploads() == [upload_id]
+    while store.score_next(upload_id, detector):
+        pass
+
+    assert store.status(upload_id)["scoring"]["status"] == "done"
+    with open(store.result_path(upload_id), "rb") as f:
+        assert f.read() == expected
+
+
+def test_chunk_index_beyond_six_digits(tmp_path):
+    store = UploadStore(str(tmp_path), max_chunk_bytes=1 << 20, ttl_seconds=3600)
+    upload_id = store.create()["upload_id"]
+    _put(store, upload_id, 1_234_567, b"cst_dim_id,amount\n")
+    assert [c["index"] for c in store.status(upload_id)["chunks"]] == [1_234_567]
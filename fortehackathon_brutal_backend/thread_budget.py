@@ -0,0 +1,159 @@
+"""
+Единый бюджет потоков для скоринга.
+
+Скоринг идёт в threadpool Starlette (по умолчанию 40 потоков), а CatBoost,
+XGBoost и LightGBM по умолчанию поднимают OpenMP-пулы на все ядра — при
+40 одновременных запросах получаются сотни нативных потоков на несколько
+ядер. Здесь всё задаётся в одном месте:
+
+  executor_threads   — размер threadpool для /predict, /predict/batch, /ws;
+  профиль latency    — потоков на модель для одиночного скоринга (обычно 1:
+                       параллелизм даёт executor, а не OpenMP);
+  профиль throughput — потоков на модель для матриц (bulk, пачки);
+                       для маленьких матриц всё равно берётся latency;
+  bulk_concurrency   — сколько bulk-выгрузок скорятся одновременно
+                       (отдельная полоса, не занимает слоты executor).
+
+CatBoost и LightGBM принимают число потоков на вызов; у XGBoost оно
+зашито в booster, поэтому на каждый профиль держится своя копия модели.
+"""
+
+import copy
+import os
+import threading
+import weakref
+from typing import Any, Dict
+
+import anyio
+import numpy as np
+
+try:
+    from threadpoolctl import threadpool_limits
+except ImportError:  # threadpoolctl опционален
+    threadpool_limits = None
+
+from config import (
+    SCORING_THREADS,
+    LATENCY_MODEL_THREADS,
+    THROUGHPUT_MODEL_THREADS,
+    BULK_CONCURRENCY,
+)
+
+PROFILES = ("latency", "throughput")
+
+# меньше строк на поток — многопоточный predict дороже однопоточного
+_ROWS_PER_THREAD = 256
+
+
+def available_cores() -> int:
+    """Ядра, доступные процессу: affinity и квота cgroup v2 (Docker --cpus)."""
+    try:
+        cores = len(os.sched_getaffinity(0))
+    except AttributeError:
+        cores = os.cpu_count() or 1
+    try:
+        with open("/sys/fs/cgroup/cpu.max") as f:
+            quota, period = f.read().split()
+        if quota != "max":
+            cores = min(cores, max(1, int(int(quota) / int(period))))
+    except (OSError, ValueError):
+        pass
+    return cores
+
+
+class ThreadBudget:
+    """
+    Число потоков executor-а и моделей по профилям.
+    """
+
+    def __init__(
+        self,
+        executor_threads: int,
+        latency_threads: int = 1,
+        throughput_threads: int = 1,
+        bulk_concurrency: int = 1,
+    ):
+        self.cores = available_cores()
+        self.executor_threads = executor_threads
+        self.model_threads = {
+            "latency": latency_threads,
+            "throughput": throughput_threads,
+        }
+        self.bulk_concurrency = bulk_concurrency
+        self.bulk_limiter = anyio.CapacityLimiter(bulk_concurrency)
+
+        # XGBoost: модель → {число потоков: копия с этим n_jobs}
+        self._xgb_variants: "weakref.WeakKeyDictionary" = weakref.WeakKeyDictionary()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls) -> "ThreadBudget":
+        cores = available_cores()
+        return cls(
+            # общий пул обслуживает и синхронные эндпоинты (/stats, admin) —
+            # на малом числе ядер оставляем им запас
+            executor_threads=SCORING_THREADS or max(cores, 4),
+            latency_threads=LATENCY_MODEL_THREADS,
+            throughput_threads=THROUGHPUT_MODEL_THREADS or cores,
+            bulk_concurrency=BULK_CONCURRENCY,
+        )
+
+    # ------------------------------------------------------------------
+    #  Процесс / executor
+    # ------------------------------------------------------------------
+    def limit_blas(self):
+        """BLAS (numpy) в скоринге не нужен многопоточным — ограничиваем одним потоком."""
+        if threadpool_limits is not None:
+            threadpool_limits(limits=1, user_api="blas")
+
+    def configure_executor(self):
+        """Размер threadpool Starlette/anyio; вызывается из работающего event loop."""
+        anyio.to_thread.current_default_thread_limiter().total_tokens = self.executor_threads
+
+    # ------------------------------------------------------------------
+    #  Модели
+    # ------------------------------------------------------------------
+    def threads_for(self, profile: str, n_rows: int) -> int:
+        threads = self.model_threads[profile]
+        if n_rows < _ROWS_PER_THREAD * 2:
+            return self.model_threads["latency"]
+        return threads
+
+    def prepare(self, xgboost_model):
+        """Заранее создаёт копии XGBoost под все профили (не на пути запроса)."""
+        for threads in set(self.model_threads.values()):
+            self._xgb_variant(xgboost_model, threads)
+
+    def _xgb_variant(self, model, threads: int):
+        variants = self._xgb_variants.get(model)
+        if variants is None or threads not in variants:
+            with self._lock:
+                variants = self._xgb_variants.setdefault(model, {})
+                if threads not in variants:
+                    variant = copy.deepcopy(model)
+                    variant.set_params(n_jobs=threads)
+                    variants[threads] = variant
+        return variants[threads]
+
+    def predict_proba(self, kind: str, model, X, profile: str = "latency") -> np.ndarray:
+        """Вероятность класса 1 с числом потоков по профилю."""
+        threads = self.threads_for(profile, len(X))
+        if kind == "catboost":
+            return model.predict_proba(X, thread_count=threads)[:, 1]
+        if kind == "lightgbm":
+            if isinstance(X, np.ndarray) and getattr(model, "objective_", None) == "binary":
+                # бинарный predict_proba[:, 1] — это и есть booster.predict; на ndarray
+                # без имён колонок sklearn-обёртка предупреждает и тратит ~1 мс
+                return model.booster_.predict(X, num_threads=threads)
+            return model.predict_proba(X, num_threads=threads)[:, 1]
+        if kind == "xgboost":
+            return self._xgb_variant(model, threads).predict_proba(X)[:, 1]
+        return model.predict_proba(X)[:, 1]
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "cores": self.cores,
+            "executor_threads": self.executor_threads,
+            "model_threads": dict(self.model_threads),
+            "bulk_concurrency": self.bulk_concurrency,
+        }
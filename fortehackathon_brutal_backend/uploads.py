@@ -0,0 +1,484 @@
+"""
+Resumable загрузка больших CSV для batch-скоринга кусками.
+
+Протокол:
+  POST /uploads                          — сессия загрузки (upload_id);
+  PUT  /uploads/{id}/chunks/{index}      — кусок с номером index (с 0),
+                                           можно параллельно и повторно;
+  GET  /uploads/{id}                     — какие куски уже приняты (с sha256) —
+                                           после обрыва досылаются только недостающие;
+  POST /uploads/{id}/complete            — загрузка закончена → задание скоринга;
+  GET  /uploads/{id}/result              — CSV с колонками скоринга.
+
+Кусок пишется потоком прямо на диск (в памяти не буферизуется), по пути
+считается sha256; заголовок X-Chunk-SHA256 сверяется с ним. Принятый кусок —
+файл chunk_<index>.<sha256> в каталоге сессии (атомарный rename), так что
+состояние сессии целиком на диске и переживает рестарт и prefork
+(serve.py): куски одной сессии могут прийти в разные воркеры.
+
+Скоринг не ждёт complete: как только готов непрерывный префикс кусков
+0..k, его полные строки скорятся (остаток после последнего перевода строки
+переносится в следующий кусок). Порядок строк сохраняется — история
+клиентов обновляется хронологически, как у /bulk_predict. Скорит один
+процесс за раз (flock на score.lock); курсор (следующий кусок, перенос,
+длина result.csv) сохраняется после каждого куска, и прерванный скоринг
+продолжается с места остановки.
+"""
+
+import fcntl
+import hashlib
+import json
+import os
+import re
+import shutil
+import time
+import uuid
+from typing import Any, AsyncIterator, Dict, Optional
+
+import anyio
+
+from bulk_scoring import REQUIRED_COLUMNS, clean_bulk_frame, missing_columns, read_bulk_csv, score_bulk_frame
+from ingest import SAMPLE_BYTES, CsvDialect, sniff
+
+_ID_RE = re.compile(r"^[0-9a-f]{32}$")
+# номер дополнен нулями до 6 знаков; индексы от 1 000 000 — длиннее
+_CHUNK_RE = re.compile(r"^chunk_(\d{6,})\.([0-9a-f]{64})$")
+
+
+class UploadError(Exception):
+    """Ошибка протокола загрузки с HTTP-статусом для ответа."""
+
+    def __init__(self, status_code: int, detail: str):
+        super().__init__(detail)
+        self.status_code = status_code
+
+
+def _write_json(path: str, data: Dict[str, Any]):
+    tmp = f"{path}.{uuid.uuid4().hex}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(data, f)
+    os.replace(tmp, path)
+
+
+def _read_json(path: str, default: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        if default is None:
+            raise
+        return dict(default)
+
+
+_NEW_CURSOR = {
+    "status": "receiving",      # receiving → scoring → done | failed
+    "next_chunk": 0,
+    "dialect": None,            # ingest.CsvDialect.to_dict()
+    "header": None,             # сырые байты строки заголовка (latin-1)
+    "carry_bytes": 0,
+    "result_bytes": 0,
+    "rows_in": 0,
+    "rows_valid": 0,
+    "rows_scored": 0,
+    "rows_scored_before_complete": 0,
+    "scoring_seconds": 0.0,
+    "ingest_seconds": 0.0,
+    "explain_seconds": 0.0,
+    "first_scored_at": None,
+    "finished_at": None,
+    "error": None,
+}
+
+
+class UploadStore:
+    """
+    Сессии загрузки в каталоге root: по подкаталогу на upload_id.
+    """
+
+    def __init__(self, root: str, max_chunk_bytes: int, ttl_seconds: float):
+        self.root = root
+        self.max_chunk_bytes = max_chunk_bytes
+        self.ttl_seconds = ttl_seconds
+        os.makedirs(root, exist_ok=True)
+
+    # ------------------------------------------------------------------
+    #  Сессии
+    # ------------------------------------------------------------------
+    def _dir(self, upload_id: str) -> str:
+        path = os.path.join(self.root, upload_id)
+        if not _ID_RE.match(upload_id) or not os.path.isdir(path):
+            raise UploadError(404, f"Upload session {upload_id} not found")
+        return path
+
+    def _meta(self, upload_id: str) -> Dict[str, Any]:
+        try:
+            return _read_json(os.path.join(self._dir(upload_id), "meta.json"))
+        except FileNotFoundError:
+            raise UploadError(404, f"Upload session {upload_id} not found")
+
+    def _cursor(self, path: str) -> Dict[str, Any]:
+        return {**_NEW_CURSOR, **_read_json(os.path.join(path, "cursor.json"), _NEW_CURSOR)}
+
+    def create(
+        self,
+        filename: Optional[str] = None,
+        total_chunks: Optional[int] = None,
+        options: Optional[Dict[str, Any]] = None,
+    ) -> Dict[str, Any]:
+        """options — параметры score_bulk_frame (explain, explain_top_k, explain_min_score)."""
+        if total_chunks is not None and total_chunks < 1:
+            raise UploadError(400, "total_chunks must be >= 1")
+        self.sweep_expired()
+        upload_id = uuid.uuid4().hex
+        path = os.path.join(self.root, upload_id)
+        os.makedirs(path)
+        _write_json(os.path.join(path, "meta.json"), {
+            "upload_id": upload_id,
+            "filename": filename,
+            "created_at": time.time(),
+            "total_chunks": total_chunks,
+            "completed": False,
+            "completed_at": None,
+            "options": options or {},
+        })
+        print(f"[Uploads] session {upload_id} created ({filename or 'unnamed'}, chunks={total_chunks})")
+        return self.status(upload_id)
+
+    def delete(self, upload_id: str):
+        path = self._dir(upload_id)
+        lock = self.try_lock(upload_id)
+        if lock is None:
+            raise UploadError(409, "Upload is being scored right now")
+        try:
+            shutil.rmtree(path)
+        finally:
+            self.unlock(lock)
+
+    def sweep_expired(self):
+        """Удаляет сессии старше ttl (кроме скорящихся сейчас)."""
+        now = time.time()
+        for name in os.listdir(self.root):
+            if not _ID_RE.match(name):
+                continue
+            try:
+                meta = _read_json(os.path.join(self.root, name, "meta.json"))
+            except (OSError, ValueError):
+                continue
+            if now - meta.get("created_at", now) < self.ttl_seconds:
+                continue
+            lock = self.try_lock(name)
+            if lock is None:
+                continue
+            try:
+                shutil.rmtree(os.path.join(self.root, name), ignore_errors=True)
+                print(f"[Uploads] session {name} expired")
+            finally:
+                self.unlock(lock)
+
+    # ------------------------------------------------------------------
+    #  Куски
+    # ------------------------------------------------------------------
+    def _chunks(self, path: str) -> Dict[int, str]:
+        """index → sha256 принятых кусков."""
+        chunks = {}
+        for name in os.listdir(path):
+            m = _CHUNK_RE.match(name)
+            if m:
+                chunks[int(m.group(1))] = m.group(2)
+        return chunks
+
+    @staticmethod
+    def _chunk_path(path: str, index: int, digest: str) -> str:
+        return os.path.join(path, f"chunk_{index:06d}.{digest}")
+
+    async def write_chunk(
+        self,
+        upload_id: str,
+        index: int,
+        stream: AsyncIterator[bytes],
+        expected_sha256: Optional[str] = None,
+    ) -> Dict[str, Any]:
+        """
+        Пишет кусок потоком во временный файл, считая sha256, и атомарно
+        публикует его. Повтор того же куска с тем же содержимым — no-op.
+        Файловые операции — в потоках anyio, event loop не блокируется.
+        """
+        path = await anyio.to_thread.run_sync(self._dir, upload_id)
+        meta = await anyio.to_thread.run_sync(self._meta, upload_id)
+        if meta["completed"]:
+            raise UploadError(409, "Upload is already completed")
+        total = meta["total_chunks"]
+        if index < 0 or (total is not None and index >= total):
+            raise UploadError(400, f"Chunk index {index} is out of range (total_chunks={total})")
+
+        digest = hashlib.sha256()
+        size = 0
+        tmp = os.path.join(path, f".chunk_{index:06d}.{uuid.uuid4().hex}.tmp")
+        try:
+            async with await anyio.open_file(tmp, "wb") as f:
+                async for piece in stream:
+                    size += len(piece)
+                    if size > self.max_chunk_bytes:
+                        raise UploadError(413, f"Chunk exceeds {self.max_chunk_bytes} bytes")
+                    digest.update(piece)
+                    await f.write(piece)
+            sha256 = digest.hexdigest()
+            if expected_sha256 and expected_sha256.lower() != sha256:
+                raise UploadError(422, f"Checksum mismatch: expected {expected_sha256}, got {sha256}")
+
+            await anyio.to_thread.run_sync(self._publish_chunk, upload_id, path, index, tmp, sha256)
+            return {"index": index, "sha256": sha256, "bytes": size}
+        finally:
+            await anyio.to_thread.run_sync(self._remove_tmp, tmp)
+
+    def _publish_chunk(self, upload_id: str, path: str, index: int, tmp: str, sha256: str):
+        existing = self._chunks(path).get(index)
+        if existing == sha256:
+            return
+        if existing is None:
+            os.replace(tmp, self._chunk_path(path, index, sha256))
+            return
+
+        # замена куска разрешена, пока его строки не ушли в скоринг; курсор
+        # читается под flock сессии — иначе скоринг мог бы взять кусок
+        # между проверкой и заменой (или не найти удалённый старый файл)
+        lock = self.try_lock(upload_id)
+        if lock is None:
+            raise UploadError(409, f"Chunk {index} cannot be replaced while the upload is being scored, retry later")
+        try:
+            if index < self._cursor(path)["next_chunk"]:
+                raise UploadError(409, f"Chunk {index} is already scored with different content")
+            os.replace(tmp, self._chunk_path(path, index, sha256))
+            os.remove(self._chunk_path(path, index, existing))
+        finally:
+            self.unlock(lock)
+
+    @staticmethod
+    def _remove_tmp(tmp: str):
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
+    def complete(self, upload_id: str, total_chunks: Optional[int] = None) -> Dict[str, Any]:
+        """Закрывает загрузку: все куски 0..total-1 на месте → дальше только скоринг."""
+        path = self._dir(upload_id)
+        meta = self._meta(upload_id)
+        total = meta["total_chunks"] if total_chunks is None else total_chunks
+        if total is None or total < 1:
+            raise UploadError(400, "total_chunks is required")
+        if meta["total_chunks"] is not None and meta["total_chunks"] != total:
+            raise UploadError(400, f"total_chunks mismatch: session has {meta['total_chunks']}")
+
+        chunks = self._chunks(path)
+        extra = sorted(i for i in chunks if i >= total)
+        if extra:
+            raise UploadError(400, f"Chunks beyond total_chunks: {extra}")
+        missing = [i for i in range(total) if i not in chunks]
+        if missing:
+            raise UploadError(409, f"Missing chunks: {missing}")
+
+        if not meta["completed"]:
+            meta.update(total_chunks=total, completed=True, completed_at=time.time())
+            _write_json(os.path.join(path, "meta.json"), meta)
+        return self.status(upload_id)
+
+    # ------------------------------------------------------------------
+    #  Скоринг
+    # ------------------------------------------------------------------
+    def try_lock(self, upload_id: str):
+        """Неблокирующий эксклюзивный flock сессии; None — занято."""
+        handle = open(os.path.join(self.root, upload_id, "score.lock"), "a")
+        try:
+            fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            handle.close()
+            return None
+        return handle
+
+    @staticmethod
+    def unlock(handle):
+        fcntl.flock(handle, fcntl.LOCK_UN)
+        handle.close()
+
+    def has_pending(self, upload_id: str) -> bool:
+        """Есть ли что скорить: следующий кусок или хвост после complete."""
+        try:
+            path = self._dir(upload_id)
+            meta = self._meta(upload_id)
+        except UploadError:
+            return False
+        cursor = self._cursor(path)
+        if cursor["status"] in ("done", "failed"):
+            return False
+        if cursor["next_chunk"] in self._chunks(path):
+            return True
+        return meta["completed"] and cursor["next_chunk"] >= meta["total_chunks"]
+
+    def pending_uploads(self):
+        """Сессии с недоскоренными кусками — продолжить после рестарта."""
+        return [name for name in os.listdir(self.root) if _ID_RE.match(name) and self.has_pending(name)]
+
+    def score_next(self, upload_id: str, detector) -> bool:
+        """
+        Скорит следующий кусок (или хвост после complete) под flock сессии.
+        Синхронно — вызывается в bulk-полосе потоков. False — работы нет.
+        """
+        try:
+            path = self._dir(upload_id)
+            meta = self._meta(upload_id)
+        except UploadError:
+            return False
+        cursor = self._cursor(path)
+        if cursor["status"] in ("done", "failed"):
+            return False
+
+        index = cursor["next_chunk"]
+        chunks = self._chunks(path)
+        carry_path = os.path.join(path, f"carry_{index:06d}.bin")
+        carry = b""
+        if cursor["carry_bytes"]:
+            with open(carry_path, "rb") as f:
+                carry = f.read()
+
+        total = meta["total_chunks"]
+        if index in chunks:
+            with open(self._chunk_path(path, index, chunks[index]), "rb") as f:
+                data = carry + f.read()
+            next_index = index + 1
+        elif meta["completed"] and index >= total:
+            data = carry
+            next_index = index
+        else:
+            return False
+        final = meta["completed"] and next_index >= total
+
+        result_path = os.path.join(path, "result.csv")
+        started = time.perf_counter()
+        try:
+            # прерванный скоринг мог дописать строки после сохранённого курсора
+            with open(result_path, "ab") as f:
+                f.truncate(cursor["result_bytes"])
+
+            if final:
+                block, carry = data, b""
+            else:
+                cut = data.rfind(b"\n") + 1
+                block, carry = data[:cut], data[cut:]
+
+            if cursor["header"] is None:
+                block, carry = self._take_header(cursor, block, carry, final)
+
+            if block.strip() and cursor["header"] is not None:
+                dialect = CsvDialect.from_dict({**cursor["dialect"], "skip_rows": 0})
+                df, report = read_bulk_csv(cursor["header"].encode("latin-1") + block, dialect)
+                cursor["ingest_seconds"] += report["seconds"]
+                cursor["rows_in"] += len(df)
+                df = clean_bulk_frame(df)
+                cursor["rows_valid"] += len(df)
+                if len(df):
+                    df = score_bulk_frame(detector, df, **meta.get("options", {}))
+                    cursor["explain_seconds"] += df.attrs["timings"]["explain_seconds"]
+                    df.to_csv(result_path, mode="a", index=False, header=cursor["result_bytes"] == 0)
+                    cursor["rows_scored"] += len(df)
+                    if not meta["completed"]:
+                        cursor["rows_scored_before_complete"] += len(df)
+                    if cursor["first_scored_at"] is None:
+                        cursor["first_scored_at"] = time.time()
+            elif final and cursor["header"] is None:
+                raise ValueError("Файл не содержит заголовка csv")
+
+            new_carry_path = os.path.join(path, f"carry_{next_index:06d}.bin")
+            if next_index != index or carry:
+                with open(new_carry_path, "wb") as f:
+                    f.write(carry)
+            cursor.update(
+                status="done" if final else "scoring",
+                next_chunk=next_index,
+                carry_bytes=len(carry),
+                result_bytes=os.path.getsize(result_path),
+            )
+            if final:
+                cursor["finished_at"] = time.time()
+        except Exception as e:
+            cursor.update(status="failed", error=str(e))
+            print(f"[Uploads] session {upload_id} failed on chunk {index}: {e}")
+
+        cursor["scoring_seconds"] += time.perf_counter() - started
+        _write_json(os.path.join(path, "cursor.json"), cursor)
+        if cursor["status"] != "failed" and next_index != index and os.path.exists(carry_path):
+            os.remove(carry_path)
+        if cursor["status"] == "done":
+            print(f"[Uploads] session {upload_id} scored: {cursor['rows_scored']} rows")
+        return cursor["status"] not in ("done", "failed")
+
+    @staticmethod
+    def _take_header(cursor: Dict[str, Any], block: bytes, carry: bytes, final: bool):
+        """
+        Диалект (ingest.sniff) и строка заголовка по первым полным строкам файла.
+        Заголовок хранится сырыми байтами (latin-1 в json) и приклеивается
+        к каждому следующему блоку.
+        """
+        dialect = sniff(block, at_eof=final, expected_columns=REQUIRED_COLUMNS)
+        skip = dialect.skip_rows
+        lines = block.split(b"\n", skip + 1)
+        if len(lines) <= skip + 1 and not final:
+            # заголовок ещё не дочитан — ждём следующий кусок
+            return b"", block + carry
+        if len(lines) <= skip:
+            return b"", b""
+        header = lines[skip].rstrip(b"\r") + b"\n"
+        columns, _ = read_bulk_csv(header, CsvDialect.from_dict({**dialect.to_dict(), "skip_rows": 0}))
+        missing = missing_columns(columns)
+        if missing:
+            if not final and len(block) < SAMPLE_BYTES:
+                # начало файла (строка-название?) без заголовка — ждём ещё строк
+                return b"", block + carry
+            raise ValueError("Отсутствуют обязательные колонки: " + ", ".join(missing))
+
+        cursor["dialect"] = dialect.to_dict()
+        cursor["header"] = header.decode("latin-1")
+        return (lines[skip + 1] if len(lines) > skip + 1 else b""), carry
+
+    # ------------------------------------------------------------------
+    #  Состояние
+    # ------------------------------------------------------------------
+    def status(self, upload_id: str) -> Dict[str, Any]:
+        path = self._dir(upload_id)
+        meta = self._meta(upload_id)
+        cursor = self._cursor(path)
+        chunks = self._chunks(path)
+        received = []
+        for index in sorted(chunks):
+            size = os.path.getsize(self._chunk_path(path, index, chunks[index]))
+            received.append({"index": index, "sha256": chunks[index], "bytes": size})
+
+        total = meta["total_chunks"]
+        seconds = cursor["scoring_seconds"]
+        return {
+            **meta,
+            "chunks_received": len(received),
+            "bytes_received": sum(c["bytes"] for c in received),
+            "missing_chunks": [i for i in range(total) if i not in chunks] if total else None,
+            "chunks": received,
+            "scoring": {
+                "status": cursor["status"],
+                "chunks_scored": cursor["next_chunk"],
+                "rows_in": cursor["rows_in"],
+                "rows_valid": cursor["rows_valid"],
+                "rows_scored": cursor["rows_scored"],
+                "rows_scored_before_complete": cursor["rows_scored_before_complete"],
+                "rows_per_sec": round(cursor["rows_scored"] / seconds, 1) if seconds else None,
+                "ingest_rows_per_sec": round(cursor["rows_in"] / cursor["ingest_seconds"]) if cursor["ingest_seconds"] else None,
+                "explain_seconds": round(cursor["explain_seconds"], 3),
+                "finished_at": cursor["finished_at"],
+                "error": cursor["error"],
+            },
+        }
+
+    def result_path(self, upload_id: str) -> str:
+        path = self._dir(upload_id)
+        cursor = self._cursor(path)
+        if cursor["status"] != "done":
+            raise UploadError(409, f"Scoring is not finished (status: {cursor['status']})")
+        if cursor["rows_scored"] == 0:
+            raise UploadError(400, "После очистки данных не осталось ни одной валидной строки (все с NaN / пустыми полями).")
+        return os.path.join(path, "result.csv")